@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import PostgresDsn, SecretStr
-from typing import Literal, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
 class Settings(BaseSettings):
     """Carrega as configurações da aplicação a partir de variáveis de ambiente ou arquivo .env."""
@@ -11,12 +11,174 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: Union[PostgresDsn, str]
+    # Pool de conexões por worker. As conexões são devolvidas ao fim de cada
+    # unidade de trabalho, então um pool pequeno atende muitas requisições simultâneas
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    # Espera máxima por uma conexão livre antes de falhar a requisição
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    # Recicla conexões mais antigas que isso (-1 = nunca)
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Sharding por user_id: DATABASE_URL é o shard 0 e cada URL aqui é um shard
+    # adicional (1, 2, ...). Os usuários são distribuídos em SHARD_BUCKETS buckets
+    # (potência de 2, fixa depois que houver dados) repartidos em faixas contíguas
+    # entre os shards; SHARD_BUCKET_OVERRIDES ({"bucket": shard}) registra os
+    # buckets movidos pelo rebalanceamento (python -m app.core.sharding)
+    SHARD_DATABASE_URLS: List[str] = []
+    SHARD_BUCKETS: int = 1024
+    SHARD_BUCKET_OVERRIDES: Dict[int, int] = {}
 
     APP_NAME: str = "SpiderPay API"
     DEBUG: bool = False
 
+    # Logs estruturados: o código da aplicação só enfileira os registros e uma
+    # thread os grava em stdout. Com a fila cheia, registros são descartados
+    # (contados em /metrics) em vez de bloquear o event loop
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_QUEUE_SIZE: int = 10_000
+    # Fração das requisições bem-sucedidas registradas no log de acesso
+    # (erros e requisições mais lentas que LOG_SLOW_REQUEST_MS são sempre registrados)
+    LOG_REQUEST_SAMPLE_RATE: float = 0.01
+    LOG_SLOW_REQUEST_MS: float = 1000.0
+    # Header com o id de correlação (aceito na requisição e devolvido na resposta)
+    LOG_REQUEST_ID_HEADER: str = "X-Request-ID"
+
     ACTIVE_GATEWAY: Literal["mock"] = "mock"
+    # Roteamento entre vários gateways (JSON). Cada rota: name, kind, weight,
+    # currencies, min_amount, max_amount e options. Vazio = tudo para ACTIVE_GATEWAY.
+    GATEWAY_ROUTES: List[Dict[str, Any]] = []
+    # Prazos das chamadas ao gateway
+    GATEWAY_INITIATE_TIMEOUT_SECONDS: float = 10.0
+    GATEWAY_STATUS_TIMEOUT_SECONDS: float = 3.0
+    # Consultas de status sem resposta após esse tempo ganham uma tentativa paralela (0 = sem hedging)
+    GATEWAY_STATUS_HEDGE_DELAY_SECONDS: float = 0.5
+    # Circuit breaker: abre quando a taxa de erros das últimas WINDOW chamadas
+    # (com ao menos MIN_CALLS chamadas) atinge ERROR_RATE, por OPEN_SECONDS
+    GATEWAY_BREAKER_WINDOW: int = 50
+    GATEWAY_BREAKER_MIN_CALLS: int = 20
+    GATEWAY_BREAKER_ERROR_RATE: float = 0.5
+    GATEWAY_BREAKER_OPEN_SECONDS: float = 30.0
+
+    # Simulador de carga do MockGateway (ver MockGatewayConfig)
+    MOCK_GATEWAY_LATENCY_DISTRIBUTION: Literal["fixed", "uniform", "normal", "lognormal", "exponential"] = "fixed"
+    MOCK_GATEWAY_LATENCY_MS: float = 0.0
+    MOCK_GATEWAY_LATENCY_STDDEV_MS: float = 0.0
+    MOCK_GATEWAY_APPROVAL_RATE: float = 1.0
+    MOCK_GATEWAY_ERROR_RATE: float = 0.0
+    MOCK_GATEWAY_TIMEOUT_RATE: float = 0.0
+    MOCK_GATEWAY_MAX_RPS: Optional[float] = None
+    MOCK_GATEWAY_SETTLE_DELAY_MS: float = 0.0
+    MOCK_GATEWAY_SEED: Optional[int] = None
+    # Ex: http://localhost:8000/webhooks/mock (None = sem callbacks)
+    MOCK_GATEWAY_CALLBACK_URL: Optional[str] = None
+    MOCK_GATEWAY_CALLBACK_DELAY_MS: float = 0.0
+    # Pagamentos mantidos em memória pelo mock (os mais antigos são esquecidos)
+    MOCK_GATEWAY_MAX_TRACKED_PAYMENTS: int = 100_000
+
+    # Segredo compartilhado com os gateways: os callbacks trazem o HMAC-SHA256 do
+    # corpo no header X-Webhook-Signature. Sem ele, /webhooks recusa tudo (401)
+    WEBHOOK_SECRET: Optional[SecretStr] = None
+    # Diferença máxima entre o timestamp assinado e o relógio local (contra reenvio)
+    WEBHOOK_SIGNATURE_TOLERANCE_SECONDS: float = 300.0
 
     SECRET_KEY: SecretStr
 
+    # Load shedding: acima destes limiares, requisições de baixa prioridade
+    # (listagens, importação, operações em massa) recebem 503; acima de
+    # SEVERE_FACTOR vezes o limiar, as de prioridade normal também.
+    # Criação de pagamentos e webhooks são sempre admitidos.
+    LOAD_SHEDDING_ENABLED: bool = True
+    LOAD_SHED_POOL_WAIT_MS: float = 250.0
+    LOAD_SHED_LOOP_LAG_MS: float = 200.0
+    LOAD_SHED_MAX_IN_FLIGHT: int = 1000
+    LOAD_SHED_SEVERE_FACTOR: float = 2.0
+    # Janela usada para medir espera do pool e lag do event loop
+    LOAD_SHED_WINDOW_SECONDS: float = 5.0
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 2
+    # Intervalo entre amostras do lag do event loop
+    LOOP_LAG_SAMPLE_INTERVAL_SECONDS: float = 0.1
+    # Watchdog em thread separada: se o loop ficar bloqueado por mais que o
+    # limiar, captura a pilha do código que está bloqueando e registra no log
+    LOOP_BLOCK_WATCHDOG_ENABLED: bool = True
+    LOOP_BLOCK_THRESHOLD_MS: float = 100.0
+    # Quantos bloqueios recentes (instante e duração; a pilha só vai para o log) ficam em /metrics
+    LOOP_BLOCK_MAX_REPORTS: int = 20
+
+    # Estratégia de geração de IDs de novos registros. "uuid7" gera IDs
+    # ordenados por tempo (inserções no fim do índice); IDs v4 existentes continuam válidos.
+    ID_STRATEGY: Literal["uuid4", "uuid7"] = "uuid4"
+
+    # Controle de admissão do login: verificações bcrypt simultâneas (None = núcleos)
+    # e espera máxima por uma vaga antes de responder 503
+    PASSWORD_VERIFY_CONCURRENCY: Optional[int] = None
+    PASSWORD_VERIFY_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    # Rate limiting ("N/second|minute|hour|day"; vazio = sem limite)
+    RATE_LIMIT_ENABLED: bool = True
+    # "memory" vale por worker; "redis" compartilha os limites entre workers
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+    # Proxies confiáveis na frente da API: o IP do cliente é a entrada de
+    # X-Forwarded-For nessa posição a partir da direita (0 = ignora o header)
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: int = 0
+    RATE_LIMIT_LOGIN_PER_IP: Optional[str] = "10/minute"
+    # Tentativas de login por conta (email normalizado), de qualquer IP
+    RATE_LIMIT_LOGIN_PER_ACCOUNT: Optional[str] = "5/minute"
+    RATE_LIMIT_PAYMENTS_PER_IP: Optional[str] = "120/minute"
+    RATE_LIMIT_PAYMENTS_PER_USER: Optional[str] = "60/minute"
+
+    # Importação em massa de usuários
+    # Número de processos usados para gerar hashes bcrypt (None = todos os núcleos)
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    # Quantidade de linhas por INSERT multi-row durante a importação
+    USER_IMPORT_BATCH_SIZE: int = 1000
+    # Limite de linhas aceitas por arquivo de importação
+    USER_IMPORT_MAX_ROWS: int = 100_000
+    # Pagamentos apagados por transação ao remover um usuário
+    USER_PURGE_BATCH_SIZE: int = 5000
+
+    # Group commit: criações de pagamento e respostas do gateway simultâneas no worker
+    # esperam até MAX_DELAY_MS e são gravadas juntas em uma transação e um único commit
+    PAYMENTS_GROUP_COMMIT_ENABLED: bool = False
+    PAYMENTS_GROUP_COMMIT_MAX_DELAY_MS: float = 5.0
+    PAYMENTS_GROUP_COMMIT_MAX_BATCH: int = 200
+
+    # Streaming de status de pagamentos (SSE / long-poll)
+    # Distribui as mudanças de status entre workers via LISTEN/NOTIFY do Postgres
+    PAYMENT_EVENTS_PG_NOTIFY: bool = False
+    # Intervalo entre comentários de keep-alive no stream SSE
+    PAYMENT_EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # Tempo máximo de espera aceito no long-poll
+    PAYMENT_EVENTS_MAX_WAIT_SECONDS: float = 60.0
+    # Duração máxima de uma conexão SSE (o cliente reconecta depois)
+    PAYMENT_EVENTS_STREAM_MAX_SECONDS: float = 300.0
+
+    # Reconciliação de pagamentos presos em PROCESSING
+    # Intervalo entre varreduras no app (0 = desativada; use o comando de linha)
+    RECONCILIATION_INTERVAL_SECONDS: float = 0
+    # Pagamentos em PROCESSING sem atualização há mais que isso são reconsultados
+    RECONCILIATION_STALE_AFTER_SECONDS: float = 900
+    RECONCILIATION_BATCH_SIZE: int = 500
+    # Concorrência máxima (adaptativa) e taxa máxima de consultas ao gateway
+    RECONCILIATION_MAX_CONCURRENCY: int = 32
+    RECONCILIATION_RATE_PER_SECOND: float = 50.0
+
+    # Cotações para os totais multi-moeda (tabela fx_rates, no shard 0)
+    # Moeda em que as cotações são expressas (1 unidade da moeda = rate na base)
+    FX_BASE_CURRENCY: str = "BRL"
+    # Cada worker relê a tabela inteira quando a versão em memória passa disso
+    FX_RATES_TTL_SECONDS: float = 60.0
+
+    # Particionamento mensal da tabela payments
+    # Quantos meses à frente devem ter partição criada
+    PAYMENTS_PARTITION_MONTHS_AHEAD: int = 3
+    # Intervalo da manutenção automática de partições no app (0 = desativada,
+    # ex: quando feita por cron com "python -m app.modules.payments.partitions ensure")
+    PAYMENTS_PARTITION_MAINTENANCE_INTERVAL_SECONDS: float = 3600
+    # Partições mais antigas que isso (em meses) são desanexadas e arquivadas
+    PAYMENTS_RETENTION_MONTHS: int = 24
+    # Diretório dos arquivos .csv.gz gerados pelo arquivamento
+    PAYMENTS_ARCHIVE_DIR: str = "archive/payments"
+
 settings = Settings()
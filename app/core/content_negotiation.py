@@ -0,0 +1,182 @@
+import functools
+import inspect
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.routing import APIRoute, serialize_response
+from fastapi.utils import is_body_allowed_for_status_code
+from starlette.concurrency import run_in_threadpool
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Nomes aceitos no Content-Type/Accept para MessagePack
+MSGPACK_MEDIA_TYPES = frozenset({MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"})
+
+
+def _media_types(header: Optional[str]) -> Dict[str, float]:
+    """Media types de um header Accept com o respectivo q (padrão 1)."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = max(quality, accepted.get(media_type.lower(), 0.0))
+    return accepted
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """
+    MessagePack só quando pedido explicitamente e com q maior ou igual ao de
+    application/json; */* e Accept ausente continuam recebendo JSON.
+    """
+    accepted = _media_types(accept)
+    msgpack_quality = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    return msgpack_quality > 0 and msgpack_quality >= accepted.get("application/json", 0.0)
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+class MsgPackResponse(Response):
+    """
+    Resposta em MessagePack. O conteúdo é o dump_python(mode="json") do
+    response_model, então os tipos no fio são os mesmos do JSON: Decimal como
+    string (valor exato), UUID como string canônica e datetime como string
+    ISO 8601; int, float, bool e None viram os tipos nativos do MessagePack.
+    """
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content)
+
+
+class MsgPackRequest(Request):
+    """
+    Request com corpo MessagePack apresentado ao FastAPI como JSON: o corpo é
+    decodificado por msgpack e validado pelo mesmo schema. Além das
+    representações do JSON, datetime pode vir como Timestamp (extensão -1).
+    """
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body(), timestamp=3)
+        return self._json
+
+
+def _as_json_request(request: Request) -> MsgPackRequest:
+    headers = [
+        (name, b"application/json" if name == b"content-type" else value)
+        for name, value in request.scope["headers"]
+    ]
+    return MsgPackRequest({**request.scope, "headers": headers}, request.receive)
+
+
+# Se a requisição em andamento pediu MessagePack (definido pelo route_handler)
+_msgpack_requested: ContextVar[bool] = ContextVar("msgpack_requested", default=False)
+# Parâmetro extra do endpoint embrulhado: a Response compartilhada do FastAPI
+_RESPONSE_PARAM = "_negotiated_response"
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route class com negociação de conteúdo entre JSON e MessagePack:
+    corpos com Content-Type application/msgpack são aceitos em qualquer rota com
+    body JSON, e a resposta sai em MessagePack quando o Accept preferir. Em JSON
+    nada muda (caminho rápido do FastAPI, dump_json direto do pydantic). Em
+    MessagePack o endpoint embrulhado valida o retorno pelo response_model,
+    serializa com dump_python(mode="json") e empacota direto, sem passar por
+    JSON. Erros (HTTPException, validação) continuam em JSON.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, self._negotiated_endpoint(endpoint), **kwargs)
+
+    def _negotiated_endpoint(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(endpoint)
+        is_coroutine = inspect.iscoroutinefunction(endpoint)
+        # O FastAPI injeta a Response em um único parâmetro: reaproveita o do endpoint, se houver
+        response_param = next(
+            (
+                name
+                for name, param in signature.parameters.items()
+                if isinstance(param.annotation, type) and issubclass(param.annotation, Response)
+            ),
+            None,
+        )
+
+        @functools.wraps(endpoint)
+        async def negotiated(**values: Any) -> Any:
+            response = values[response_param] if response_param else values.pop(_RESPONSE_PARAM)
+            if is_coroutine:
+                content = await endpoint(**values)
+            else:
+                content = await run_in_threadpool(endpoint, **values)
+            if not _msgpack_requested.get() or isinstance(content, Response):
+                return content
+            return await self._msgpack_response(content, response, is_coroutine)
+
+        if response_param:
+            return negotiated
+        # O FastAPI lê a assinatura daqui (com unwrap para resolver anotações);
+        # o parâmetro extra recebe a mesma Response usada pelas dependências
+        negotiated.__signature__ = signature.replace(
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(_RESPONSE_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+            ]
+        )
+        return negotiated
+
+    async def _msgpack_response(self, content: Any, response: Response, is_coroutine: bool) -> Response:
+        """
+        Monta a resposta MessagePack como o FastAPI montaria a JSON: mesmo status
+        (o da rota ou o definido pelo endpoint), mesmos headers e a mesma validação
+        e filtros do response_model.
+        """
+        status_code = response.status_code or self.status_code or 200
+        if not is_body_allowed_for_status_code(status_code):
+            return content
+        packed = MsgPackResponse(
+            await serialize_response(
+                field=self.response_field,
+                response_content=content,
+                include=self.response_model_include,
+                exclude=self.response_model_exclude,
+                by_alias=self.response_model_by_alias,
+                exclude_unset=self.response_model_exclude_unset,
+                exclude_defaults=self.response_model_exclude_defaults,
+                exclude_none=self.response_model_exclude_none,
+                is_coroutine=is_coroutine,
+            ),
+            status_code=status_code,
+        )
+        packed.headers.raw.extend(response.headers.raw)
+        return packed
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if is_msgpack(request.headers.get("content-type")):
+                request = _as_json_request(request)
+            token = _msgpack_requested.set(accepts_msgpack(request.headers.get("accept")))
+            try:
+                response = await handler(request)
+            finally:
+                _msgpack_requested.reset(token)
+            # Caches devem separar as respostas pelo formato pedido
+            response.headers.add_vary_header("Accept")
+            return response
+
+        return route_handler
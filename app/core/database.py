@@ -1,34 +1,80 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
-from collections.abc import AsyncGenerator as _AsyncGenerator_collections
-from typing import AsyncGenerator
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core import metrics
+from app.core.metrics import SlidingWindow
+
+# Tempo de espera por uma conexão do pool nas últimas LOAD_SHED_WINDOW_SECONDS
+pool_wait = SlidingWindow(settings.LOAD_SHED_WINDOW_SECONDS)
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Pool padrão do engine assíncrono que mede quanto cada checkout esperou por uma conexão."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.add(time.perf_counter() - started)
+
+def create_engine_for(url: str) -> AsyncEngine:
+    """Engine assíncrona com o pool configurado em Settings (uma por banco/shard)."""
+    return create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        poolclass=InstrumentedAsyncPool,
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+
+def create_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=engine,
+        autoflush=False,
+        expire_on_commit=False,
+        class_=AsyncSession
+    )
 
 # Cria a engine assíncrona do SQLAlchemy usando a URL do banco de dados das configurações
-async_engine = create_async_engine(
-    str(settings.DATABASE_URL),
-    echo=settings.DEBUG,
-    pool_pre_ping=True
-)
+# (com sharding, é o shard 0; veja app.core.sharding)
+async_engine = create_engine_for(str(settings.DATABASE_URL))
 
 # Cria uma fábrica de sessões assíncronas (sessionmaker) configurada
-AsyncSessionFactory = async_sessionmaker(
-    bind=async_engine,
-    autoflush=False,
-    expire_on_commit=False,
-    class_=AsyncSession
-)
+AsyncSessionFactory = create_session_factory(async_engine)
 
 Base = declarative_base()
 
-# Dependência do FastAPI para obter uma sessão do banco de dados
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    """Dependency para injetar uma AsyncSession do SQLAlchemy nas rotas."""
-    async with AsyncSessionFactory() as session:
-        try:
-            yield session
-        except Exception:
-            await session.rollback()
-            raise
-        finally:
-            pass
+def asyncpg_dsn(url: Optional[str] = None) -> str:
+    """DSN no formato aceito pelo asyncpg, para conexões dedicadas fora do pool."""
+    return str(url or settings.DATABASE_URL).replace("postgresql+asyncpg://", "postgresql://")
+
+def pool_snapshot(engine: Optional[AsyncEngine] = None) -> Dict[str, Any]:
+    """Ocupação atual do pool de conexões."""
+    pool = (engine or async_engine).sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "wait": pool_wait.snapshot(),
+    }
+
+metrics.register("db_pool", pool_snapshot)
+
+async def end_unit_of_work(session: AsyncSession) -> None:
+    """
+    Encerra a transação aberta por leituras e devolve a conexão ao pool já,
+    em vez de no fim da requisição. Os objetos carregados continuam utilizáveis
+    (expire_on_commit=False); uma nova consulta pega outra conexão do pool.
+    Use antes de trabalho demorado fora do banco (bcrypt, gateway, serialização).
+    """
+    if session.in_transaction():
+        await session.commit()
@@ -1,12 +1,12 @@
 import uuid
-from typing import Optional
+from typing import AsyncGenerator, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db_session
 from app.core.security import decode_access_token
+from app.core.sharding import get_shard_router
 from app.modules.users.models import User
 from app.modules.users import service as user_service
 
@@ -14,7 +14,6 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 async def get_current_user( 
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db_session)
 ) -> Optional[User]:
     """Decodifica o token JWT e retorna o usuário correspondente."""
     credentials_exception = HTTPException(
@@ -27,15 +26,18 @@ async def get_current_user(
     if payload is None:
         raise credentials_exception
         
-    user_identifier: Optional[str] = payload.get("sub")
+    # "uid" (tokens novos) leva direto ao shard do usuário; "sub" pode ser o email
+    user_identifier: Optional[str] = payload.get("uid") or payload.get("sub")
     if user_identifier is None:
         raise credentials_exception
         
+    # Busca agrupada (single-flight): requisições simultâneas do mesmo usuário
+    # compartilham uma consulta, sem ocupar a sessão da requisição
     try:
         user_id = uuid.UUID(user_identifier)
-        user = await user_service.get_user(db, user_id=user_id)
+        user = await user_service.get_user_shared(user_id)
     except ValueError:
-        user = await user_service.get_user_by_email(db, email=user_identifier)
+        user = await user_service.get_user_by_email_shared(user_identifier)
         
     if user is None:
         raise credentials_exception
@@ -48,4 +50,19 @@ async def get_current_active_user(
     """Verifica se o usuário obtido do token está ativo."""
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+async def get_current_active_superuser(
+    current_user: User = Depends(get_current_active_user)
+) -> User:
+    """Restringe a rota a superusers ativos."""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
+    return current_user
+
+async def get_current_user_db_session(
+    current_user: User = Depends(get_current_active_user),
+) -> AsyncGenerator[AsyncSession, None]:
+    """Sessão no shard do usuário autenticado (onde estão os pagamentos dele)."""
+    async with get_shard_router().shard_for(current_user.id).session() as session:
+        yield session
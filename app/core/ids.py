@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.config import settings
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+# rand_a (12 bits) é usado como contador para manter a ordem dentro do mesmo milissegundo
+_COUNTER_MAX = 0xFFF
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Gera um UUID versão 7 (RFC 9562): 48 bits de timestamp Unix em ms seguidos
+    de bits aleatórios. IDs gerados em sequência são crescentes, então novos
+    registros vão para o fim do índice B-tree da chave primária.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Começa em um valor aleatório da metade inferior para deixar espaço ao contador
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                # Contador esgotado (ou relógio voltou): avança o timestamp lógico
+                _last_ms += 1
+                _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (
+        (timestamp_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | rand_b
+    )
+    return uuid.UUID(int=value)
+
+
+def uuid7_datetime(value: uuid.UUID) -> Optional[datetime]:
+    """Instante embutido em um UUIDv7, ou None para outras versões (ex: v4 legados)."""
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
+
+
+def new_id() -> uuid.UUID:
+    """Gera o ID de um novo registro conforme ID_STRATEGY (uuid4 ou uuid7)."""
+    if settings.ID_STRATEGY == "uuid7":
+        return uuid7()
+    return uuid.uuid4()
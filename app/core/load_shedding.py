@@ -0,0 +1,137 @@
+import enum
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Pattern, Sequence, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import pool_wait
+from app.core.loop_monitor import loop_monitor
+
+
+class Priority(str, enum.Enum):
+    # Nunca recusadas: criação de pagamentos, webhooks e observabilidade
+    CRITICAL = "critical"
+    NORMAL = "normal"
+    # Primeiras a serem recusadas: listagens, importação e operações em massa
+    LOW = "low"
+
+
+# Prioridade por rota (nome do endpoint); as rotas que não estão aqui são NORMAL
+ROUTE_PRIORITIES: Dict[str, Priority] = {
+    "create_payment": Priority.CRITICAL,
+    "receive_gateway_webhook": Priority.CRITICAL,
+    "read_metrics": Priority.CRITICAL,
+    "read_gateways_health": Priority.CRITICAL,
+    "read_payments": Priority.LOW,
+    "read_payment_totals": Priority.LOW,
+    "get_users_endpoint": Priority.LOW,
+    "import_users_endpoint": Priority.LOW,
+    "transition_payments": Priority.LOW,
+}
+
+# Long-poll e SSE ficam abertos aguardando eventos sem usar banco nem CPU:
+# não entram na contagem de requisições em andamento
+LONG_LIVED_ROUTES = frozenset({"wait_payment_status", "stream_payment_status"})
+
+
+class RouteRule(NamedTuple):
+    methods: FrozenSet[str]
+    pattern: Pattern[str]
+    priority: Priority
+    long_lived: bool
+
+
+def route_rules(routes: Iterable[BaseRoute], prefix: str = "") -> List[RouteRule]:
+    """
+    Regras do middleware para as rotas de ROUTE_PRIORITIES e LONG_LIVED_ROUTES,
+    com o regex gerado do path de cada rota (mais o prefix do include_router).
+    O middleware roda antes do roteamento: assim a classificação acompanha os
+    paths reais das rotas, sem repetir prefixos aqui.
+    """
+    rules = []
+    for route in routes:
+        name = getattr(route, "name", None)
+        if name not in ROUTE_PRIORITIES and name not in LONG_LIVED_ROUTES:
+            continue
+        pattern, _, _ = compile_path(prefix + route.path)
+        rules.append(RouteRule(
+            frozenset(route.methods or ()),
+            pattern,
+            ROUTE_PRIORITIES.get(name, Priority.NORMAL),
+            name in LONG_LIVED_ROUTES,
+        ))
+    return rules
+
+
+class LoadSheddingMiddleware:
+    """
+    Recusa trabalho novo de menor prioridade quando o worker está sobrecarregado,
+    em vez de deixar todas as requisições ficarem lentas juntas.
+    O nível de carga é o maior entre espera por conexão do pool, lag do event
+    loop e requisições em andamento, cada um dividido pelo seu limiar:
+    nível >= 1 recusa LOW; nível >= LOAD_SHED_SEVERE_FACTOR recusa também NORMAL.
+    CRITICAL é sempre admitida. Recusas respondem 503 com Retry-After.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[RouteRule] = ()) -> None:
+        self.app = app
+        self.rules = list(rules)
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {"admitted": 0, "shed_low": 0, "shed_normal": 0}
+        metrics.register("load_shedding", self.snapshot)
+
+    def classify(self, method: str, path: str) -> Tuple[Priority, bool]:
+        """Prioridade da requisição e se ela é de longa duração (a primeira regra que casar vale)."""
+        for rule in self.rules:
+            if method in rule.methods and rule.pattern.match(path):
+                return rule.priority, rule.long_lived
+        return Priority.NORMAL, False
+
+    def load_level(self) -> float:
+        return max(
+            pool_wait.mean() * 1000 / settings.LOAD_SHED_POOL_WAIT_MS,
+            loop_monitor.current_lag() * 1000 / settings.LOAD_SHED_LOOP_LAG_MS,
+            self.in_flight / settings.LOAD_SHED_MAX_IN_FLIGHT,
+        )
+
+    def _should_shed(self, priority: Priority) -> bool:
+        if not settings.LOAD_SHEDDING_ENABLED or priority == Priority.CRITICAL:
+            return False
+        level = self.load_level()
+        if priority == Priority.LOW:
+            return level >= 1
+        return level >= settings.LOAD_SHED_SEVERE_FACTOR
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority, long_lived = self.classify(scope["method"], scope["path"])
+        if self._should_shed(priority):
+            self.stats[f"shed_{priority.value}"] += 1
+            response = JSONResponse(
+                {"detail": "Service overloaded, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.LOAD_SHED_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        self.stats["admitted"] += 1
+        counted = not long_lived
+        if counted:
+            self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if counted:
+                self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "load_level": round(self.load_level(), 3),
+        }
@@ -0,0 +1,242 @@
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.requests")
+
+# Id de correlação da requisição atual (None fora de requisições)
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Ids recebidos de fora são aceitos só se forem curtos e sem caracteres de controle
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Atributos padrão de LogRecord: o resto veio de extra= e vai para o JSON
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com request_id e os campos passados em extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        record.request_id = getattr(record, "request_id", None) or "-"
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Handler do processo inteiro: no thread de quem loga só anexa o request_id,
+    aplica a amostragem (extra={"sample_rate": r}) e enfileira sem bloquear.
+    Formatação e escrita ficam com a thread do QueueListener. Com a fila cheia
+    (saída lenta), o registro é descartado e contado, em vez de travar o event loop.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.stats: Dict[str, int] = {"enqueued": 0, "dropped": 0, "sampled_out": 0}
+        self.dropped_by_level: Dict[str, int] = {}
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and sample_rate < 1 and random.random() >= sample_rate:
+            self.stats["sampled_out"] += 1
+            return False
+        record.request_id = request_id_var.get()
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve a mensagem e a exceção agora: args e traceback podem mudar
+        # até a thread de escrita chegar ao registro
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            self.dropped_by_level[record.levelname] = self.dropped_by_level.get(record.levelname, 0) + 1
+            return
+        self.stats["enqueued"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "dropped_by_level": dict(self.dropped_by_level),
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+        }
+
+
+class _DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Espera vaga na fila cheia em vez de falhar: o stop precisa do sentinela
+        self.queue.put(self._sentinel)
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[_DrainingQueueListener] = None
+_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+    """
+    Troca os handlers do logger raiz pela fila não bloqueante e inicia a thread
+    que grava em stdout (JSON ou texto, conforme LOG_FORMAT). Idempotente.
+    """
+    global _handler, _listener
+    with _lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        if settings.LOG_FORMAT == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(
+                _TextFormatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+            )
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(settings.LOG_LEVEL.upper())
+        # Os logs do uvicorn também passam pela fila; o access log dele (síncrono,
+        # uma linha por requisição) é substituído pelo do RequestContextMiddleware
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            for existing in list(uvicorn_logger.handlers):
+                uvicorn_logger.removeHandler(existing)
+            uvicorn_logger.propagate = True
+        logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+        _listener = _DrainingQueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """
+    Grava o que ainda estiver na fila e encerra a thread de escrita (bloqueia:
+    use fora do event loop). Os logs seguintes, do encerramento do processo,
+    vão direto para a saída.
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        root = logging.getLogger()
+        root.removeHandler(_handler)
+        for output in _listener.handlers:
+            root.addHandler(output)
+        _listener = None
+
+
+metrics.register("logging", lambda: _handler.snapshot() if _handler is not None else {})
+
+
+class RequestContextMiddleware:
+    """
+    Atribui um id de correlação a cada requisição (do header LOG_REQUEST_ID_HEADER,
+    se válido, ou um novo), disponível para todo log emitido durante ela e
+    devolvido no mesmo header da resposta. Ao final registra a requisição:
+    erros (>= 500) e requisições lentas sempre; as demais com amostragem
+    LOG_REQUEST_SAMPLE_RATE.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.header = settings.LOG_REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    def _incoming_id(self, scope: Scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                candidate = value.decode("latin-1")
+                return candidate if _VALID_REQUEST_ID.match(candidate) else None
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = self._incoming_id(scope) or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[settings.LOG_REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            extra: Dict[str, Any] = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round(duration_ms, 2),
+            }
+            if status_code < 500 and duration_ms < settings.LOG_SLOW_REQUEST_MS:
+                extra["sample_rate"] = settings.LOG_REQUEST_SAMPLE_RATE
+            logger.log(
+                logging.ERROR if status_code >= 500 else logging.INFO,
+                "%s %s %d %.1fms",
+                scope["method"],
+                scope["path"],
+                status_code,
+                duration_ms,
+                extra=extra,
+            )
+            request_id_var.reset(token)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import Histogram, SlidingWindow
+
+logger = logging.getLogger(__name__)
+
+# Faixas do histograma de lag (s)
+_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Frames mais internos guardados por bloqueio
+_STACK_LIMIT = 30
+
+
+class LoopLagMonitor:
+    """
+    Mede o atraso do event loop: uma task dorme `interval` segundos e registra
+    quanto acordou além do previsto. Lag alto indica código bloqueando o loop
+    (CPU, chamadas síncronas) ou excesso de trabalho no worker.
+
+    Com block_threshold, uma thread watchdog acompanha o último despertar da
+    task; se o loop passar do limiar sem acordá-la, captura a pilha da thread
+    do loop (sys._current_frames) enquanto o bloqueio ainda acontece, e ao fim
+    registra no log quanto tempo durou e onde estava. A pilha fica só no log:
+    o snapshot (exposto em /metrics) traz apenas quando e quanto durou.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        window_seconds: float,
+        block_threshold: Optional[float] = None,
+        max_reports: int = 20,
+    ) -> None:
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag = SlidingWindow(window_seconds)
+        self.histogram = Histogram(_LAG_BUCKETS)
+        self.blocked_count = 0
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self._reports_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # Instante (time.monotonic) do último despertar da task de amostragem
+        self._heartbeat = 0.0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.lag.add(lag)
+            self.histogram.observe(lag)
+
+    def _capture_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return [line.rstrip() for line in traceback.format_stack(frame, limit=_STACK_LIMIT)]
+
+    def _watch(self) -> None:
+        """Laço da thread watchdog (roda fora do event loop)."""
+        check_every = max(0.005, self.block_threshold / 4)
+        stalled_since: Optional[float] = None
+        stack: List[str] = []
+        while not self._stopping.wait(check_every):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if overdue >= self.block_threshold:
+                if stalled_since != heartbeat:
+                    if stalled_since is not None:
+                        # O bloqueio anterior acabou e outro já começou
+                        self._report(heartbeat - stalled_since - self.interval, stack)
+                    # Primeira detecção deste bloqueio: a pilha aponta o culpado
+                    stalled_since = heartbeat
+                    stack = self._capture_stack()
+            elif stalled_since is not None and heartbeat != stalled_since:
+                self._report(heartbeat - stalled_since - self.interval, stack)
+                stalled_since = None
+                stack = []
+
+    def _report(self, blocked: float, stack: List[str]) -> None:
+        self.blocked_count += 1
+        report = {"at": datetime.now(timezone.utc).isoformat(), "blocked_ms": round(blocked * 1000, 1)}
+        with self._reports_lock:
+            self._reports.append(report)
+        logger.warning(
+            "Event loop blocked for %.1f ms; stack when detected:\n%s",
+            blocked * 1000,
+            "\n".join(stack) or "  <unavailable>",
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+        if self.block_threshold and self._watchdog is None:
+            self._stopping.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="event-loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._watchdog is not None:
+            self._stopping.set()
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def current_lag(self) -> float:
+        """Maior lag (s) na janela recente."""
+        return self.lag.max()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._reports_lock:
+            reports = list(self._reports)
+        return {
+            "running": self._task is not None,
+            **self.lag.snapshot(),
+            "histogram": self.histogram.snapshot(),
+            "blocked": {
+                "threshold_ms": self.block_threshold * 1000 if self.block_threshold else None,
+                "count": self.blocked_count,
+                "recent": reports,
+            },
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    settings.LOOP_LAG_SAMPLE_INTERVAL_SECONDS,
+    settings.LOAD_SHED_WINDOW_SECONDS,
+    block_threshold=(
+        settings.LOOP_BLOCK_THRESHOLD_MS / 1000 if settings.LOOP_BLOCK_WATCHDOG_ENABLED else None
+    ),
+    max_reports=settings.LOOP_BLOCK_MAX_REPORTS,
+)
+metrics.register("event_loop_lag", loop_monitor.snapshot)
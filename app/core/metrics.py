@@ -0,0 +1,83 @@
+import bisect
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Sequence, Tuple
+
+# Fontes de métricas do processo: nome -> função que retorna um snapshot
+_sources: Dict[str, Callable[[], Any]] = {}
+
+
+def register(name: str, snapshot: Callable[[], Any]) -> None:
+    """Registra (ou substitui) uma fonte de métricas exposta em GET /metrics."""
+    _sources[name] = snapshot
+
+
+def collect() -> Dict[str, Any]:
+    """Snapshot de todas as fontes registradas, por nome."""
+    return {name: snapshot() for name, snapshot in sorted(_sources.items())}
+
+
+class SlidingWindow:
+    """
+    Amostras dos últimos window_seconds (ex: tempo de espera por conexão).
+    Sem amostras recentes os agregados voltam a zero, então um sinal de
+    sobrecarga some sozinho quando a pressão acaba.
+    """
+
+    def __init__(self, window_seconds: float, max_samples: int = 2048, clock: Callable[[], float] = time.monotonic) -> None:
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+
+    def add(self, value: float) -> None:
+        self._samples.append((self._clock(), value))
+
+    def _recent(self) -> List[float]:
+        cutoff = self._clock() - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return [value for _, value in self._samples]
+
+    def mean(self) -> float:
+        values = self._recent()
+        return sum(values) / len(values) if values else 0.0
+
+    def max(self) -> float:
+        return max(self._recent(), default=0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        values = self._recent()
+        return {
+            "samples": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "max_ms": round(max(values) * 1000, 3) if values else 0.0,
+        }
+
+
+class Histogram:
+    """
+    Contagem de amostras por faixa (limites superiores em segundos, exibidos
+    em ms), mais total, média e máximo desde o início do processo.
+    """
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = sorted(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max_value = max(self.max_value, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound * 1000:g}ms" for bound in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max_value * 1000, 3),
+            "buckets": dict(zip(labels, self._counts)),
+        }
@@ -0,0 +1,191 @@
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.dependencies import get_current_active_user
+from app.modules.users.models import User
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Rate:
+    """limit requisições por period segundos (permitindo rajadas de até limit)."""
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """Converte "N/unidade" (second, minute, hour ou day), ex: "10/minute"."""
+        try:
+            limit, unit = value.strip().split("/")
+            return cls(int(limit), _PERIODS[unit.strip().lower().rstrip("s")])
+        except (ValueError, KeyError):
+            raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '10/minute'") from None
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def hit(self, key: str, rate: Rate) -> float:
+        """Registra uma requisição. Retorna 0.0 se permitida, senão os segundos até a próxima vaga."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token bucket por chave, no formato GCRA (guarda só o instante teórico de
+    chegada de cada chave). Vale por worker; as chaves menos usadas são
+    descartadas acima de max_keys.
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_keys = max_keys
+        self._clock = clock
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    async def hit(self, key: str, rate: Rate) -> float:
+        now = self._clock()
+        interval = rate.period / rate.limit
+        new_tat = max(self._tat.get(key, now), now) + interval
+        allowed_at = new_tat - rate.period
+        if allowed_at > now:
+            return allowed_at - now
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        return 0.0
+
+
+# Mesmo GCRA, atômico no Redis e com o relógio do servidor (compartilhado entre workers)
+_GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local new_tat = math.max(tat, now) + interval
+local allowed_at = new_tat - period
+if allowed_at > now then
+  return tostring(allowed_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Limites compartilhados entre workers/instâncias via Redis (requer o pacote redis).
+    Se o Redis falhar, a requisição é permitida: o limitador não deve derrubar a API.
+    """
+
+    def __init__(self, url: str, prefix: str = "spiderpay:ratelimit:") -> None:
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_GCRA_SCRIPT)
+
+    async def hit(self, key: str, rate: Rate) -> float:
+        try:
+            result = await self._script(
+                keys=[self.prefix + key], args=[rate.period / rate.limit, rate.period]
+            )
+        except Exception as e:
+            logger.warning("Rate limit backend unavailable, allowing request: %s", e)
+            return 0.0
+        return float(result)
+
+
+@lru_cache
+def get_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        if not settings.RATE_LIMIT_REDIS_URL:
+            raise ValueError("RATE_LIMIT_REDIS_URL is required for the redis rate limit backend")
+        return RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryRateLimitBackend()
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP do cliente. Atrás de RATE_LIMIT_TRUSTED_PROXY_HOPS proxies confiáveis, cada
+    um acrescenta à direita de X-Forwarded-For o endereço de quem o chamou: o
+    cliente é a entrada nessa posição a partir da direita. As entradas à esquerda
+    vêm do próprio cliente e podem ser forjadas, então nunca são usadas.
+    """
+    hops = settings.RATE_LIMIT_TRUSTED_PROXY_HOPS
+    if hops > 0:
+        forwarded = [
+            entry.strip()
+            for header in request.headers.getlist("x-forwarded-for")
+            for entry in header.split(",")
+            if entry.strip()
+        ]
+        if forwarded:
+            return forwarded[-min(hops, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+_stats: Dict[str, Dict[str, int]] = {}
+metrics.register("rate_limit", lambda: {name: dict(counts) for name, counts in _stats.items()})
+
+
+async def _enforce(name: str, rate: Rate, key: str) -> None:
+    counts = _stats.setdefault(name, {"allowed": 0, "limited": 0})
+    retry_after = await get_rate_limit_backend().hit(f"{name}:{key}", rate)
+    if retry_after <= 0:
+        counts["allowed"] += 1
+        return
+    counts["limited"] += 1
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def limit_by_ip(name: str, rate: Optional[str]) -> Callable:
+    """Dependency que limita a rota por IP do cliente (rate None = sem limite)."""
+    parsed = Rate.parse(rate) if rate else None
+
+    async def dependency(request: Request) -> None:
+        if parsed is not None and settings.RATE_LIMIT_ENABLED:
+            await _enforce(f"{name}:ip", parsed, client_ip(request))
+
+    return dependency
+
+
+def limit_by_user(name: str, rate: Optional[str]) -> Callable:
+    """Dependency que limita a rota por usuário autenticado (rate None = sem limite)."""
+    parsed = Rate.parse(rate) if rate else None
+
+    async def dependency(current_user: User = Depends(get_current_active_user)) -> None:
+        if parsed is not None and settings.RATE_LIMIT_ENABLED:
+            await _enforce(f"{name}:user", parsed, str(current_user.id))
+
+    return dependency
+
+
+def limit_by_key(name: str, rate: Optional[str]) -> Callable[[str], Awaitable[None]]:
+    """
+    Limite por uma chave que só o endpoint conhece (ex: o email do login), chamado
+    dentro da rota: await limit(key). rate None = sem limite.
+    """
+    parsed = Rate.parse(rate) if rate else None
+
+    async def enforce(key: str) -> None:
+        if parsed is not None and settings.RATE_LIMIT_ENABLED:
+            await _enforce(name, parsed, key)
+
+    return enforce
@@ -1,5 +1,8 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import List, Optional, Sequence
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -21,6 +24,88 @@ def get_password_hash(password: str) -> str:
     """Gera o hash de uma senha."""
     return pwd_context.hash(password)
 
+class PasswordCheckRejected(Exception):
+    """Verificação de senha recusada por excesso de verificações simultâneas."""
+
+# Vagas para verificações bcrypt simultâneas (controle de admissão do login)
+_verify_slots: Optional[asyncio.Semaphore] = None
+
+def _get_verify_slots() -> asyncio.Semaphore:
+    global _verify_slots
+    if _verify_slots is None:
+        _verify_slots = asyncio.Semaphore(
+            settings.PASSWORD_VERIFY_CONCURRENCY or os.cpu_count() or 1
+        )
+    return _verify_slots
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password fora do event loop (thread), com no máximo
+    PASSWORD_VERIFY_CONCURRENCY verificações simultâneas. Se não houver vaga em
+    PASSWORD_VERIFY_QUEUE_TIMEOUT_SECONDS, levanta PasswordCheckRejected em vez de
+    acumular uma fila que deixaria todos os logins lentos.
+    """
+    slots = _get_verify_slots()
+    try:
+        await asyncio.wait_for(
+            slots.acquire(), timeout=settings.PASSWORD_VERIFY_QUEUE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise PasswordCheckRejected() from None
+    try:
+        return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+    finally:
+        slots.release()
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    get_password_hash fora do event loop (thread), dividindo as vagas de bcrypt
+    com o login: um pico de cadastros não trava o worker nem o núcleo todo.
+    """
+    async with _get_verify_slots():
+        return await asyncio.to_thread(get_password_hash, password)
+
+# Pool de processos para hashing em massa (bcrypt é CPU-bound e segura o GIL)
+_hash_executor: Optional[ProcessPoolExecutor] = None
+
+def _hash_workers() -> int:
+    return settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+
+def _get_hash_executor() -> ProcessPoolExecutor:
+    """Cria (uma única vez) o pool de processos usado para hashing em massa."""
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(max_workers=_hash_workers())
+    return _hash_executor
+
+def _hash_chunk(passwords: Sequence[str]) -> List[str]:
+    """Executado nos processos do pool: gera os hashes de um lote de senhas."""
+    return [get_password_hash(password) for password in passwords]
+
+async def get_password_hashes(passwords: Sequence[str]) -> List[str]:
+    """
+    Gera os hashes de várias senhas em paralelo, usando todos os núcleos.
+    Não bloqueia o event loop: o trabalho roda no pool de processos.
+    """
+    if not passwords:
+        return []
+    executor = _get_hash_executor()
+    # Alguns lotes por processo equilibram a carga sem muito overhead de IPC
+    chunksize = max(1, len(passwords) // (_hash_workers() * 4))
+    chunks = [passwords[i:i + chunksize] for i in range(0, len(passwords), chunksize)]
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, _hash_chunk, chunk) for chunk in chunks)
+    )
+    return [hashed for chunk in results for hashed in chunk]
+
+def shutdown_hash_executor() -> None:
+    """Encerra o pool de processos de hashing, se tiver sido criado."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 def create_access_token(
     data: dict, expires_delta: Optional[timedelta] = None
 ) -> str:
@@ -0,0 +1,443 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import uuid
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy import BigInteger, String, Table, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import BIT, insert as pg_insert
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.sql import ColumnElement
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import (
+    AsyncSessionFactory,
+    async_engine,
+    asyncpg_dsn,
+    create_engine_for,
+    create_session_factory,
+    pool_snapshot,
+)
+from app.core.ids import new_id
+
+T = TypeVar("T")
+
+
+class Shard:
+    """Um banco de dados do cluster: engine e fábrica de sessões próprias."""
+
+    def __init__(
+        self, index: int, url: str, engine: AsyncEngine, session_factory: async_sessionmaker[AsyncSession]
+    ) -> None:
+        self.index = index
+        self.url = url
+        self.engine = engine
+        self.session_factory = session_factory
+
+    @property
+    def dsn(self) -> str:
+        """DSN para conexões asyncpg dedicadas (LISTEN, COPY, manutenção de partições)."""
+        return asyncpg_dsn(self.url)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """Sessão neste shard; a transação é desfeita se o bloco falhar."""
+        async with self.session_factory() as session:
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+
+    def __repr__(self) -> str:
+        return f"<Shard {self.index} {make_url(self.url).render_as_string(hide_password=True)}>"
+
+
+class ShardRouter:
+    """
+    Mapeia user_id -> shard. Cada usuário cai em um de `buckets` buckets pelos
+    bits baixos do id (aleatórios em UUIDv4 e v7); os buckets são repartidos em
+    faixas contíguas entre os shards e `overrides` registra os que foram movidos.
+    Usuários e seus pagamentos ficam sempre no mesmo shard, e os ids de novos
+    pagamentos carregam o bucket do dono (colocated_id), então um payment_id
+    também leva ao shard sem consultar nenhuma tabela de localização.
+    """
+
+    def __init__(self, shards: Sequence[Shard], buckets: int, overrides: Optional[Dict[int, int]] = None) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required")
+        # Potência de 2 até 2^32: o bucket é calculado igual no app e no SQL (bucket_clause)
+        if buckets <= 0 or buckets & (buckets - 1) or buckets > 1 << 32:
+            raise ValueError(f"SHARD_BUCKETS must be a power of 2 up to 2^32, got {buckets}")
+        self.shards = list(shards)
+        self.buckets = buckets
+        self._owner = [bucket * len(self.shards) // buckets for bucket in range(buckets)]
+        for bucket, shard_index in (overrides or {}).items():
+            if not 0 <= bucket < buckets or not 0 <= shard_index < len(self.shards):
+                raise ValueError(f"Invalid shard override {bucket} -> {shard_index}")
+            self._owner[bucket] = shard_index
+
+    def bucket_of(self, key: uuid.UUID) -> int:
+        return key.int % self.buckets
+
+    def shard_for_bucket(self, bucket: int) -> Shard:
+        return self.shards[self._owner[bucket]]
+
+    def shard_for(self, key: uuid.UUID) -> Shard:
+        """Shard dono de um user_id (ou de um payment_id gerado por colocated_id)."""
+        return self.shard_for_bucket(self.bucket_of(key))
+
+    def buckets_of(self, shard: Shard) -> List[int]:
+        return [bucket for bucket, owner in enumerate(self._owner) if owner == shard.index]
+
+    def colocated_id(self, owner_id: uuid.UUID) -> uuid.UUID:
+        """Novo id (mesma estratégia de new_id) no mesmo bucket de owner_id."""
+        value = new_id().int
+        return uuid.UUID(int=value - value % self.buckets + self.bucket_of(owner_id))
+
+    async def run(self, shard: Shard, fn: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Executa fn em uma sessão própria no shard."""
+        async with shard.session() as db:
+            return await fn(db)
+
+    async def gather(
+        self, fn: Callable[[AsyncSession], Awaitable[T]], shards: Optional[Sequence[Shard]] = None
+    ) -> List[T]:
+        """Scatter-gather: executa fn em todos os shards (ou nos informados) em paralelo."""
+        targets = self.shards if shards is None else shards
+        if len(targets) == 1:
+            return [await self.run(targets[0], fn)]
+        return list(await asyncio.gather(*(self.run(shard, fn) for shard in targets)))
+
+    async def find(
+        self, fn: Callable[[AsyncSession], Awaitable[Optional[T]]], shards: Optional[Sequence[Shard]] = None
+    ) -> Optional[Tuple[Shard, T]]:
+        """Primeiro resultado não-None entre os shards consultados em paralelo (com o shard de origem)."""
+        targets = self.shards if shards is None else shards
+        for shard, result in zip(targets, await self.gather(fn, targets)):
+            if result is not None:
+                return shard, result
+        return None
+
+    async def locate(
+        self, key: uuid.UUID, fn: Callable[[AsyncSession], Awaitable[Optional[T]]]
+    ) -> Tuple[Shard, Optional[T]]:
+        """
+        Executa fn no shard de key; se não encontrar, procura nos demais
+        (ids criados antes do sharding não carregam o bucket do dono).
+        Retorna o shard onde encontrou, ou o shard de key e None.
+        """
+        home = self.shard_for(key)
+        result = await self.run(home, fn)
+        if result is None and len(self.shards) > 1:
+            found = await self.find(fn, [shard for shard in self.shards if shard is not home])
+            if found is not None:
+                return found
+        return home, result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "buckets": self.buckets,
+            "shards": [
+                {
+                    "index": shard.index,
+                    "buckets": len(self.buckets_of(shard)),
+                    "pool": pool_snapshot(shard.engine),
+                }
+                for shard in self.shards
+            ],
+        }
+
+
+def shard_urls() -> List[str]:
+    """URLs de todos os shards, na ordem dos índices (shard 0 = DATABASE_URL)."""
+    return [str(settings.DATABASE_URL), *settings.SHARD_DATABASE_URLS]
+
+
+@lru_cache
+def get_shard_router() -> ShardRouter:
+    """Roteador com os shards de Settings. O shard 0 reutiliza a engine de app.core.database."""
+    shards = [Shard(0, str(settings.DATABASE_URL), async_engine, AsyncSessionFactory)]
+    for index, url in enumerate(settings.SHARD_DATABASE_URLS, start=1):
+        engine = create_engine_for(url)
+        shards.append(Shard(index, url, engine, create_session_factory(engine)))
+    return ShardRouter(shards, settings.SHARD_BUCKETS, settings.SHARD_BUCKET_OVERRIDES)
+
+
+metrics.register("db_shards", lambda: get_shard_router().snapshot())
+
+
+async def get_user_db_session(user_id: uuid.UUID) -> AsyncGenerator[AsyncSession, None]:
+    """Dependency: sessão no shard dono do user_id da rota."""
+    async with get_shard_router().shard_for(user_id).session() as session:
+        yield session
+
+
+def merge_pages(pages: Iterable[Sequence[T]], key: Callable[[T], Any], skip: int, limit: int) -> List[T]:
+    """
+    Junta páginas já ordenadas por key (decrescente) vindas de cada shard e
+    aplica skip/limit globais. Cada shard deve ter devolvido skip + limit itens.
+    """
+    merged = heapq.merge(*pages, key=key, reverse=True)
+    return list(itertools.islice(merged, skip, skip + limit))
+
+
+# --- Rebalanceamento ---------------------------------------------------------
+#
+# Mover buckets de um shard para outro, sem parar a API:
+#   1. copy   --buckets 17,40-47 --source 0 --target 2
+#   2. adicionar os buckets em SHARD_BUCKET_OVERRIDES ({"17": 2, ...}) e publicar a config
+#   3. copy   de novo: traz o que foi escrito na origem até a nova config valer em
+#      todos os workers (upsert: só sobrescreve linhas mais antigas no destino)
+#   4. purge  --buckets ... --shard 0: apaga da origem (recusa buckets que o shard ainda possui)
+
+
+def bucket_clause(column: ColumnElement, buckets: Sequence[int], total: int) -> ColumnElement:
+    """Filtro SQL equivalente a ShardRouter.bucket_of(column) in buckets (últimos 32 bits do uuid)."""
+    low_bits = cast(
+        cast(func.concat("x", func.right(func.replace(cast(column, String), "-", ""), 8)), BIT(32)),
+        BigInteger,
+    )
+    return (low_bits % total).in_(list(buckets))
+
+
+def parse_buckets(value: str) -> List[int]:
+    """Converte "17,40-47" em [17, 40, 41, ..., 47]."""
+    buckets = set()
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        buckets.update(range(int(start), int(end or start) + 1))
+    return sorted(buckets)
+
+
+def _tables() -> Tuple[Table, Table]:
+    # Importados aqui: app.core não depende dos módulos fora do rebalanceamento
+    from app.modules.payments.models import Payment
+    from app.modules.users.models import User
+
+    return User.__table__, Payment.__table__
+
+
+async def _copy_table(
+    source: Shard,
+    target: Shard,
+    table: Table,
+    where: ColumnElement,
+    conflict_columns: Sequence[str],
+    newer: Callable[[Any, Any], ColumnElement],
+    batch_size: int,
+    keep: Optional[Callable[[AsyncSession, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]] = None,
+) -> int:
+    copied = 0
+    after_id = None
+    while True:
+        stmt = select(table).where(where).order_by(table.c.id).limit(batch_size)
+        if after_id is not None:
+            stmt = stmt.where(table.c.id > after_id)
+        async with source.session() as db:
+            rows = [dict(row._mapping) for row in await db.execute(stmt)]
+        if not rows:
+            return copied
+        after_id = rows[-1]["id"]
+        if keep is not None:
+            async with target.session() as db:
+                rows = await keep(db, rows)
+            if not rows:
+                continue
+        insert_stmt = pg_insert(table).values(rows)
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={column.name: insert_stmt.excluded[column.name] for column in table.c if column.name not in conflict_columns},
+            where=newer(table, insert_stmt.excluded),
+        )
+        async with target.session() as db:
+            await db.execute(insert_stmt)
+            await db.commit()
+        copied += len(rows)
+
+
+async def copy_buckets(
+    router: ShardRouter, buckets: Sequence[int], source: Shard, target: Shard, batch_size: int = 1000
+) -> Dict[str, int]:
+    """
+    Copia usuários e pagamentos dos buckets da origem para o destino (idempotente:
+    linhas já presentes só são sobrescritas por versões mais novas).
+    """
+    users, payments = _tables()
+
+    async def with_user_on_target(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Pagamentos de usuários criados na origem depois da cópia dos usuários
+        # ficam para a próxima passada (a FK exige o usuário no destino)
+        present = set(
+            await db.scalars(select(users.c.id).where(users.c.id.in_({row["user_id"] for row in rows})))
+        )
+        return [row for row in rows if row["user_id"] in present]
+
+    copied_users = await _copy_table(
+        source,
+        target,
+        users,
+        bucket_clause(users.c.id, buckets, router.buckets),
+        ["id"],
+        lambda table, excluded: func.coalesce(excluded.updated_at, excluded.created_at)
+        > func.coalesce(table.c.updated_at, table.c.created_at),
+        batch_size,
+    )
+    copied_payments = await _copy_table(
+        source,
+        target,
+        payments,
+        bucket_clause(payments.c.user_id, buckets, router.buckets),
+        ["id", "created_at"],
+        lambda table, excluded: excluded.version > table.c.version,
+        batch_size,
+        keep=with_user_on_target,
+    )
+    return {"users": copied_users, "payments": copied_payments}
+
+
+async def purge_buckets(
+    router: ShardRouter, buckets: Sequence[int], shard: Shard, batch_size: int = 5000
+) -> Dict[str, int]:
+    """Apaga de shard os usuários e pagamentos dos buckets que não pertencem mais a ele."""
+    owned = [bucket for bucket in buckets if router.shard_for_bucket(bucket) is shard]
+    if owned:
+        raise ValueError(f"Shard {shard.index} still owns buckets {owned}; update SHARD_BUCKET_OVERRIDES first")
+    users, payments = _tables()
+    deleted = {"users": 0, "payments": 0}
+    for name, table, column in (("payments", payments, payments.c.user_id), ("users", users, users.c.id)):
+        while True:
+            batch = (
+                select(table.c.id).where(bucket_clause(column, buckets, router.buckets)).limit(batch_size)
+            )
+            async with shard.session() as db:
+                result = await db.execute(delete(table).where(table.c.id.in_(batch)))
+                await db.commit()
+            deleted[name] += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    return deleted
+
+
+async def sync_email_claims(router: ShardRouter, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Registra em user_emails (shard 0) o email de cada usuário de todos os shards,
+    para bancos com usuários anteriores à tabela. Idempotente. Retorna quantos
+    foram registrados e os emails que já pertencem a outro usuário (duplicados
+    entre shards, a resolver manualmente).
+    """
+    from app.modules.users.models import UserEmail
+
+    users, _ = _tables()
+    claims = UserEmail.__table__
+    registered = 0
+    conflicts: List[str] = []
+    for shard in router.shards:
+        after_id = None
+        while True:
+            stmt = select(users.c.id, users.c.email).order_by(users.c.id).limit(batch_size)
+            if after_id is not None:
+                stmt = stmt.where(users.c.id > after_id)
+            async with shard.session() as db:
+                rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+            after_id = rows[-1].id
+            insert_stmt = (
+                pg_insert(claims)
+                .values([{"email": row.email, "user_id": row.id} for row in rows])
+                .on_conflict_do_nothing(index_elements=["email"])
+                .returning(claims.c.email)
+            )
+            async with router.shards[0].session() as db:
+                inserted = set(await db.scalars(insert_stmt))
+                taken = [row.email for row in rows if row.email not in inserted]
+                owners: Dict[str, uuid.UUID] = {}
+                if taken:
+                    owners_stmt = select(claims.c.email, claims.c.user_id).where(claims.c.email.in_(taken))
+                    owners = dict((await db.execute(owners_stmt)).all())
+                await db.commit()
+            registered += len(inserted)
+            conflicts += [row.email for row in rows if row.email in owners and owners[row.email] != row.id]
+    return {"registered": registered, "conflicts": conflicts}
+
+
+async def _status(router: ShardRouter) -> None:
+    users, _ = _tables()
+    counts = await router.gather(lambda db: db.scalar(select(func.count()).select_from(users)))
+    for shard, count in zip(router.shards, counts):
+        print(f"{shard!r}: {len(router.buckets_of(shard))} buckets, {count} users")
+
+
+async def _run_command(args: argparse.Namespace) -> None:
+    router = get_shard_router()
+    try:
+        if args.command == "status":
+            await _status(router)
+        elif args.command == "copy":
+            buckets = parse_buckets(args.buckets)
+            copied = await copy_buckets(
+                router, buckets, router.shards[args.source], router.shards[args.target], args.batch_size
+            )
+            print(f"Copied {copied} from shard {args.source} to shard {args.target}")
+            overrides = {**settings.SHARD_BUCKET_OVERRIDES, **{bucket: args.target for bucket in buckets}}
+            print("SHARD_BUCKET_OVERRIDES=" + json.dumps({str(k): v for k, v in sorted(overrides.items())}))
+        elif args.command == "purge":
+            deleted = await purge_buckets(
+                router, parse_buckets(args.buckets), router.shards[args.shard], args.batch_size
+            )
+            print(f"Deleted {deleted} from shard {args.shard}")
+        elif args.command == "sync-emails":
+            synced = await sync_email_claims(router, args.batch_size)
+            print(f"Registered {synced['registered']} emails in shard 0")
+            for email in synced["conflicts"]:
+                print(f"Email owned by another user: {email}")
+    finally:
+        for shard in router.shards:
+            await shard.engine.dispose()
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Rebalanceamento de buckets entre shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Buckets e usuários por shard")
+    copy = subparsers.add_parser("copy", help="Copia os buckets da origem para o destino")
+    copy.add_argument("--buckets", required=True, help='Ex: "17,40-47"')
+    copy.add_argument("--source", type=int, required=True)
+    copy.add_argument("--target", type=int, required=True)
+    copy.add_argument("--batch-size", type=int, default=1000)
+    purge = subparsers.add_parser("purge", help="Apaga os buckets de um shard que não é mais o dono")
+    purge.add_argument("--buckets", required=True)
+    purge.add_argument("--shard", type=int, required=True)
+    purge.add_argument("--batch-size", type=int, default=5000)
+    sync_emails = subparsers.add_parser("sync-emails", help="Registra em user_emails os usuários de todos os shards")
+    sync_emails.add_argument("--batch-size", type=int, default=1000)
+    return parser
+
+
+def main() -> None:
+    """Inspeção e rebalanceamento dos shards pela linha de comando."""
+    asyncio.run(_run_command(_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Agrupa chamadas concorrentes idênticas (mesma chave) em uma única execução:
+    enquanto uma consulta está em andamento, as demais aguardam o mesmo resultado
+    (ou a mesma exceção) em vez de repetir a consulta.
+    Nada é guardado depois que a execução termina: quem chega depois dispara uma nova.
+    A execução roda em uma task própria, então o cancelamento de quem a iniciou
+    (ex: cliente desconectou) não afeta os demais que aguardam.
+    O resultado é compartilhado entre os chamadores e deve ser tratado como somente leitura.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+        metrics.register(f"singleflight.{name}", self.snapshot)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.stats["calls"] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Marca a exceção como lida mesmo que todos os chamadores tenham desistido
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def forget(self, key: Hashable) -> None:
+        """Desassocia a execução em andamento da chave (ex: após uma escrita), forçando uma nova leitura."""
+        self._in_flight.pop(key, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "in_flight": len(self._in_flight)}
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class AsyncTokenBucket:
+    """
+    Limita a taxa de operações (rate por segundo, com rajadas de até burst).
+    acquire() aguarda até haver um token disponível.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Consome tokens se houver; senão retorna quantos segundos faltam (0.0 = consumido)."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        # O lock mantém a ordem de chegada entre as corrotinas aguardando
+        async with self._lock:
+            while True:
+                wait = self.try_acquire(tokens)
+                if wait == 0.0:
+                    return
+                await asyncio.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limite de concorrência adaptativo (AIMD): cresce em +1 a cada `limit`
+    sucessos e cai pela metade a cada falha/timeout, entre min_limit e max_limit.
+    Usado para não sobrecarregar um serviço externo quando ele começa a degradar.
+    """
+
+    def __init__(self, *, initial: int, min_limit: int = 1, max_limit: int = 100) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveConcurrencyLimiter":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit:
+            self._successes = 0
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def on_failure(self) -> None:
+        self._successes = 0
+        self.limit = max(self.min_limit, self.limit // 2)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight}
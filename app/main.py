@@ -1,20 +1,101 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
+from app.core import metrics
 from app.core.config import settings
+from app.core.dependencies import get_current_active_superuser
+from app.core.load_shedding import LoadSheddingMiddleware, route_rules
+from app.core.log import RequestContextMiddleware, configure_logging, shutdown_logging
+from app.core.loop_monitor import loop_monitor
+from app.core.security import shutdown_hash_executor
 from app.modules.users import router as users_router
 from app.modules.payments import router as payments_router
 from app.modules.auth import router as auth_router
+from app.modules.fx import router as fx_router
+from app.modules.gateway import router as gateway_router
+from app.modules.gateway.factory import get_gateway_router
+from app.modules.webhooks import router as webhooks_router
+from app.modules.payments.events import create_listeners
+from app.modules.payments.group_commit import stop_payment_writers
+from app.modules.payments.partitions import run_maintenance_loop
+from app.modules.payments.reconciliation import run_reconciliation_loop
+from app.modules.users.service import purge_deleted_users
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e encerra recursos compartilhados da aplicação."""
+    # Logs em JSON por uma fila não bloqueante (antes de qualquer log da aplicação);
+    # só na subida do servidor, não na importação (testes, scripts, alembic)
+    configure_logging()
+    try:
+        # Valida GATEWAY_ROUTES na subida em vez de no primeiro pagamento
+        get_gateway_router()
+        # Amostra o lag do event loop (sinal do load shedding)
+        loop_monitor.start()
+        payment_listeners = create_listeners() if settings.PAYMENT_EVENTS_PG_NOTIFY else []
+        for listener in payment_listeners:
+            listener.start()
+        partition_maintenance = None
+        if settings.PAYMENTS_PARTITION_MAINTENANCE_INTERVAL_SECONDS > 0:
+            partition_maintenance = asyncio.create_task(
+                run_maintenance_loop(settings.PAYMENTS_PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+            )
+        reconciliation = None
+        if settings.RECONCILIATION_INTERVAL_SECONDS > 0:
+            reconciliation = asyncio.create_task(
+                run_reconciliation_loop(settings.RECONCILIATION_INTERVAL_SECONDS)
+            )
+        # Retoma remoções de usuários interrompidas por um restart
+        user_purge = asyncio.create_task(purge_deleted_users())
+        yield
+        user_purge.cancel()
+        if reconciliation is not None:
+            reconciliation.cancel()
+        if partition_maintenance is not None:
+            partition_maintenance.cancel()
+        for listener in payment_listeners:
+            await listener.stop()
+        # Grava as criações ainda na fila antes de encerrar
+        await stop_payment_writers()
+        await loop_monitor.stop()
+        shutdown_hash_executor()
+    finally:
+        await asyncio.to_thread(shutdown_logging)
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="API de Pagamentos Simulada - Projeto de Portfólio",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
-app.include_router(users_router.router, prefix="/users", tags=["Users"])
-app.include_router(payments_router.router, prefix="/payments", tags=["Payments"])
-app.include_router(auth_router.router)
+# (router, prefix, tags) de cada módulo
+_MODULE_ROUTERS = (
+    (users_router.router, "/users", ["Users"]),
+    (payments_router.router, "/payments", ["Payments"]),
+    (auth_router.router, "", None),
+    (gateway_router.router, "", None),
+    (webhooks_router.router, "", None),
+    (fx_router.router, "", None),
+)
+# Prioridades do load shedding, com os paths finais das rotas incluídas
+shedding_rules = []
+for module_router, prefix, tags in _MODULE_ROUTERS:
+    app.include_router(module_router, prefix=prefix, tags=tags)
+    shedding_rules += route_rules(module_router.routes, prefix)
 
 @app.get("/", tags=["Root"])
 async def read_root():
     """Endpoint raiz da API."""
     return {"message": f"Welcome to {settings.APP_NAME}"}
+
+@app.get("/metrics", tags=["Root"], dependencies=[Depends(get_current_active_superuser)])
+async def read_metrics():
+    """Contadores internos do worker (ex: consultas agrupadas por single-flight). Apenas superusers."""
+    return metrics.collect()
+
+# Recusa trabalho de baixa prioridade (503) quando o worker está sobrecarregado
+app.add_middleware(LoadSheddingMiddleware, rules=[*shedding_rules, *route_rules(app.router.routes)])
+# Mais externo: id de correlação e log de acesso também para as respostas 503
+app.add_middleware(RequestContextMiddleware)
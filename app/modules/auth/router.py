@@ -1,27 +1,51 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db_session
-from app.core.security import create_access_token, verify_password
+from app.core.config import settings
+from app.core.rate_limit import limit_by_ip, limit_by_key
+from app.core.security import PasswordCheckRejected, create_access_token, verify_password_async
 from app.modules.users import service as user_service
 from .schema import Token, LoginRequest
 
+# Contra tentativas distribuídas em muitos IPs contra a mesma conta
+limit_login_account = limit_by_key("login:account", settings.RATE_LIMIT_LOGIN_PER_ACCOUNT)
+
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"],
     responses={401: {"description": "Incorrect username or password"}}
 )
 
-@router.post("/login", response_model=Token)
+@router.post(
+    "/login",
+    response_model=Token,
+    dependencies=[Depends(limit_by_ip("login", settings.RATE_LIMIT_LOGIN_PER_IP))],
+    responses={
+        429: {"description": "Too many login attempts"},
+        503: {"description": "Too many concurrent logins"},
+    },
+)
 async def login_for_access_token(
     login_data: LoginRequest,
-    db: AsyncSession = Depends(get_db_session)
 ):
     """Obtém um token JWT fornecendo email e senha em JSON."""
-    user = await user_service.get_user_by_email(db, email=login_data.email)
+    # Antes da busca e do bcrypt: tentativas bloqueadas não custam nada
+    await limit_login_account(login_data.email.strip().lower())
+    # get_user_by_email já devolve a conexão: o bcrypt abaixo roda sem segurar o pool
+    user = await user_service.get_user_by_email(email=login_data.email)
     
-    if not user or not verify_password(login_data.password, user.password):
+    try:
+        password_ok = user is not None and await verify_password_async(
+            login_data.password, user.password
+        )
+    except PasswordCheckRejected:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again",
+            headers={"Retry-After": "1"},
+        )
+
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -31,6 +55,7 @@ async def login_for_access_token(
     if not user.is_active:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
 
-    access_token = create_access_token(data={"sub": user.email})
+    # uid leva direto ao shard do usuário em cada requisição autenticada
+    access_token = create_access_token(data={"sub": user.email, "uid": str(user.id)})
     
     return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import CheckConstraint, DateTime, Numeric, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class FxRate(Base):
+    """Cotação atual de uma moeda em FX_BASE_CURRENCY (quanto vale 1 unidade de currency)."""
+
+    __tablename__ = "fx_rates"
+    __table_args__ = (CheckConstraint("rate > 0", name="ck_fx_rates_rate_positive"),)
+
+    # Código da moeda ISO 4217, em maiúsculas
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+    rate: Mapped[Decimal] = mapped_column(Numeric(20, 10))
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,27 @@
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import FxRate
+
+
+async def get_rates(db: AsyncSession) -> List[Tuple[str, Decimal]]:
+    """Todas as cotações atuais (moeda, cotação) em uma única consulta."""
+    result = await db.execute(select(FxRate.currency, FxRate.rate))
+    return [(currency, rate) for currency, rate in result]
+
+
+async def upsert_rates(db: AsyncSession, rates: Dict[str, Decimal]) -> None:
+    """Grava as cotações informadas (insere ou substitui) em um único statement."""
+    stmt = pg_insert(FxRate).values(
+        [{"currency": currency, "rate": rate} for currency, rate in rates.items()]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FxRate.currency],
+        set_={"rate": stmt.excluded.rate, "updated_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.core.dependencies import get_current_active_user
+from app.modules.users.models import User
+from . import service as fx_service
+from .schema import FxRatesUpdate, FxSnapshotRead
+
+router = APIRouter(prefix="/fx", tags=["FX"])
+
+
+@router.get("/rates", response_model=FxSnapshotRead, summary="Cotações em uso")
+async def read_rates(current_user: User = Depends(get_current_active_user)):
+    """Versão das cotações em memória neste worker (recarregada a cada FX_RATES_TTL_SECONDS)."""
+    return await fx_service.get_snapshot()
+
+
+@router.put("/rates", response_model=FxSnapshotRead, summary="Atualizar cotações")
+async def update_rates(
+    rates_in: FxRatesUpdate,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Grava as cotações informadas (valor de 1 unidade de cada moeda em FX_BASE_CURRENCY).
+    Moedas não informadas mantêm a cotação atual. Apenas superusers.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Não autorizado a alterar cotações")
+    return await fx_service.update_rates(rates_in.rates)
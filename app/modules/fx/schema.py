@@ -0,0 +1,30 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class FxRatesUpdate(BaseModel):
+    # moeda -> valor de 1 unidade em FX_BASE_CURRENCY
+    rates: Dict[str, Decimal] = Field(..., min_length=1)
+
+    @field_validator("rates")
+    @classmethod
+    def _check_rates(cls, rates: Dict[str, Decimal]) -> Dict[str, Decimal]:
+        normalized = {}
+        for currency, rate in rates.items():
+            if len(currency) != 3 or not currency.isalpha():
+                raise ValueError(f"Código de moeda inválido: {currency!r}")
+            if rate <= 0:
+                raise ValueError(f"A cotação de {currency} deve ser positiva")
+            normalized[currency.upper()] = rate
+        return normalized
+
+
+class FxSnapshotRead(BaseModel):
+    base_currency: str
+    # Incrementada a cada recarga que muda alguma cotação
+    version: int
+    loaded_at: datetime
+    rates: Dict[str, Decimal]
@@ -0,0 +1,157 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_EVEN, Decimal, localcontext
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.sharding import get_shard_router
+from app.core.singleflight import SingleFlight
+from . import repository as fx_repo
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal("0.01")
+# Precisão das contas de conversão: somas de milhões de linhas vezes cotações
+# com 10 casas passam dos 28 dígitos do contexto padrão do Decimal
+_CONVERSION_PRECISION = 60
+
+
+@dataclass(frozen=True)
+class FxSnapshot:
+    """
+    Cotações de uma versão, imutável: quem a obteve converte sempre com o mesmo
+    conjunto, mesmo que uma recarga publique outra versão no meio do caminho.
+    rates[c] = valor de 1 unidade de c em base_currency (a própria base vale 1).
+    """
+
+    version: int
+    base_currency: str
+    rates: Mapping[str, Decimal]
+    loaded_at: datetime
+    # time.monotonic() da carga, para o TTL
+    loaded_monotonic: float = field(compare=False)
+
+    def convert_totals(
+        self, totals: Mapping[str, Decimal], target: str
+    ) -> Tuple[Dict[str, Decimal], List[str]]:
+        """
+        Converte totais já agregados por moeda para target: uma multiplicação por
+        moeda, não por pagamento. As contas são exatas (Decimal com precisão
+        ampla); arredonde só o resultado final. Retorna os valores convertidos
+        por moeda e as moedas sem cotação (fora dos convertidos).
+        """
+        target_rate = self.rates.get(target)
+        if target_rate is None:
+            raise KeyError(target)
+        converted: Dict[str, Decimal] = {}
+        missing: List[str] = []
+        with localcontext() as ctx:
+            ctx.prec = _CONVERSION_PRECISION
+            for currency, amount in totals.items():
+                rate = self.rates.get(currency)
+                if rate is None:
+                    missing.append(currency)
+                elif currency == target:
+                    converted[currency] = amount
+                else:
+                    converted[currency] = amount * rate / target_rate
+        return converted, missing
+
+
+class FxRateCache:
+    """
+    Cache em processo das cotações. A tabela é lida inteira de uma vez e
+    publicada como um novo FxSnapshot por uma única atribuição: leitores nunca
+    veem uma mistura de cotações antigas e novas. Recargas simultâneas são
+    agrupadas; se a recarga falhar, a versão anterior continua valendo.
+    """
+
+    def __init__(self, ttl_seconds: float, base_currency: str) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.base_currency = base_currency
+        self._snapshot: Optional[FxSnapshot] = None
+        self._loads = SingleFlight[FxSnapshot]("fx_rates")
+        self.stats: Dict[str, int] = {"loads": 0, "load_errors": 0}
+
+    async def get(self) -> FxSnapshot:
+        """Versão atual, recarregando se passou do TTL."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_monotonic < self.ttl_seconds:
+            return snapshot
+        return await self.refresh()
+
+    async def refresh(self) -> FxSnapshot:
+        return await self._loads.do("refresh", self._load)
+
+    async def reload(self) -> FxSnapshot:
+        """Recarga após uma escrita: não reaproveita uma leitura iniciada antes dela."""
+        self._loads.forget("refresh")
+        return await self.refresh()
+
+    async def _load(self) -> FxSnapshot:
+        current = self._snapshot
+        try:
+            # Dados de referência: ficam no shard 0
+            async with get_shard_router().shards[0].session() as db:
+                rows = await fx_repo.get_rates(db)
+        except Exception:
+            self.stats["load_errors"] += 1
+            if current is None:
+                raise
+            logger.exception("FX rates refresh failed; keeping version %d", current.version)
+            return current
+        self.stats["loads"] += 1
+        rates = {currency.upper(): rate for currency, rate in rows}
+        rates[self.base_currency] = Decimal(1)
+        version = current.version if current is not None else 0
+        if current is None or dict(current.rates) != rates:
+            version += 1
+        snapshot = FxSnapshot(
+            version=version,
+            base_currency=self.base_currency,
+            rates=MappingProxyType(rates),
+            loaded_at=datetime.now(timezone.utc),
+            loaded_monotonic=time.monotonic(),
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        current = self._snapshot
+        return {
+            **self.stats,
+            "version": current.version if current else None,
+            "currencies": len(current.rates) if current else 0,
+            "age_seconds": round(time.monotonic() - current.loaded_monotonic, 1) if current else None,
+        }
+
+
+fx_rates = FxRateCache(settings.FX_RATES_TTL_SECONDS, settings.FX_BASE_CURRENCY.upper())
+metrics.register("fx_rates", fx_rates.snapshot)
+
+
+async def get_snapshot() -> FxSnapshot:
+    return await fx_rates.get()
+
+
+async def update_rates(rates: Dict[str, Decimal]) -> FxSnapshot:
+    """Grava as cotações e publica a nova versão neste worker (os demais a veem em até FX_RATES_TTL_SECONDS)."""
+    if settings.FX_BASE_CURRENCY.upper() in rates:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{settings.FX_BASE_CURRENCY.upper()} é a moeda base (cotação fixa em 1)",
+        )
+    async with get_shard_router().shards[0].session() as db:
+        await fx_repo.upsert_rates(db, rates)
+    return await fx_rates.reload()
+
+
+def quantize_money(amount: Decimal) -> Decimal:
+    """Arredonda para centavos (meio para o par, como em relatórios contábeis)."""
+    return amount.quantize(CENTS, rounding=ROUND_HALF_EVEN)
@@ -0,0 +1,49 @@
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+from app.modules.payments.models import PaymentStatus
+
+
+class GatewayError(Exception):
+    """Falha ao comunicar com o gateway de pagamento."""
+
+
+class GatewayTimeoutError(GatewayError):
+    """O gateway não respondeu dentro do prazo configurado."""
+
+
+class GatewayUnavailableError(GatewayError):
+    """Chamada recusada sem contatar o gateway (circuit breaker aberto)."""
+
+
+@dataclass(frozen=True)
+class GatewayPaymentResult:
+    """Resposta normalizada de um gateway sobre um pagamento."""
+    gateway_payment_id: str
+    status: PaymentStatus
+    error_message: Optional[str] = None
+
+
+class AbstractGateway(ABC):
+    """Contrato que toda integração com gateway de pagamento deve implementar."""
+
+    # Identificador do gateway, gravado em Payment.gateway
+    name: str
+
+    @abstractmethod
+    async def initiate_payment(
+        self,
+        *,
+        payment_id: uuid.UUID,
+        amount: Decimal,
+        currency: str,
+        description: Optional[str] = None,
+    ) -> GatewayPaymentResult:
+        """Inicia o pagamento no gateway. payment_id serve como chave de idempotência."""
+
+    @abstractmethod
+    async def get_payment_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        """Consulta o status atual de um pagamento no gateway (operação idempotente)."""
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import List, Optional
+
+from app.core.config import settings
+from .base import AbstractGateway
+from .mock import MockGateway, MockGatewayConfig
+from .resilience import CircuitBreaker, ResilientGateway
+from .routing import GatewayRoute, GatewayRouter
+
+
+def _create_gateway(route: GatewayRoute) -> AbstractGateway:
+    """Instancia a implementação concreta do gateway descrita pela rota."""
+    if route.kind == "mock":
+        # As opções da rota sobrepõem os valores MOCK_GATEWAY_* de Settings
+        config = MockGatewayConfig(**{**MockGatewayConfig.from_settings().model_dump(), **route.options})
+        return MockGateway(route.name, config)
+    raise ValueError(f"Unknown gateway kind: {route.kind}")
+
+
+def build_resilient_gateway(gateway: AbstractGateway) -> ResilientGateway:
+    """Aplica prazos, circuit breaker e hedging configurados em Settings."""
+    return ResilientGateway(
+        gateway,
+        breaker=CircuitBreaker(
+            window_size=settings.GATEWAY_BREAKER_WINDOW,
+            min_calls=settings.GATEWAY_BREAKER_MIN_CALLS,
+            error_rate_threshold=settings.GATEWAY_BREAKER_ERROR_RATE,
+            open_seconds=settings.GATEWAY_BREAKER_OPEN_SECONDS,
+        ),
+        initiate_timeout=settings.GATEWAY_INITIATE_TIMEOUT_SECONDS,
+        status_timeout=settings.GATEWAY_STATUS_TIMEOUT_SECONDS,
+        hedge_delay=settings.GATEWAY_STATUS_HEDGE_DELAY_SECONDS,
+    )
+
+
+def load_routes() -> List[GatewayRoute]:
+    """Rotas de GATEWAY_ROUTES; sem rotas configuradas, todo o tráfego vai para ACTIVE_GATEWAY."""
+    if not settings.GATEWAY_ROUTES:
+        return [GatewayRoute(name=settings.ACTIVE_GATEWAY, kind=settings.ACTIVE_GATEWAY)]
+    return [GatewayRoute.model_validate(route) for route in settings.GATEWAY_ROUTES]
+
+
+@lru_cache
+def get_gateway_router() -> GatewayRouter:
+    """Roteador com todos os gateways configurados. Uma instância por processo, compartilhando os breakers."""
+    return GatewayRouter(
+        [(route, build_resilient_gateway(_create_gateway(route))) for route in load_routes()]
+    )
+
+
+def get_gateway(name: Optional[str] = None) -> ResilientGateway:
+    """Retorna o gateway pelo nome (ex: Payment.gateway) ou o da primeira rota."""
+    router = get_gateway_router()
+    return router.get(name) if name is not None else router.default
+
+
+def route_payment(amount: Decimal, currency: str) -> ResilientGateway:
+    """Escolhe o gateway de um novo pagamento pela moeda, faixa de valor e peso das rotas."""
+    return get_gateway_router().choose(amount, currency)
+
+
+def get_gateways() -> List[ResilientGateway]:
+    """Todos os gateways configurados (para observabilidade)."""
+    return get_gateway_router().gateways
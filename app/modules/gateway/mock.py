@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, Literal, Optional, Set
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.core.throttling import AsyncTokenBucket
+from app.modules.payments.models import PaymentStatus
+from app.modules.webhooks.signature import SIGNATURE_HEADER, sign_payload
+from .base import AbstractGateway, GatewayError, GatewayPaymentResult
+
+logger = logging.getLogger(__name__)
+
+# Tempo que uma chamada "travada" fica sem responder (o chamador deve expirar antes)
+HANG_SECONDS = 3600.0
+
+
+class MockGatewayConfig(BaseModel):
+    """Comportamento simulado do MockGateway (latência, resultados, falhas e callbacks)."""
+    latency_distribution: Literal["fixed", "uniform", "normal", "lognormal", "exponential"] = "fixed"
+    # Latência média por chamada (ou fixa) em ms
+    latency_ms: float = Field(0.0, ge=0)
+    # Dispersão: desvio padrão (normal/lognormal) ou meia largura do intervalo (uniform)
+    latency_stddev_ms: float = Field(0.0, ge=0)
+    # Probabilidade de um pagamento ser aprovado (os demais são recusados -> FAILED)
+    approval_rate: float = Field(1.0, ge=0, le=1)
+    # Probabilidade de uma chamada falhar com erro do gateway
+    error_rate: float = Field(0.0, ge=0, le=1)
+    # Probabilidade de uma chamada não responder (timeout do lado do chamador)
+    timeout_rate: float = Field(0.0, ge=0, le=1)
+    # Vazão máxima aceita (chamadas/s); excedentes são rejeitadas como um HTTP 429
+    max_rps: Optional[float] = Field(None, gt=0)
+    # Tempo até o resultado final do pagamento ficar disponível
+    settle_delay_ms: float = Field(0.0, ge=0)
+    # Semente para resultados reproduzíveis
+    seed: Optional[int] = None
+    # URL do nosso webhook para callbacks assíncronos de status (None = sem callbacks)
+    callback_url: Optional[str] = None
+    callback_delay_ms: float = Field(0.0, ge=0)
+    # Máximo de pagamentos guardados para consultas de status e reenvios; acima
+    # disso os mais antigos são esquecidos (os com callback entregue saem antes)
+    max_tracked_payments: int = Field(100_000, ge=1)
+
+    @classmethod
+    def from_settings(cls) -> "MockGatewayConfig":
+        """Monta a configuração a partir das variáveis MOCK_GATEWAY_* de Settings."""
+        return cls(
+            latency_distribution=settings.MOCK_GATEWAY_LATENCY_DISTRIBUTION,
+            latency_ms=settings.MOCK_GATEWAY_LATENCY_MS,
+            latency_stddev_ms=settings.MOCK_GATEWAY_LATENCY_STDDEV_MS,
+            approval_rate=settings.MOCK_GATEWAY_APPROVAL_RATE,
+            error_rate=settings.MOCK_GATEWAY_ERROR_RATE,
+            timeout_rate=settings.MOCK_GATEWAY_TIMEOUT_RATE,
+            max_rps=settings.MOCK_GATEWAY_MAX_RPS,
+            settle_delay_ms=settings.MOCK_GATEWAY_SETTLE_DELAY_MS,
+            seed=settings.MOCK_GATEWAY_SEED,
+            callback_url=settings.MOCK_GATEWAY_CALLBACK_URL,
+            callback_delay_ms=settings.MOCK_GATEWAY_CALLBACK_DELAY_MS,
+            max_tracked_payments=settings.MOCK_GATEWAY_MAX_TRACKED_PAYMENTS,
+        )
+
+
+class _MockPayment:
+    __slots__ = ("payment_id", "final_status", "error_message", "settles_at")
+
+    def __init__(
+        self, payment_id: uuid.UUID, final_status: PaymentStatus, error_message: Optional[str], settles_at: float
+    ) -> None:
+        self.payment_id = payment_id
+        self.final_status = final_status
+        self.error_message = error_message
+        self.settles_at = settles_at
+
+
+class MockGateway(AbstractGateway):
+    """
+    Gateway simulado que se comporta como um provedor real sob carga:
+    latência com distribuição configurável, aprovações/recusas, erros,
+    chamadas que não respondem, limite de vazão e callbacks assíncronos
+    de status para o nosso webhook. Permite testar a capacidade do pipeline
+    de pagamentos inteiro em uma máquina, sem um provedor real.
+    """
+
+    def __init__(self, name: str = "mock", config: Optional[MockGatewayConfig] = None) -> None:
+        self.name = name
+        self.config = config or MockGatewayConfig()
+        self._random = random.Random(self.config.seed)
+        self._throughput = (
+            AsyncTokenBucket(self.config.max_rps) if self.config.max_rps else None
+        )
+        self._payments: Dict[str, _MockPayment] = {}
+        self._callbacks: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {
+            "calls": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "throttled": 0,
+            "approved": 0,
+            "declined": 0,
+            "callbacks_sent": 0,
+            "callbacks_failed": 0,
+            "evicted": 0,
+        }
+
+    def _sample_latency(self) -> float:
+        """Sorteia a latência de uma chamada, em segundos."""
+        mean = self.config.latency_ms / 1000
+        spread = self.config.latency_stddev_ms / 1000
+        distribution = self.config.latency_distribution
+        if mean <= 0 or distribution == "fixed":
+            return mean
+        if distribution == "uniform":
+            return self._random.uniform(max(0.0, mean - spread), mean + spread)
+        if distribution == "normal":
+            return max(0.0, self._random.gauss(mean, spread))
+        if distribution == "exponential":
+            return self._random.expovariate(1 / mean)
+        # lognormal com média e desvio padrão informados (cauda longa, típica de APIs)
+        sigma2 = math.log(1 + (spread / mean) ** 2)
+        return self._random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+
+    async def _simulate_call(self) -> None:
+        self.stats["calls"] += 1
+        if self._throughput is not None and self._throughput.try_acquire() > 0:
+            self.stats["throttled"] += 1
+            raise GatewayError("Mock gateway rate limit exceeded")
+        roll = self._random.random()
+        latency = self._sample_latency()
+        if roll < self.config.timeout_rate:
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(HANG_SECONDS)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if roll < self.config.timeout_rate + self.config.error_rate:
+            self.stats["errors"] += 1
+            raise GatewayError("Mock gateway error")
+
+    def _current(self, gateway_payment_id: str, payment: _MockPayment) -> GatewayPaymentResult:
+        if time.monotonic() < payment.settles_at:
+            return GatewayPaymentResult(gateway_payment_id, PaymentStatus.PROCESSING)
+        return GatewayPaymentResult(gateway_payment_id, payment.final_status, payment.error_message)
+
+    async def initiate_payment(
+        self,
+        *,
+        payment_id: uuid.UUID,
+        amount: Decimal,
+        currency: str,
+        description: Optional[str] = None,
+    ) -> GatewayPaymentResult:
+        gateway_payment_id = f"{self.name}_{payment_id.hex}"
+        # Idempotente: reenvios do mesmo pagamento retornam o registro existente
+        if gateway_payment_id in self._payments:
+            return self._current(gateway_payment_id, self._payments[gateway_payment_id])
+        await self._simulate_call()
+        approved = self._random.random() < self.config.approval_rate
+        self.stats["approved" if approved else "declined"] += 1
+        payment = _MockPayment(
+            payment_id,
+            PaymentStatus.APPROVED if approved else PaymentStatus.FAILED,
+            None if approved else "Payment declined by mock gateway",
+            time.monotonic() + self.config.settle_delay_ms / 1000,
+        )
+        self._track(gateway_payment_id, payment)
+        if self.config.callback_url:
+            task = asyncio.create_task(self._send_callback(gateway_payment_id, payment))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+        return GatewayPaymentResult(gateway_payment_id, PaymentStatus.PROCESSING)
+
+    def _track(self, gateway_payment_id: str, payment: _MockPayment) -> None:
+        """Guarda o pagamento, esquecendo os mais antigos acima de max_tracked_payments."""
+        while len(self._payments) >= self.config.max_tracked_payments:
+            # dict mantém a ordem de inserção: o primeiro é o mais antigo
+            del self._payments[next(iter(self._payments))]
+            self.stats["evicted"] += 1
+        self._payments[gateway_payment_id] = payment
+
+    async def get_payment_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        await self._simulate_call()
+        payment = self._payments.get(gateway_payment_id)
+        if payment is None:
+            raise GatewayError(f"Unknown payment {gateway_payment_id}")
+        return self._current(gateway_payment_id, payment)
+
+    async def _send_callback(self, gateway_payment_id: str, payment: _MockPayment) -> None:
+        """Notifica o resultado final no webhook configurado, como um provedor real faria."""
+        import httpx
+
+        delay = max(0.0, payment.settles_at - time.monotonic()) + self.config.callback_delay_ms / 1000
+        await asyncio.sleep(delay)
+        body = json.dumps({
+            "gateway_payment_id": gateway_payment_id,
+            "payment_id": str(payment.payment_id),
+            "status": payment.final_status.value,
+            "error_message": payment.error_message,
+        }).encode()
+        headers = {"Content-Type": "application/json"}
+        if settings.WEBHOOK_SECRET is not None:
+            # Assina o corpo exato enviado, como o webhook confere
+            headers[SIGNATURE_HEADER] = sign_payload(settings.WEBHOOK_SECRET.get_secret_value(), body)
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(self.config.callback_url, content=body, headers=headers)
+                response.raise_for_status()
+            self.stats["callbacks_sent"] += 1
+            # Resultado final entregue: nenhuma consulta de status precisa mais dele
+            self._payments.pop(gateway_payment_id, None)
+        except Exception as e:
+            self.stats["callbacks_failed"] += 1
+            logger.warning("Mock gateway callback for %s failed: %s", gateway_payment_id, e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"name": self.name, "tracked_payments": len(self._payments), **self.stats}
@@ -0,0 +1,284 @@
+import asyncio
+import enum
+import time
+import uuid
+from collections import deque
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, TypeVar
+
+from .base import (
+    AbstractGateway,
+    GatewayError,
+    GatewayPaymentResult,
+    GatewayTimeoutError,
+    GatewayUnavailableError,
+)
+
+T = TypeVar("T")
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por taxa de erros em uma janela das últimas chamadas.
+    CLOSED: chamadas passam. Se a taxa de erros na janela (com ao menos
+    min_calls chamadas) atingir error_rate_threshold, vai para OPEN.
+    OPEN: chamadas falham imediatamente por open_seconds; depois HALF_OPEN.
+    HALF_OPEN: deixa passar half_open_max_calls chamadas de teste; sucesso
+    fecha o circuito, falha o reabre. Uma chamada de teste que termina sem
+    resultado (cancelada) devolve a vaga com release_probe.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_size: int = 50,
+        min_calls: int = 20,
+        error_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow_request(self) -> bool:
+        """Indica se uma chamada pode ser feita agora (e a registra se for de teste)."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        return False
+
+    def release_probe(self, opened_count: int) -> None:
+        """
+        Devolve a vaga de uma chamada de teste sem resultado. opened_count é o
+        times_opened de quando a vaga foi obtida: uma vaga de um HALF_OPEN
+        anterior não desconta as chamadas de teste do atual.
+        """
+        if (
+            self._state == CircuitState.HALF_OPEN
+            and self.times_opened == opened_count
+            and self._half_open_in_flight > 0
+        ):
+            self._half_open_in_flight -= 1
+
+    def record_success(self) -> None:
+        if self._state == CircuitState.HALF_OPEN:
+            self._state = CircuitState.CLOSED
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        if self._state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if (
+            self._state == CircuitState.CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and self.error_rate >= self.error_rate_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self.times_opened += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "state": state.value,
+            "error_rate": round(self.error_rate, 4),
+            "calls_in_window": len(self._outcomes),
+            "times_opened": self.times_opened,
+            "retry_in_seconds": (
+                round(max(0.0, self.open_seconds - (self._clock() - self._opened_at)), 3)
+                if state == CircuitState.OPEN else None
+            ),
+        }
+
+
+class ResilientGateway(AbstractGateway):
+    """
+    Envolve um gateway com prazos por operação, circuit breaker e hedging.
+    - initiate_payment: uma tentativa, limitada por initiate_timeout.
+    - get_payment_status (idempotente): se a primeira tentativa não responder
+      em hedge_delay, dispara outra em paralelo e usa a primeira resposta bem
+      sucedida, tudo dentro de status_timeout.
+    Chamadas recusadas pelo breaker levantam GatewayUnavailableError sem
+    ocupar o worker esperando um gateway degradado.
+    """
+
+    # Peso da última amostra na média móvel exponencial de latência
+    LATENCY_EWMA_ALPHA = 0.2
+
+    def __init__(
+        self,
+        gateway: AbstractGateway,
+        *,
+        breaker: CircuitBreaker,
+        initiate_timeout: float,
+        status_timeout: float,
+        hedge_delay: Optional[float] = None,
+        max_hedges: int = 1,
+    ) -> None:
+        self.gateway = gateway
+        self.name = gateway.name
+        self.breaker = breaker
+        self.initiate_timeout = initiate_timeout
+        self.status_timeout = status_timeout
+        self.hedge_delay = hedge_delay
+        self.max_hedges = max_hedges
+        self.latency_ewma: Optional[float] = None
+        self.stats: Dict[str, int] = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    def _record(self, started: float, error: Optional[BaseException]) -> None:
+        latency = time.monotonic() - started
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+        if error is None:
+            self.breaker.record_success()
+        else:
+            self.stats["failures"] += 1
+            if isinstance(error, GatewayTimeoutError):
+                self.stats["timeouts"] += 1
+            self.breaker.record_failure()
+
+    async def _guarded(self, call: Callable[[], Awaitable[T]], timeout: float) -> T:
+        probe = self.breaker.state == CircuitState.HALF_OPEN
+        if not self.breaker.allow_request():
+            self.stats["rejected"] += 1
+            raise GatewayUnavailableError(f"Gateway {self.name} unavailable (circuit open)")
+        opened_count = self.breaker.times_opened
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(), timeout=timeout)
+        except asyncio.TimeoutError:
+            error = GatewayTimeoutError(f"Gateway {self.name} timed out after {timeout}s")
+            self._record(started, error)
+            raise error
+        except GatewayError as e:
+            self._record(started, e)
+            raise
+        except Exception as e:
+            error = GatewayError(f"Gateway {self.name} failed: {e}")
+            self._record(started, error)
+            raise error from e
+        except BaseException:
+            # Cancelada (cliente desconectou, shutdown, wait_for externo): não diz
+            # nada sobre o gateway, mas a vaga de teste precisa voltar, senão o
+            # breaker fica em HALF_OPEN recusando todas as chamadas
+            if probe:
+                self.breaker.release_probe(opened_count)
+            raise
+        self._record(started, None)
+        return result
+
+    async def initiate_payment(
+        self,
+        *,
+        payment_id: uuid.UUID,
+        amount: Decimal,
+        currency: str,
+        description: Optional[str] = None,
+    ) -> GatewayPaymentResult:
+        return await self._guarded(
+            lambda: self.gateway.initiate_payment(
+                payment_id=payment_id, amount=amount, currency=currency, description=description
+            ),
+            self.initiate_timeout,
+        )
+
+    async def get_payment_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        if not self.hedge_delay or self.max_hedges <= 0:
+            return await self._guarded(
+                lambda: self.gateway.get_payment_status(gateway_payment_id), self.status_timeout
+            )
+        return await self._guarded(
+            lambda: self._hedged_status(gateway_payment_id), self.status_timeout
+        )
+
+    async def _hedged_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        """Dispara tentativas escalonadas e retorna a primeira bem sucedida."""
+        pending: Set[asyncio.Task] = set()
+        first: Optional[asyncio.Task] = None
+        last_error: Optional[BaseException] = None
+        hedges_left = self.max_hedges
+        try:
+            first = asyncio.create_task(self.gateway.get_payment_status(gateway_payment_id))
+            pending.add(first)
+            while pending:
+                timeout = self.hedge_delay if hedges_left > 0 else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+                if hedges_left > 0 and (not done or not pending):
+                    # Sem resposta no prazo de hedge (ou a tentativa falhou): nova tentativa
+                    hedges_left -= 1
+                    self.stats["hedges"] += 1
+                    pending.add(
+                        asyncio.create_task(self.gateway.get_payment_status(gateway_payment_id))
+                    )
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado observável: breaker, contadores e latência média."""
+        inner_snapshot = getattr(self.gateway, "snapshot", None)
+        return {
+            "name": self.name,
+            "breaker": self.breaker.snapshot(),
+            "latency_ewma_ms": (
+                round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None
+            ),
+            **self.stats,
+            "gateway": inner_snapshot() if inner_snapshot is not None else None,
+        }
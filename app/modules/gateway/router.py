@@ -0,0 +1,17 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends
+
+from app.core.dependencies import get_current_active_user
+from .factory import get_gateway_router
+
+router = APIRouter(
+    prefix="/gateways",
+    tags=["Gateways"],
+    dependencies=[Depends(get_current_active_user)],
+)
+
+@router.get("/health", summary="Estado dos gateways (circuit breaker, latência, erros)")
+async def read_gateways_health() -> List[Dict[str, Any]]:
+    """Retorna o estado do circuit breaker, os contadores e o peso de roteamento de cada gateway."""
+    return get_gateway_router().snapshot()
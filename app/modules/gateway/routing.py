@@ -0,0 +1,123 @@
+import random
+from decimal import Decimal
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field, field_validator
+
+from .base import GatewayError
+from .resilience import CircuitState, ResilientGateway
+
+
+class NoGatewayRouteError(GatewayError):
+    """Nenhum gateway configurado aceita a moeda/valor do pagamento."""
+
+
+class GatewayRoute(BaseModel):
+    """Uma entrada de GATEWAY_ROUTES: qual gateway atende quais pagamentos e com que peso."""
+    # Identificador gravado em Payment.gateway (e usado na URL do webhook)
+    name: str = Field(..., min_length=1, max_length=50)
+    # Implementação concreta do gateway
+    kind: Literal["mock"] = "mock"
+    # Fatia do tráfego elegível enviada a este gateway (relativa às demais rotas)
+    weight: float = Field(1.0, gt=0)
+    # Moedas aceitas (None = todas)
+    currencies: Optional[List[str]] = None
+    # Faixa de valores aceita, inclusiva (None = sem limite)
+    min_amount: Optional[Decimal] = None
+    max_amount: Optional[Decimal] = None
+    # Opções específicas da implementação (ex: campos de MockGatewayConfig)
+    options: Dict[str, Any] = {}
+
+    @field_validator("currencies")
+    @classmethod
+    def _normalize_currencies(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        return [currency.upper() for currency in value] if value is not None else None
+
+    def accepts(self, amount: Decimal, currency: str) -> bool:
+        if self.currencies is not None and currency.upper() not in self.currencies:
+            return False
+        if self.min_amount is not None and amount < self.min_amount:
+            return False
+        if self.max_amount is not None and amount > self.max_amount:
+            return False
+        return True
+
+
+class GatewayRouter:
+    """
+    Escolhe o gateway de cada pagamento entre as rotas que aceitam sua moeda e
+    valor, por sorteio ponderado. O peso configurado é ajustado pela saúde
+    observada de cada gateway: cai com o quadrado da taxa de sucesso e na
+    proporção da latência média em relação ao gateway mais rápido. Gateways
+    com circuito aberto só são escolhidos se nenhum outro elegível estiver fechado.
+    """
+
+    # Fração mínima do peso mantida para um gateway degradado (tráfego de sondagem)
+    MIN_HEALTH = 0.05
+
+    def __init__(
+        self,
+        routes: Sequence[Tuple[GatewayRoute, ResilientGateway]],
+        *,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        if not routes:
+            raise ValueError("At least one gateway route is required")
+        names = [route.name for route, _ in routes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate gateway names in routes: {names}")
+        self.routes = list(routes)
+        self._by_name = {route.name: gateway for route, gateway in routes}
+        self._random = rng or random.Random()
+
+    @property
+    def gateways(self) -> List[ResilientGateway]:
+        return [gateway for _, gateway in self.routes]
+
+    @property
+    def default(self) -> ResilientGateway:
+        return self.routes[0][1]
+
+    def get(self, name: str) -> ResilientGateway:
+        """Gateway pelo nome gravado em Payment.gateway."""
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise GatewayError(f"Gateway {name} is not configured") from None
+
+    def _effective_weights(
+        self, candidates: Sequence[Tuple[GatewayRoute, ResilientGateway]]
+    ) -> List[float]:
+        latencies = [gateway.latency_ewma for _, gateway in candidates if gateway.latency_ewma]
+        fastest = min(latencies) if latencies else None
+        weights = []
+        for route, gateway in candidates:
+            health = max(self.MIN_HEALTH, 1 - gateway.breaker.error_rate) ** 2
+            if fastest is not None and gateway.latency_ewma:
+                health *= max(self.MIN_HEALTH, fastest / gateway.latency_ewma)
+            weights.append(route.weight * health)
+        return weights
+
+    def choose(self, amount: Decimal, currency: str) -> ResilientGateway:
+        eligible = [(route, gateway) for route, gateway in self.routes if route.accepts(amount, currency)]
+        if not eligible:
+            raise NoGatewayRouteError(f"No gateway accepts {amount} {currency.upper()}")
+        closed = [item for item in eligible if item[1].breaker.state == CircuitState.CLOSED]
+        candidates = closed or eligible
+        if len(candidates) == 1:
+            return candidates[0][1]
+        return self._random.choices(
+            [gateway for _, gateway in candidates], weights=self._effective_weights(candidates)
+        )[0]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Estado de cada gateway com a rota configurada e o peso efetivo atual."""
+        weights = self._effective_weights(self.routes)
+        return [
+            {
+                **gateway.snapshot(),
+                "route": route.model_dump(mode="json", exclude={"options"}),
+                "effective_weight": round(weight, 4),
+            }
+            for (route, gateway), weight in zip(self.routes, weights)
+        ]
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import asyncpg
+
+from app.core.sharding import get_shard_router
+from .schema import PaymentStatusRead
+
+logger = logging.getLogger(__name__)
+
+# Canal do Postgres usado para distribuir as mudanças de status entre os workers
+NOTIFY_CHANNEL = "payment_status"
+# Cada assinante guarda poucos eventos; só o status mais recente importa
+SUBSCRIBER_QUEUE_SIZE = 8
+
+
+class PaymentEventBroker:
+    """
+    Pub/sub em memória para mudanças de status de pagamentos.
+    Clientes aguardando um pagamento assinam o seu ID e recebem os eventos
+    sem consultar o banco. Cada processo (worker) tem o seu broker; o
+    fan-out entre workers é feito pelo PaymentEventListener (LISTEN/NOTIFY).
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[uuid.UUID, Set[asyncio.Queue]] = defaultdict(set)
+        # Identifica este processo para ignorar as próprias notificações do Postgres
+        self.origin = uuid.uuid4().hex
+
+    def open_subscription(self, payment_id: uuid.UUID) -> asyncio.Queue:
+        """Registra um novo assinante do pagamento. Deve ser fechado com close_subscription."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[payment_id].add(queue)
+        return queue
+
+    def close_subscription(self, payment_id: uuid.UUID, queue: asyncio.Queue) -> None:
+        """Remove o assinante registrado por open_subscription."""
+        subscribers = self._subscribers.get(payment_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[payment_id]
+
+    @asynccontextmanager
+    async def subscribe(self, payment_id: uuid.UUID) -> AsyncIterator[asyncio.Queue]:
+        """Assina os eventos de um pagamento enquanto o contexto estiver aberto."""
+        queue = self.open_subscription(payment_id)
+        try:
+            yield queue
+        finally:
+            self.close_subscription(payment_id, queue)
+
+    def publish(self, event: PaymentStatusRead) -> None:
+        """Entrega o evento a todos os assinantes locais do pagamento."""
+        for queue in self._subscribers.get(event.id, ()):
+            if queue.full():
+                # Assinante lento: descarta o evento mais antigo
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def notify_payload(self, event: PaymentStatusRead) -> str:
+        """Serializa o evento para envio via pg_notify."""
+        return json.dumps({"origin": self.origin, "event": event.model_dump(mode="json")})
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+payment_events = PaymentEventBroker()
+
+
+class PaymentEventListener:
+    """
+    Escuta o canal NOTIFY_CHANNEL do Postgres e republica no broker local os
+    eventos gerados por outros workers. Usa uma única conexão asyncpg dedicada
+    (fora do pool do SQLAlchemy) e reconecta se ela cair.
+    """
+
+    RECONNECT_DELAY_SECONDS = 5.0
+
+    def __init__(self, broker: PaymentEventBroker, dsn: str) -> None:
+        self.broker = broker
+        self.dsn = dsn
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            if message.get("origin") == self.broker.origin:
+                return
+            self.broker.publish(PaymentStatusRead.model_validate(message["event"]))
+        except Exception:
+            logger.exception("Invalid payment status notification: %r", payload)
+
+    async def _run(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(NOTIFY_CHANNEL, self._on_notification)
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Payment status listener failed; reconnecting")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+
+
+def create_listeners() -> List[PaymentEventListener]:
+    """
+    Cria um listener de LISTEN/NOTIFY por shard: o NOTIFY é emitido na
+    transação do pagamento, então só chega a quem escuta o banco daquele shard.
+    """
+    return [PaymentEventListener(payment_events, shard.dsn) for shard in get_shard_router().shards]
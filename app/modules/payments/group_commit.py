@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import AsyncSessionFactory
+from app.core.sharding import Shard
+from .models import Payment, PaymentStatus
+from .repository import GatewayResult, PaymentRepository
+from .schema import PaymentCreate
+
+logger = logging.getLogger(__name__)
+
+_PendingCreate = Tuple[Tuple[PaymentCreate, uuid.UUID, str], "asyncio.Future[Payment]"]
+_PendingResult = Tuple[GatewayResult, "asyncio.Future[Optional[Payment]]"]
+
+# Erro gravado em um pagamento cuja criação foi cancelada antes da resposta do gateway
+ABANDONED_MESSAGE = "Criação cancelada antes da resposta do gateway"
+
+
+class GroupCommitWriter:
+    """
+    Group commit das escritas de criação de pagamento no worker: a criação e,
+    depois da chamada ao gateway, a resposta dele entram em uma fila, e cada
+    pedido aguarda o próprio resultado. Uma task grava a fila em uma única
+    transação (INSERT multi-linha + UPDATE ... FROM VALUES, um commit) quando o
+    primeiro pedido completa max_delay ou a fila chega a max_batch. Com muitas
+    criações simultâneas, cada pagamento custa dois lugares em lotes (um flush
+    do WAL por lote, não por pagamento); com pouco tráfego, cada escrita espera
+    no máximo max_delay a mais.
+
+    Se o lote falhar (ex: o usuário de uma das linhas foi removido), cada escrita
+    é refeita na própria transação e só o pedido com problema recebe o erro.
+    Criações canceladas antes do flush são descartadas; se o cancelamento chega
+    com o INSERT já em andamento, o pagamento é marcado como FAILED. Respostas do
+    gateway são gravadas mesmo que o pedido seja cancelado enquanto aguarda.
+    """
+
+    def __init__(
+        self,
+        repository: PaymentRepository,
+        *,
+        max_delay: float,
+        max_batch: int,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionFactory,
+    ) -> None:
+        self.repository = repository
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._session_factory = session_factory
+        self._creates: List[_PendingCreate] = []
+        self._results: List[_PendingResult] = []
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats: Dict[str, int] = {
+            "batches": 0, "rows": 0, "fallbacks": 0, "errors": 0, "conflicts": 0, "abandoned": 0,
+        }
+
+    async def create(self, *, payment_in: PaymentCreate, user_id: uuid.UUID, gateway: str) -> Payment:
+        """Mesmo contrato de PaymentRepository.create, gravando junto com as escritas simultâneas."""
+        return await self._enqueue(self._creates, (payment_in, user_id, gateway))
+
+    async def apply_result(
+        self,
+        *,
+        db_payment: Payment,
+        new_status: PaymentStatus,
+        gateway_payment_id: Optional[str] = None,
+        error_message: Optional[str] = None,
+    ) -> Optional[Payment]:
+        """
+        Grava a resposta do gateway junto com as escritas simultâneas. Retorna
+        db_payment atualizado, ou None se ele mudou de versão desde a leitura ou a
+        transição não é permitida (quem chama relê e decide).
+        """
+        return await self._enqueue(self._results, (db_payment, new_status, gateway_payment_id, error_message))
+
+    def submit_result(
+        self,
+        *,
+        db_payment: Payment,
+        new_status: PaymentStatus,
+        gateway_payment_id: Optional[str] = None,
+        error_message: Optional[str] = None,
+    ) -> None:
+        """Como apply_result, sem aguardar o resultado (falhas vão para o log)."""
+        future = self._enqueue(self._results, (db_payment, new_status, gateway_payment_id, error_message))
+        future.add_done_callback(_log_failure)
+
+    def _enqueue(self, queue: List[Any], item: Any) -> "asyncio.Future[Any]":
+        self.start()
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        queue.append((item, future))
+        self._has_pending.set()
+        if self._pending_count() >= self.max_batch:
+            self._batch_full.set()
+        return future
+
+    def _pending_count(self) -> int:
+        return len(self._creates) + len(self._results)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Grava o que estiver na fila e encerra a task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._has_pending.set()
+        try:
+            await self._task
+        finally:
+            self._task = None
+            self._stopping = False
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if self._stopping and not self._pending_count():
+                return
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush(*self._take_batch())
+
+    def _take_batch(self) -> Tuple[List[_PendingCreate], List[_PendingResult]]:
+        creates, self._creates = self._creates[: self.max_batch], self._creates[self.max_batch :]
+        room = self.max_batch - len(creates)
+        results, self._results = self._results[:room], self._results[room:]
+        if self._pending_count() < self.max_batch:
+            self._batch_full.clear()
+        if not self._pending_count() and not self._stopping:
+            self._has_pending.clear()
+        # Criações canceladas ainda na fila não são gravadas; respostas do gateway sempre são
+        return [(row, future) for row, future in creates if not future.done()], results
+
+    async def _flush(self, creates: List[_PendingCreate], results: List[_PendingResult]) -> None:
+        if not creates and not results:
+            return
+        try:
+            async with self._session_factory() as db:
+                created, updated = await self.repository.write_batch(
+                    db,
+                    payments=[row for row, _ in creates],
+                    gateway_results=[result for result, _ in results],
+                )
+        except Exception as e:
+            logger.warning(
+                "Group commit of %d payment writes failed, retrying one by one: %s", len(creates) + len(results), e
+            )
+            self.stats["fallbacks"] += 1
+            await self._flush_one_by_one(creates, results)
+            return
+        self.stats["batches"] += 1
+        self.stats["rows"] += len(creates) + len(results)
+        for (_, future), payment in zip(creates, created):
+            self._resolve_create(future, payment)
+        self._resolve_results(results, updated)
+
+    async def _flush_one_by_one(self, creates: List[_PendingCreate], results: List[_PendingResult]) -> None:
+        for row, future in creates:
+            try:
+                async with self._session_factory() as db:
+                    (payment,), _ = await self.repository.write_batch(db, payments=[row])
+            except Exception as e:
+                self._fail(future, e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["rows"] += 1
+            self._resolve_create(future, payment)
+        for result, future in results:
+            try:
+                async with self._session_factory() as db:
+                    _, updated = await self.repository.write_batch(db, gateway_results=[result])
+            except Exception as e:
+                self._fail(future, e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["rows"] += 1
+            self._resolve_results([(result, future)], updated)
+
+    def _resolve_create(self, future: "asyncio.Future[Payment]", payment: Payment) -> None:
+        if not future.done():
+            future.set_result(payment)
+            return
+        # O pedido foi cancelado com o INSERT já em andamento: ninguém vai chamar o
+        # gateway para este pagamento, que ficaria PENDING para sempre
+        self.stats["abandoned"] += 1
+        self.submit_result(db_payment=payment, new_status=PaymentStatus.FAILED, error_message=ABANDONED_MESSAGE)
+
+    def _resolve_results(self, results: List[_PendingResult], updated: List[Payment]) -> None:
+        updated_ids = {payment.id for payment in updated}
+        for (db_payment, *_), future in results:
+            applied = db_payment.id in updated_ids
+            if not applied:
+                self.stats["conflicts"] += 1
+            if not future.done():
+                future.set_result(db_payment if applied else None)
+
+    def _fail(self, future: "asyncio.Future[Any]", error: Exception) -> None:
+        self.stats["errors"] += 1
+        if not future.done():
+            future.set_exception(error)
+        else:
+            logger.error("Group commit write failed after its request was cancelled: %s", error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "pending": self._pending_count(),
+            "mean_batch_size": round(self.stats["rows"] / batches, 2) if batches else 0.0,
+        }
+
+
+# Um writer por shard: cada lote é um commit em um único banco
+_writers: Dict[int, GroupCommitWriter] = {}
+
+
+def get_payment_writer(shard: Shard) -> GroupCommitWriter:
+    """Writer das criações de pagamento no shard (a task inicia na primeira escrita)."""
+    writer = _writers.get(shard.index)
+    if writer is None:
+        writer = _writers[shard.index] = GroupCommitWriter(
+            PaymentRepository(),
+            max_delay=settings.PAYMENTS_GROUP_COMMIT_MAX_DELAY_MS / 1000,
+            max_batch=settings.PAYMENTS_GROUP_COMMIT_MAX_BATCH,
+            session_factory=shard.session_factory,
+        )
+    return writer
+
+
+async def stop_payment_writers() -> None:
+    """Grava as escritas ainda na fila de todos os shards e encerra os writers."""
+    for writer in _writers.values():
+        await writer.stop()
+
+
+def _log_failure(future: "asyncio.Future[Any]") -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Group commit write failed: %s", future.exception())
+
+
+metrics.register(
+    "payments.group_commit",
+    lambda: {str(index): writer.snapshot() for index, writer in sorted(_writers.items())},
+)
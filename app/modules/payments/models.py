@@ -1,14 +1,17 @@
 import uuid
 import enum
 from datetime import datetime
-from typing import TYPE_CHECKING
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, NamedTuple, Optional
 
 from sqlalchemy import (
     ForeignKey,
     String,
     Numeric,
+    Integer,
     DateTime,
     func,
+    Index,
     Enum as SQLAlchemyEnum,
     JSON 
 )
@@ -16,6 +19,7 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB 
 
 from app.core.database import Base
+from app.core.ids import new_id
 
 if TYPE_CHECKING:
     from app.modules.users.models import User # Evita importação circular
@@ -30,15 +34,72 @@ class PaymentStatus(str, enum.Enum):
     REFUNDED = "REFUNDED"
     CHARGEBACK = "CHARGEBACK"
 
+# Estados em que o pagamento ainda aguarda uma decisão do gateway
+OPEN_STATUSES = frozenset({PaymentStatus.PENDING, PaymentStatus.PROCESSING})
+
+# Transições de status permitidas (origem -> destinos possíveis)
+PAYMENT_STATUS_TRANSITIONS: Dict[PaymentStatus, FrozenSet[PaymentStatus]] = {
+    PaymentStatus.PENDING: frozenset({
+        PaymentStatus.PROCESSING, PaymentStatus.APPROVED, PaymentStatus.FAILED, PaymentStatus.CANCELED,
+    }),
+    PaymentStatus.PROCESSING: frozenset({
+        PaymentStatus.APPROVED, PaymentStatus.FAILED, PaymentStatus.CANCELED,
+    }),
+    PaymentStatus.APPROVED: frozenset({PaymentStatus.REFUNDED, PaymentStatus.CHARGEBACK}),
+    PaymentStatus.FAILED: frozenset(),
+    PaymentStatus.CANCELED: frozenset(),
+    PaymentStatus.REFUNDED: frozenset(),
+    PaymentStatus.CHARGEBACK: frozenset(),
+}
+
+
+class InvalidStatusTransition(ValueError):
+    """Mudança de status não permitida por PAYMENT_STATUS_TRANSITIONS."""
+
+
+class ConcurrentUpdateError(Exception):
+    """O pagamento foi alterado por outra transação desde que foi lido (versão divergente)."""
+
+
+def can_transition(current: PaymentStatus, new: PaymentStatus) -> bool:
+    """Indica se um pagamento em current pode ir para new (manter o status é sempre permitido)."""
+    return current == new or new in PAYMENT_STATUS_TRANSITIONS[current]
+
+
+def transition_sources(target: PaymentStatus) -> FrozenSet[PaymentStatus]:
+    """Status a partir dos quais target é alcançável."""
+    return frozenset(
+        source for source, targets in PAYMENT_STATUS_TRANSITIONS.items() if target in targets
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Índice GIN para buscas por containment (@>) no metadata
+        Index(
+            "ix_payments_metadata",
+            "metadata",
+            postgresql_using="gin",
+            postgresql_ops={"metadata": "jsonb_path_ops"},
+        ),
+    )
 
-    # Identificador único do pagamento em nosso sistema
+    # Identificador do pagamento em nosso sistema.
+    # No banco a chave primária é (id, created_at), exigida pelo particionamento
+    # mensal por created_at: o banco não impede dois pagamentos com o mesmo id em
+    # meses diferentes. A unicidade vem da geração (UUIDv4/v7 aleatórios, com o
+    # instante de criação nos v7), e o ORM identifica o pagamento só pelo id.
+    # Buscas só por id consultam o índice de todas as partições: as do repositório
+    # limitam created_at pelo instante do UUIDv7 (_created_at_window); o UPDATE
+    # versionado do ORM filtra por id e version, então updates em caminhos quentes
+    # usam UPDATE explícito com created_at (ex: write_batch).
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        UUID(as_uuid=True), primary_key=True, default=new_id
     )
     # Chave estrangeira para o usuário que iniciou o pagamento
-    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
     # Valor monetário do pagamento (precisão é importante)
     amount: Mapped[Numeric] = mapped_column(Numeric(10, 2))
     # Código da moeda ISO 4217
@@ -59,7 +120,7 @@ class Payment(Base):
     metadata_: Mapped[dict | None] = mapped_column(
         "metadata", JSONB 
     )
-    # Timestamp da criação do registro
+    # Timestamp da criação do registro (chave de particionamento da tabela)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -67,6 +128,34 @@ class Payment(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # Versão para controle de concorrência otimista: todo UPDATE do ORM inclui
+    # "WHERE version = <lida>" e a incrementa; updates em massa também a incrementam
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     # Relacionamento com o modelo User
     user: Mapped["User"] = relationship(back_populates="payments")
+
+    # eager_defaults: created_at/updated_at voltam via RETURNING no INSERT/UPDATE,
+    # sem refresh (e nova conexão) depois do commit
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+
+
+class PaymentRecord(NamedTuple):
+    """
+    Pagamento somente leitura usado nas listagens: só os valores das colunas,
+    sem identity map, instrumentação de atributos nem estado de relacionamentos.
+    Os schemas de resposta o leem como um Payment (from_attributes).
+    """
+    id: uuid.UUID
+    user_id: uuid.UUID
+    amount: Decimal
+    currency: str
+    status: PaymentStatus
+    description: Optional[str]
+    gateway: str
+    gateway_payment_id: Optional[str]
+    error_message: Optional[str]
+    metadata_: Optional[Dict[str, Any]]
+    created_at: datetime
+    updated_at: datetime
+    version: int
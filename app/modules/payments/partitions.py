@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import gzip
+import logging
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.database import asyncpg_dsn
+from app.core.sharding import shard_urls
+
+logger = logging.getLogger(__name__)
+
+# Tabela particionada por RANGE (created_at), uma partição por mês
+PARENT_TABLE = "payments"
+# Recebe linhas sem partição do mês (criada pela migration); deve ficar vazia
+DEFAULT_PARTITION = "payments_default"
+# Advisory lock que serializa a criação de partições entre workers e o cron
+PARTITION_LOCK_KEY = 0x5EC0_0002
+_PARTITION_NAME = re.compile(r"^payments_y(\d{4})m(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Nome da partição mensal (ex: payments_y2026m10)."""
+    return f"{PARENT_TABLE}_y{month:%Y}m{month:%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Mês coberto por uma partição, ou None se o nome não seguir o padrão."""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+async def list_partitions(conn: asyncpg.Connection) -> List[str]:
+    """Partições mensais atualmente anexadas à tabela payments."""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+        """,
+        PARENT_TABLE,
+    )
+    return sorted(row["relname"] for row in rows if partition_month(row["relname"]))
+
+
+async def list_detached_partitions(conn: asyncpg.Connection) -> List[str]:
+    """Tabelas mensais de payments que existem mas não estão anexadas (ex: arquivamento interrompido)."""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_class c
+        WHERE c.relkind = 'r'
+          AND c.relnamespace = current_schema()::regnamespace
+          AND c.relname LIKE $1
+          AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+        """,
+        f"{PARENT_TABLE}\\_y%",
+    )
+    return sorted(row["relname"] for row in rows if partition_month(row["relname"]))
+
+
+async def _create_partition(conn: asyncpg.Connection, name: str, month: date) -> None:
+    """
+    Cria a partição de month. Se a partição DEFAULT já recebeu linhas desse mês
+    (manutenção atrasada), o CREATE ... PARTITION OF falharia: a tabela é criada
+    avulsa, as linhas são movidas para ela e só então ela é anexada.
+    """
+    # DDL não aceita parâmetros; os valores vêm de datas geradas aqui
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    in_default = False
+    if await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", DEFAULT_PARTITION):
+        in_default = await conn.fetchval(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" '
+            "WHERE created_at >= $1::date AND created_at < $2::date)",
+            month,
+            add_months(month, 1),
+        )
+    if not in_default:
+        await conn.execute(
+            f'CREATE TABLE "{name}" PARTITION OF {PARENT_TABLE} '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        return
+    await conn.execute(f'CREATE TABLE "{name}" (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    moved = await conn.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= $1::date AND created_at < $2::date RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+        """,
+        month,
+        add_months(month, 1),
+    )
+    await conn.execute(
+        f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    logger.warning("Moved rows from %s to new partition %s (%s)", DEFAULT_PARTITION, name, moved)
+
+
+async def ensure_partitions(
+    conn: asyncpg.Connection, months_ahead: Optional[int] = None
+) -> List[str]:
+    """
+    Cria as partições do mês atual até months_ahead meses à frente. Retorna as criadas.
+    Roda em uma transação, sob advisory lock: workers simultâneos não disputam o mesmo CREATE.
+    """
+    if months_ahead is None:
+        months_ahead = settings.PAYMENTS_PARTITION_MONTHS_AHEAD
+    current = month_start(_today())
+    created = []
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITION_LOCK_KEY)
+        existing = set(await list_partitions(conn))
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            await _create_partition(conn, name, month)
+            created.append(name)
+    return created
+
+
+async def detach_old_partitions(
+    conn: asyncpg.Connection, retention_months: Optional[int] = None
+) -> List[str]:
+    """Desanexa as partições anteriores à janela de retenção. Retorna as desanexadas."""
+    if retention_months is None:
+        retention_months = settings.PAYMENTS_RETENTION_MONTHS
+    cutoff = add_months(month_start(_today()), -retention_months)
+    detached = []
+    for name in await list_partitions(conn):
+        if partition_month(name) < cutoff:
+            await conn.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"')
+            detached.append(name)
+    return detached
+
+
+async def archive_partition(
+    conn: asyncpg.Connection, name: str, directory: Optional[str] = None
+) -> Path:
+    """
+    Exporta uma partição já desanexada para <directory>/<name>.csv.gz (via COPY)
+    e remove a tabela. Recusa partições ainda anexadas à tabela payments.
+    """
+    if partition_month(name) is None:
+        raise ValueError(f"{name!r} is not a payments partition")
+    if name in await list_partitions(conn):
+        raise ValueError(f"Partition {name!r} is still attached; detach it first")
+
+    target_dir = Path(directory or settings.PAYMENTS_ARCHIVE_DIR)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    path = target_dir / f"{name}.csv.gz"
+    tmp_path = path.with_suffix(".gz.tmp")
+
+    with gzip.open(tmp_path, "wb") as archive:
+        async def write(chunk: bytes) -> None:
+            await asyncio.to_thread(archive.write, chunk)
+
+        await conn.copy_from_table(name, output=write, format="csv", header=True)
+    # Só remove a tabela depois que o arquivo completo estiver no lugar
+    tmp_path.replace(path)
+    await conn.execute(f'DROP TABLE "{name}"')
+    return path
+
+
+async def run_maintenance_loop(interval_seconds: float) -> None:
+    """Mantém as partições futuras criadas em todos os shards, verificando a cada interval_seconds."""
+    while True:
+        for index, url in enumerate(shard_urls()):
+            try:
+                conn = await asyncpg.connect(asyncpg_dsn(url))
+                try:
+                    created = await ensure_partitions(conn)
+                finally:
+                    await conn.close()
+                if created:
+                    logger.info("Created payments partitions on shard %d: %s", index, ", ".join(created))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Payments partition maintenance failed on shard %d", index)
+        await asyncio.sleep(interval_seconds)
+
+
+async def _run_on_shard(args: argparse.Namespace, index: int, url: str, sharded: bool) -> None:
+    conn = await asyncpg.connect(asyncpg_dsn(url))
+    prefix = f"[shard {index}] " if sharded else ""
+    try:
+        if args.command == "ensure":
+            created = await ensure_partitions(conn, args.months_ahead)
+            print(f"{prefix}Created:", ", ".join(created) or "-")
+        elif args.command == "archive":
+            # Partições de shards diferentes têm o mesmo nome: um subdiretório por shard
+            directory = args.dir or settings.PAYMENTS_ARCHIVE_DIR
+            if sharded:
+                directory = str(Path(directory) / f"shard-{index}")
+            await detach_old_partitions(conn, args.retention_months)
+            # Inclui as desanexadas em execuções anteriores cujo arquivamento falhou
+            detached = await list_detached_partitions(conn)
+            for name in detached:
+                path = await archive_partition(conn, name, directory)
+                print(f"{prefix}Archived {name} -> {path}")
+            if not detached:
+                print(f"{prefix}Nothing to archive")
+    finally:
+        await conn.close()
+
+
+async def _run_command(args: argparse.Namespace) -> None:
+    urls = shard_urls()
+    sharded = len(urls) > 1
+    indexes = range(len(urls)) if args.shard is None else [args.shard]
+    for index in indexes:
+        await _run_on_shard(args, index, urls[index], sharded)
+
+
+def main() -> None:
+    """Manutenção das partições de payments pela linha de comando (ex: via cron)."""
+    parser = argparse.ArgumentParser(description="Manutenção das partições da tabela payments.")
+    parser.add_argument(
+        "--shard", type=int, default=None, help="Índice do shard (padrão: todos)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ensure = subparsers.add_parser("ensure", help="Cria as partições dos próximos meses")
+    ensure.add_argument("--months-ahead", type=int, default=None)
+    archive = subparsers.add_parser(
+        "archive", help="Desanexa partições antigas e arquiva em .csv.gz todas as desanexadas"
+    )
+    archive.add_argument("--retention-months", type=int, default=None)
+    archive.add_argument("--dir", default=None)
+    asyncio.run(_run_command(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
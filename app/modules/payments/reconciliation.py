@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, func, select
+
+from app.core.config import settings
+from app.core.sharding import Shard, get_shard_router
+from app.core.throttling import AdaptiveConcurrencyLimiter, AsyncTokenBucket
+from app.modules.gateway.base import GatewayError, GatewayTimeoutError, GatewayUnavailableError
+from app.modules.gateway.factory import get_gateway
+from .models import PaymentStatus
+from .repository import PaymentRepository
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que garante um único sweeper ativo entre os workers
+RECONCILIATION_LOCK_KEY = 0x5EC0_0001
+
+
+@dataclass
+class ReconciliationReport:
+    scanned: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    duration_seconds: float = 0.0
+    skipped: bool = False
+
+
+class ReconciliationSweeper:
+    """
+    Reconciliação de pagamentos presos em PROCESSING (ex: webhook perdido).
+    Percorre os pagamentos parados há mais de stale_after em lotes (keyset por id),
+    consulta o status no gateway com concorrência adaptativa e limite de taxa,
+    e aplica as mudanças com um UPDATE set-based por lote.
+    Os shards são varridos um de cada vez, cada um sob o próprio advisory lock.
+    Nenhuma conexão com o banco fica presa enquanto o gateway é consultado.
+    """
+
+    def __init__(
+        self,
+        repository: PaymentRepository = PaymentRepository(),
+        *,
+        stale_after: Optional[timedelta] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+    ) -> None:
+        self.repository = repository
+        self.stale_after = stale_after or timedelta(seconds=settings.RECONCILIATION_STALE_AFTER_SECONDS)
+        self.batch_size = batch_size or settings.RECONCILIATION_BATCH_SIZE
+        max_concurrency = max_concurrency or settings.RECONCILIATION_MAX_CONCURRENCY
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial=max(1, max_concurrency // 4), max_limit=max_concurrency
+        )
+        self.rate_limiter = AsyncTokenBucket(rate_per_second or settings.RECONCILIATION_RATE_PER_SECOND)
+
+    async def _query_gateway(
+        self, row: Row
+    ) -> Optional[Tuple[PaymentStatus, Optional[str]]]:
+        """
+        Consulta o status de um pagamento; None se a consulta falhar por qualquer
+        motivo. Um erro em uma linha não interrompe o lote nem a varredura do shard.
+        """
+        await self.rate_limiter.acquire()
+        async with self.limiter:
+            try:
+                result = await get_gateway(row.gateway).get_payment_status(row.gateway_payment_id)
+            except (GatewayTimeoutError, GatewayUnavailableError):
+                # Gateway sobrecarregado/indisponível: reduz a concorrência
+                self.limiter.on_failure()
+                return None
+            except GatewayError as e:
+                logger.warning("Reconciliation query failed for payment %s: %s", row.id, e)
+                return None
+            except Exception:
+                # Ex: gateway desconhecido na linha ou resposta inesperada
+                logger.exception("Reconciliation query failed for payment %s", row.id)
+                return None
+            self.limiter.on_success()
+            return result.status, result.error_message
+
+    async def _reconcile_batch(self, shard: Shard, rows: Sequence[Row], report: ReconciliationReport) -> None:
+        results = await asyncio.gather(
+            *(self._query_gateway(row) for row in rows), return_exceptions=True
+        )
+        updates: List[Tuple] = []
+        for row, result in zip(rows, results):
+            if isinstance(result, BaseException):
+                logger.error("Reconciliation failed for payment %s", row.id, exc_info=result)
+                report.errors += 1
+            elif result is None:
+                report.errors += 1
+            elif result[0] == PaymentStatus.PROCESSING:
+                report.unchanged += 1
+            else:
+                updates.append((row.id, result[0], result[1]))
+        if updates:
+            async with shard.session_factory() as db:
+                changed = await self.repository.apply_status_updates(
+                    db, updates=updates, expected_status=PaymentStatus.PROCESSING
+                )
+            report.updated += len(changed)
+
+    async def run_once(self) -> ReconciliationReport:
+        """
+        Executa uma varredura completa em todos os shards.
+        Retorna skipped=True se outro worker já estava varrendo algum deles.
+        """
+        report = ReconciliationReport()
+        started = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - self.stale_after
+        for shard in get_shard_router().shards:
+            await self._sweep_shard(shard, cutoff, report)
+        report.duration_seconds = round(time.monotonic() - started, 3)
+        return report
+
+    async def _sweep_shard(self, shard: Shard, cutoff: datetime, report: ReconciliationReport) -> None:
+        # Advisory lock de sessão em uma conexão dedicada (autocommit: sem transação aberta)
+        async with shard.engine.connect() as lock_conn:
+            lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = await lock_conn.scalar(
+                select(func.pg_try_advisory_lock(RECONCILIATION_LOCK_KEY))
+            )
+            if not acquired:
+                report.skipped = True
+                return
+            try:
+                after_id = None
+                while True:
+                    async with shard.session_factory() as db:
+                        rows = await self.repository.get_stale_by_status(
+                            db,
+                            status=PaymentStatus.PROCESSING,
+                            updated_before=cutoff,
+                            after_id=after_id,
+                            limit=self.batch_size,
+                        )
+                    if not rows:
+                        break
+                    report.scanned += len(rows)
+                    after_id = rows[-1].id
+                    await self._reconcile_batch(shard, rows, report)
+            finally:
+                await lock_conn.scalar(select(func.pg_advisory_unlock(RECONCILIATION_LOCK_KEY)))
+
+
+async def run_reconciliation_loop(interval_seconds: float) -> None:
+    """Roda o sweeper periodicamente (iniciado no lifespan da aplicação)."""
+    sweeper = ReconciliationSweeper()
+    while True:
+        try:
+            report = await sweeper.run_once()
+            if report.scanned:
+                logger.info("Payment reconciliation: %s", asdict(report))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Payment reconciliation failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def main() -> None:
+    """Executa uma varredura de reconciliação pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Reconcilia pagamentos presos em PROCESSING.")
+    parser.add_argument("--stale-after-seconds", type=float, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--rate", type=float, default=None, help="Consultas por segundo ao gateway")
+    args = parser.parse_args()
+    sweeper = ReconciliationSweeper(
+        stale_after=(
+            timedelta(seconds=args.stale_after_seconds) if args.stale_after_seconds else None
+        ),
+        batch_size=args.batch_size,
+        max_concurrency=args.max_concurrency,
+        rate_per_second=args.rate,
+    )
+    print(asdict(asyncio.run(sweeper.run_once())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,59 @@
 import uuid
-from typing import Sequence, Any, Dict, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, List, Sequence, Any, Dict, Optional, Tuple
 
-from sqlalchemy import select, update
+from sqlalchemy import Integer, String, Row, and_, any_, bindparam, cast, column, insert, select, update, delete, func, or_, values
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 
-from .models import Payment, PaymentStatus
-from .schema import PaymentCreate, PaymentUpdate
+from app.core.config import settings
+from app.core.ids import uuid7_datetime
+from app.core.sharding import get_shard_router
+from .events import NOTIFY_CHANNEL, payment_events
+from .models import (
+    ConcurrentUpdateError,
+    InvalidStatusTransition,
+    Payment,
+    PaymentRecord,
+    PaymentStatus,
+    can_transition,
+)
+from .schema import PaymentCreate, PaymentUpdate, PaymentStatusRead
+
+# Margem entre o instante embutido em um UUIDv7 e o created_at gravado pelo banco
+ID_CLOCK_SKEW = timedelta(hours=1)
+
+# Resposta do gateway para um pagamento criado: (db_payment, novo_status, gateway_payment_id, error_message)
+GatewayResult = Tuple[Payment, PaymentStatus, Optional[str], Optional[str]]
+
+
+def _uuid_array(ids: Sequence[uuid.UUID]):
+    """Lista de UUIDs como um único parâmetro uuid[] (para = ANY(...))."""
+    return bindparam(None, list(ids), type_=ARRAY(UUID(as_uuid=True)))
+
+
+def _created_at_window(ids: Sequence[uuid.UUID]) -> List[Any]:
+    """
+    Condições de created_at que limitam uma busca por ids às partições do
+    intervalo de criação embutido nos ids. A chave primária é (id, created_at):
+    sem elas, a busca só por id consulta o índice de todas as partições. Vazia
+    se algum id não for v7 (ex: v4 legados), quando o intervalo é desconhecido.
+    """
+    id_times = [uuid7_datetime(payment_id) for payment_id in ids]
+    if not id_times or None in id_times:
+        return []
+    # A margem cobre a diferença entre o relógio do app e o do banco
+    return [
+        Payment.created_at >= min(id_times) - ID_CLOCK_SKEW,
+        Payment.created_at < max(id_times) + ID_CLOCK_SKEW,
+    ]
+
+
+# Colunas lidas nas listagens, na ordem dos campos de PaymentRecord
+_RECORD_COLUMNS = tuple(getattr(Payment, field) for field in PaymentRecord._fields)
 
 
 class PaymentRepository:
@@ -17,32 +65,212 @@ class PaymentRepository:
         user_id: uuid.UUID, 
         gateway: str
     ) -> Payment:
-        """Cria um novo registro de pagamento no banco."""
+        """Cria um novo registro de pagamento no banco (id no mesmo bucket de shard do usuário)."""
         db_payment = Payment(
             **payment_in.model_dump(),
+            id=get_shard_router().colocated_id(user_id),
             user_id=user_id,
             gateway=gateway,
             status=PaymentStatus.PENDING # Status inicial
         )
         db.add(db_payment)
         await db.commit()
-        await db.refresh(db_payment)
         return db_payment
 
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        payments: Sequence[Tuple[PaymentCreate, uuid.UUID, str]],
+    ) -> List[Payment]:
+        """
+        Cria vários pagamentos (payment_in, user_id, gateway) em um único INSERT
+        multi-linha e um único commit. Retorna os pagamentos na ordem recebida,
+        já com os valores gerados pelo banco (RETURNING).
+        """
+        created, _ = await self.write_batch(db, payments=payments)
+        return created
+
+    async def write_batch(
+        self,
+        db: AsyncSession,
+        *,
+        payments: Sequence[Tuple[PaymentCreate, uuid.UUID, str]] = (),
+        gateway_results: Sequence[GatewayResult] = (),
+    ) -> Tuple[List[Payment], List[Payment]]:
+        """
+        Grava em uma única transação, com um único commit, novos pagamentos
+        (INSERT multi-linha) e as respostas do gateway para pagamentos já criados
+        (db_payment, novo_status, gateway_payment_id, error_message) em um único
+        UPDATE ... FROM (VALUES ...). Cada resposta só é aplicada se o pagamento
+        ainda estiver na versão de db_payment e a transição for permitida.
+        Retorna os pagamentos criados, na ordem recebida, e os que receberam a
+        resposta, atualizados no próprio objeto.
+        """
+        created = await self._insert_many(db, payments) if payments else []
+        events = await self._apply_gateway_results(db, gateway_results) if gateway_results else []
+        await self._commit_status_events(db, events)
+
+        by_id = {db_payment.id: db_payment for db_payment, *_ in gateway_results}
+        updated = []
+        for event in events:
+            db_payment = by_id[event.id]
+            for field in ("status", "gateway_payment_id", "error_message", "updated_at", "version"):
+                # Valor já confirmado no banco: o objeto (destacado) não fica marcado como alterado
+                set_committed_value(db_payment, field, getattr(event, field))
+            updated.append(db_payment)
+        return created, updated
+
+    async def _insert_many(
+        self, db: AsyncSession, payments: Sequence[Tuple[PaymentCreate, uuid.UUID, str]]
+    ) -> List[Payment]:
+        stmt = insert(Payment).returning(Payment, sort_by_parameter_order=True)
+        router = get_shard_router()
+        result = await db.scalars(
+            stmt,
+            [
+                {
+                    **payment_in.model_dump(),
+                    "id": router.colocated_id(user_id),
+                    "user_id": user_id,
+                    "gateway": gateway,
+                    "status": PaymentStatus.PENDING,
+                }
+                for payment_in, user_id, gateway in payments
+            ],
+        )
+        return list(result)
+
+    async def _apply_gateway_results(
+        self, db: AsyncSession, gateway_results: Sequence[GatewayResult]
+    ) -> List[PaymentStatusRead]:
+        rows = [
+            (db_payment.id, db_payment.created_at, db_payment.version, new_status.value, gateway_payment_id, error)
+            for db_payment, new_status, gateway_payment_id, error in gateway_results
+            if can_transition(db_payment.status, new_status)
+        ]
+        if not rows:
+            return []
+        table = Payment.__table__
+        new_values = values(
+            column("id", UUID(as_uuid=True)),
+            column("created_at", table.c.created_at.type),
+            column("version", Integer),
+            column("status", String),
+            column("gateway_payment_id", String),
+            column("error_message", String),
+            name="gateway_results",
+        ).data(rows)
+        stmt = (
+            update(Payment)
+            # (id, created_at) é a chave primária: cada linha vai direto à sua partição
+            .where(
+                Payment.id == new_values.c.id,
+                Payment.created_at == new_values.c.created_at,
+                Payment.version == new_values.c.version,
+            )
+            .values(
+                status=cast(new_values.c.status, table.c.status.type),
+                gateway_payment_id=func.coalesce(new_values.c.gateway_payment_id, Payment.gateway_payment_id),
+                error_message=func.coalesce(new_values.c.error_message, Payment.error_message),
+                updated_at=func.now(),
+                version=Payment.version + 1,
+            )
+            .returning(
+                Payment.id,
+                Payment.status,
+                Payment.gateway_payment_id,
+                Payment.error_message,
+                Payment.updated_at,
+                Payment.version,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        return [PaymentStatusRead.model_validate(row._mapping) for row in result.all()]
+
+    def _id_filter(self, payment_id: uuid.UUID) -> List[Any]:
+        return [Payment.id == payment_id, *_created_at_window([payment_id])]
+
     async def get_by_id(self, db: AsyncSession, payment_id: uuid.UUID) -> Payment | None:
         """Busca um pagamento pelo seu ID."""
-        stmt = select(Payment).where(Payment.id == payment_id)
+        result = await db.execute(select(Payment).where(*self._id_filter(payment_id)))
+        return result.scalar_one_or_none()
+
+    async def exists(self, db: AsyncSession, payment_id: uuid.UUID) -> Optional[bool]:
+        """True se o pagamento está neste banco; None caso contrário (para ShardRouter.locate)."""
+        return await db.scalar(select(True).where(*self._id_filter(payment_id)))
+
+    async def get_by_gateway_payment_id(
+        self, db: AsyncSession, *, gateway: str, gateway_payment_id: str
+    ) -> Payment | None:
+        """Busca um pagamento pelo identificador atribuído pelo gateway."""
+        stmt = select(Payment).where(
+            Payment.gateway == gateway, Payment.gateway_payment_id == gateway_payment_id
+        )
         result = await db.execute(stmt)
         return result.scalar_one_or_none()
 
     async def get_multi(
-        self, db: AsyncSession, *, skip: int = 0, limit: int = 100
-    ) -> Sequence[Payment]:
-        """Busca múltiplos pagamentos com paginação básica."""
-        stmt = select(Payment).offset(skip).limit(limit).order_by(Payment.created_at.desc())
+        self,
+        db: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        user_id: Optional[uuid.UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> List[PaymentRecord]:
+        """
+        Busca múltiplos pagamentos com paginação básica.
+        user_id restringe aos pagamentos do usuário (None = de todos).
+        Se metadata for informado, retorna apenas pagamentos cujo metadata o contém
+        (operador @>, atendido pelo índice GIN ix_payments_metadata).
+        created_from/created_to ([from, to)) limitam a busca às partições do período.
+        Só leitura: seleciona as colunas em PaymentRecord, sem instanciar o modelo ORM.
+        """
+        stmt = select(*_RECORD_COLUMNS)
+        if user_id is not None:
+            stmt = stmt.where(Payment.user_id == user_id)
+        if created_from is not None:
+            stmt = stmt.where(Payment.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Payment.created_at < created_to)
+        if metadata:
+            stmt = stmt.where(Payment.metadata_.contains(metadata))
+        stmt = stmt.offset(skip).limit(limit).order_by(Payment.created_at.desc())
         result = await db.execute(stmt)
-        return result.scalars().all()
+        return [PaymentRecord._make(row) for row in result]
         
+    async def totals_by_currency(
+        self,
+        db: AsyncSession,
+        *,
+        statuses: Sequence[PaymentStatus],
+        user_id: Optional[uuid.UUID] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> List[Row]:
+        """
+        Quantidade e soma dos valores por moeda (currency, count, amount), agregadas
+        no banco: uma linha por moeda, qualquer que seja o número de pagamentos.
+        """
+        currency = func.upper(Payment.currency)
+        stmt = (
+            select(currency.label("currency"), func.count().label("count"), func.sum(Payment.amount).label("amount"))
+            .where(Payment.status.in_(list(statuses)))
+            .group_by(currency)
+        )
+        if user_id is not None:
+            stmt = stmt.where(Payment.user_id == user_id)
+        if created_from is not None:
+            stmt = stmt.where(Payment.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Payment.created_at < created_to)
+        result = await db.execute(stmt)
+        return list(result)
+
     async def update(
         self, 
         db: AsyncSession, 
@@ -50,7 +278,10 @@ class PaymentRepository:
         db_payment: Payment, 
         payment_in: PaymentUpdate | Dict[str, Any]
     ) -> Payment:
-        """Atualiza um registro de pagamento existente."""
+        """
+        Atualiza um registro de pagamento existente.
+        Lança ConcurrentUpdateError se outra transação alterou o pagamento desde a leitura.
+        """
         if isinstance(payment_in, dict):
             update_data = payment_in
         else:
@@ -62,10 +293,19 @@ class PaymentRepository:
             setattr(db_payment, field, value)
 
         db.add(db_payment)
-        await db.commit()
-        await db.refresh(db_payment)
+        async with self._version_conflicts(db):
+            await db.commit()
         return db_payment
         
+    @asynccontextmanager
+    async def _version_conflicts(self, db: AsyncSession) -> AsyncIterator[None]:
+        """Converte o UPDATE versionado que não encontrou a versão lida em ConcurrentUpdateError."""
+        try:
+            yield
+        except StaleDataError as e:
+            await db.rollback()
+            raise ConcurrentUpdateError(str(e)) from e
+
     async def update_status(
         self,
         db: AsyncSession,
@@ -75,7 +315,13 @@ class PaymentRepository:
         gateway_payment_id: Optional[str] = None,
         error_message: Optional[str] = None
     ) -> Payment:
-        """Atualiza especificamente o status e informações relacionadas do gateway."""
+        """
+        Atualiza especificamente o status e informações relacionadas do gateway.
+        Lança InvalidStatusTransition se a mudança não for permitida e
+        ConcurrentUpdateError se outra transação alterou o pagamento desde a leitura.
+        """
+        if not can_transition(db_payment.status, new_status):
+            raise InvalidStatusTransition(f"{db_payment.status.value} -> {new_status.value}")
         db_payment.status = new_status
         if gateway_payment_id is not None:
              db_payment.gateway_payment_id = gateway_payment_id
@@ -83,6 +329,240 @@ class PaymentRepository:
              db_payment.error_message = error_message
              
         db.add(db_payment)
-        await db.commit()
-        await db.refresh(db_payment)
+        async with self._version_conflicts(db):
+            if settings.PAYMENT_EVENTS_PG_NOTIFY:
+                # Flush antes do NOTIFY para obter o updated_at; a notificação só é
+                # entregue aos outros workers quando a transação for confirmada
+                await db.flush()
+                await self._notify(db, [PaymentStatusRead.model_validate(db_payment)])
+            await db.commit()
+        # Acorda os clientes deste worker que aguardam o pagamento (SSE/long-poll)
+        payment_events.publish(PaymentStatusRead.model_validate(db_payment))
         return db_payment
+
+    async def delete_batch_by_user(
+        self, db: AsyncSession, *, user_id: uuid.UUID, batch_size: int
+    ) -> int:
+        """
+        Apaga até batch_size pagamentos de um usuário em um único DELETE,
+        sem carregá-los na sessão, e confirma a transação. Retorna quantos foram apagados.
+        """
+        batch = (
+            select(Payment.id)
+            .where(Payment.user_id == user_id)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            delete(Payment)
+            .where(Payment.user_id == user_id, Payment.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def get_statuses(
+        self,
+        db: AsyncSession,
+        *,
+        ids: Sequence[uuid.UUID] = (),
+        gateway_payment_ids: Sequence[str] = (),
+        gateway: Optional[str] = None,
+        user_id: Optional[uuid.UUID] = None
+    ) -> List[Row]:
+        """
+        Status atual dos pagamentos de ids e/ou gateway_payment_ids em uma única
+        consulta (id = ANY(...) OR gateway_payment_id = ANY(...)), só com as
+        colunas necessárias. user_id restringe aos pagamentos do usuário.
+        """
+        matches = []
+        if ids:
+            matches.append(and_(Payment.id == any_(_uuid_array(ids)), *_created_at_window(ids)))
+        if gateway_payment_ids:
+            by_gateway_id = Payment.gateway_payment_id == any_(
+                bindparam(None, list(gateway_payment_ids), type_=ARRAY(String))
+            )
+            if gateway is not None:
+                by_gateway_id = and_(by_gateway_id, Payment.gateway == gateway)
+            matches.append(by_gateway_id)
+        if not matches:
+            return []
+        stmt = select(Payment.id, Payment.gateway, Payment.gateway_payment_id, Payment.status).where(
+            or_(*matches)
+        )
+        if user_id is not None:
+            stmt = stmt.where(Payment.user_id == user_id)
+        result = await db.execute(stmt)
+        return list(result)
+
+    async def get_stale_by_status(
+        self,
+        db: AsyncSession,
+        *,
+        status: PaymentStatus,
+        updated_before: datetime,
+        after_id: Optional[uuid.UUID] = None,
+        limit: int = 500
+    ) -> Sequence[Row]:
+        """
+        Lista (id, gateway, gateway_payment_id) de pagamentos parados em um status
+        desde antes de updated_before, paginando por id (keyset) a partir de after_id.
+        Seleciona só as colunas necessárias, sem carregar objetos ORM.
+        """
+        stmt = (
+            select(Payment.id, Payment.gateway, Payment.gateway_payment_id)
+            .where(
+                Payment.status == status,
+                Payment.updated_at < updated_before,
+                Payment.gateway_payment_id.is_not(None),
+            )
+            .order_by(Payment.id)
+            .limit(limit)
+        )
+        if after_id is not None:
+            stmt = stmt.where(Payment.id > after_id)
+        result = await db.execute(stmt)
+        return result.all()
+
+    async def apply_status_updates(
+        self,
+        db: AsyncSession,
+        *,
+        updates: Sequence[Tuple[uuid.UUID, PaymentStatus, Optional[str]]],
+        expected_status: PaymentStatus
+    ) -> List[PaymentStatusRead]:
+        """
+        Aplica vários (id, novo_status, error_message) em um único
+        UPDATE ... FROM (VALUES ...), apenas onde o status ainda é expected_status
+        (pagamentos alterados nesse meio tempo, ex: por webhook, são preservados).
+        Confirma a transação, publica os eventos e retorna as linhas alteradas.
+        """
+        # Descarta mudanças não permitidas a partir de expected_status
+        updates = [update_ for update_ in updates if can_transition(expected_status, update_[1])]
+        if not updates:
+            return []
+        new_values = values(
+            column("id", UUID(as_uuid=True)),
+            column("status", String),
+            column("error_message", String),
+            name="new_values",
+        ).data([(payment_id, new_status.value, error) for payment_id, new_status, error in updates])
+        stmt = (
+            update(Payment)
+            .where(
+                Payment.id == new_values.c.id,
+                Payment.status == expected_status,
+                *_created_at_window([payment_id for payment_id, _, _ in updates]),
+            )
+            .values(
+                status=cast(new_values.c.status, Payment.__table__.c.status.type),
+                error_message=func.coalesce(new_values.c.error_message, Payment.error_message),
+                updated_at=func.now(),
+                version=Payment.version + 1,
+            )
+            .returning(
+                Payment.id,
+                Payment.status,
+                Payment.gateway_payment_id,
+                Payment.error_message,
+                Payment.updated_at,
+                Payment.version,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        events = [PaymentStatusRead.model_validate(row._mapping) for row in result.all()]
+        await self._commit_status_events(db, events)
+        return events
+
+    async def _notify(self, db: AsyncSession, events: Sequence[PaymentStatusRead]) -> None:
+        """
+        NOTIFY das mudanças para os outros workers em um único comando, qualquer
+        que seja o número de eventos: SELECT pg_notify(canal, p) FROM unnest(:payloads) p.
+        As notificações só são entregues quando a transação for confirmada.
+        """
+        if not events:
+            return
+        payload = func.unnest(
+            bindparam(None, [payment_events.notify_payload(event) for event in events], type_=ARRAY(String))
+        ).column_valued("payload")
+        await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+
+    async def _commit_status_events(
+        self, db: AsyncSession, events: Sequence[PaymentStatusRead]
+    ) -> None:
+        """Confirma a transação e publica as mudanças de status (NOTIFY + workers locais)."""
+        if settings.PAYMENT_EVENTS_PG_NOTIFY:
+            await self._notify(db, events)
+        await db.commit()
+        for event in events:
+            payment_events.publish(event)
+
+    async def transition_status(
+        self,
+        db: AsyncSession,
+        *,
+        new_status: PaymentStatus,
+        from_statuses: Iterable[PaymentStatus],
+        ids: Optional[Sequence[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        gateway: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        error_message: Optional[str] = None
+    ) -> Tuple[List[PaymentStatusRead], Dict[uuid.UUID, Optional[PaymentStatus]]]:
+        """
+        Move para new_status, em um único UPDATE ... WHERE status IN (...) RETURNING,
+        os pagamentos selecionados por ids e/ou pelos filtros que estejam em from_statuses.
+        Retorna as linhas alteradas e, quando ids é informado, os ids ignorados com o
+        status atual de cada um (None = não encontrado ou de outro usuário).
+        """
+        conditions = [Payment.status.in_(list(from_statuses))]
+        if ids is not None:
+            # Um único parâmetro array: não esbarra no limite de parâmetros por statement
+            conditions += [Payment.id == any_(_uuid_array(ids)), *_created_at_window(ids)]
+        if user_id is not None:
+            conditions.append(Payment.user_id == user_id)
+        if gateway is not None:
+            conditions.append(Payment.gateway == gateway)
+        if metadata:
+            conditions.append(Payment.metadata_.contains(metadata))
+        if created_from is not None:
+            conditions.append(Payment.created_at >= created_from)
+        if created_to is not None:
+            conditions.append(Payment.created_at < created_to)
+        values_ = {"status": new_status, "updated_at": func.now(), "version": Payment.version + 1}
+        if error_message is not None:
+            values_["error_message"] = error_message
+        stmt = (
+            update(Payment)
+            .where(*conditions)
+            .values(**values_)
+            .returning(
+                Payment.id,
+                Payment.status,
+                Payment.gateway_payment_id,
+                Payment.error_message,
+                Payment.updated_at,
+                Payment.version,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        events = [PaymentStatusRead.model_validate(row._mapping) for row in result.all()]
+
+        skipped: Dict[uuid.UUID, Optional[PaymentStatus]] = {}
+        if ids is not None:
+            changed = {event.id for event in events}
+            skipped = {payment_id: None for payment_id in ids if payment_id not in changed}
+            if skipped:
+                stmt = select(Payment.id, Payment.status).where(
+                    Payment.id == any_(_uuid_array(list(skipped))), *_created_at_window(list(skipped))
+                )
+                if user_id is not None:
+                    stmt = stmt.where(Payment.user_id == user_id)
+                for payment_id, current_status in (await db.execute(stmt)).all():
+                    skipped[payment_id] = current_status
+        await self._commit_status_events(db, events)
+        return events, skipped
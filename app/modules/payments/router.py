@@ -1,27 +1,57 @@
+import asyncio
+import json
 import uuid
-from typing import List
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .schema import PaymentCreate, PaymentUpdate, PaymentRead
-from .service import PaymentService
+from .events import payment_events
+from .models import OPEN_STATUSES, PaymentStatus
+from .schema import (
+    PaymentBulkTransition,
+    PaymentBulkTransitionResult,
+    PaymentCreate,
+    PaymentStatusBatch,
+    PaymentStatusBatchResult,
+    PaymentUpdate,
+    PaymentRead,
+    PaymentStatusRead,
+    PaymentTotals,
+)
+from .service import PaymentService, etag, parse_if_match
 from app.modules.users.models import User
-from app.core.database import get_db_session 
-from app.core.dependencies import get_current_active_user
+from app.core.config import settings
+from app.core.content_negotiation import NegotiatedRoute
+from app.core.dependencies import get_current_active_user, get_current_user_db_session
+from app.core.rate_limit import limit_by_ip, limit_by_user
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
 payment_service = PaymentService()
 
+
+async def get_payment_db_session(payment_id: uuid.UUID) -> AsyncGenerator[AsyncSession, None]:
+    """Sessão no shard que guarda o pagamento do path."""
+    shard = await payment_service.shard_of(payment_id)
+    async with shard.session() as db:
+        yield db
+
 @router.post(
     "/", 
     response_model=PaymentRead, 
     status_code=status.HTTP_201_CREATED, 
-    summary="Criar um novo pagamento"
+    summary="Criar um novo pagamento",
+    dependencies=[
+        Depends(limit_by_ip("payments.create", settings.RATE_LIMIT_PAYMENTS_PER_IP)),
+        Depends(limit_by_user("payments.create", settings.RATE_LIMIT_PAYMENTS_PER_USER)),
+    ],
+    responses={429: {"description": "Limite de criação de pagamentos excedido"}},
 )
 async def create_payment(
     payment_in: PaymentCreate,
-    db: AsyncSession = Depends(get_db_session),
+    db: AsyncSession = Depends(get_current_user_db_session),
     current_user: User = Depends(get_current_active_user),
 ):
     """
@@ -37,6 +67,74 @@ async def create_payment(
         db=db, payment_in=payment_in, user_id=current_user.id
     )
 
+@router.post(
+    "/transitions",
+    response_model=PaymentBulkTransitionResult,
+    summary="Estornar ou cancelar pagamentos em massa"
+)
+async def transition_payments(
+    transition_in: PaymentBulkTransition,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Aplica **target_status** (CANCELED ou REFUNDED) aos pagamentos de **ids** ou
+    que atendem a **filter**, em uma única operação no banco.
+    Pagamentos cujo status atual não permite a transição são mantidos e, quando
+    selecionados por ids, listados em **skipped**. Usuários comuns só alteram os próprios pagamentos.
+    """
+    return await payment_service.transition_payments(
+        transition_in=transition_in,
+        user_id=None if current_user.is_superuser else current_user.id,
+    )
+
+@router.post(
+    "/status:batch",
+    response_model=PaymentStatusBatchResult,
+    summary="Consultar o status de vários pagamentos"
+)
+async def read_payment_statuses(
+    batch_in: PaymentStatusBatch,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Retorna o status atual de até 5000 **ids** e/ou **gateway_payment_ids**
+    (opcionalmente de um **gateway**) em uma única consulta, no lugar de um GET por pagamento.
+    Ids inexistentes ou de outros usuários aparecem em **not_found_ids** /
+    **not_found_gateway_payment_ids**. Usuários comuns só consultam os próprios pagamentos.
+    """
+    return await payment_service.get_statuses(
+        batch_in=batch_in,
+        user_id=None if current_user.is_superuser else current_user.id,
+    )
+
+def _parse_metadata_filter(
+    metadata: Optional[str], metadata_key: Optional[str], metadata_value: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Monta o filtro de containment do metadata a partir dos query params.
+    Igualdade de chave vira containment ({chave: valor}) para usar o índice GIN.
+    """
+    metadata_filter: Dict[str, Any] = {}
+    if metadata is not None:
+        try:
+            parsed = json.loads(metadata)
+        except json.JSONDecodeError:
+            parsed = None
+        if not isinstance(parsed, dict):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="metadata deve ser um objeto JSON",
+            )
+        metadata_filter.update(parsed)
+    if (metadata_key is None) != (metadata_value is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="metadata_key e metadata_value devem ser informados juntos",
+        )
+    if metadata_key is not None:
+        metadata_filter[metadata_key] = metadata_value
+    return metadata_filter or None
+
 @router.get(
     "/", 
     response_model=List[PaymentRead],
@@ -45,18 +143,62 @@ async def create_payment(
 async def read_payments(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db_session),
+    metadata: Optional[str] = Query(
+        None, description='Objeto JSON contido no metadata (ex: {"order_id": "123"})'
+    ),
+    metadata_key: Optional[str] = Query(None, description="Chave do metadata a comparar"),
+    metadata_value: Optional[str] = Query(None, description="Valor esperado para metadata_key"),
+    created_from: Optional[datetime] = Query(None, description="Criados a partir de (inclusive)"),
+    created_to: Optional[datetime] = Query(None, description="Criados antes de (exclusive)"),
     current_user: User = Depends(get_current_active_user),
 ): # O serviço será injetado ou usado diretamente
     """
     Retorna uma lista de pagamentos com paginação.
-    TODO: Filtrar pagamentos apenas para o current_user?
+    Usuários comuns só listam os próprios pagamentos; superusers, os de todos.
+
+    - **metadata**: filtra pagamentos cujo metadata contém o objeto JSON informado.
+    - **metadata_key** / **metadata_value**: atalho para igualdade de uma chave (valor string).
+    - **created_from** / **created_to**: período de criação; restringe a consulta às partições do período.
     """
-    payments = await payment_service.get_payments(db=db, skip=skip, limit=limit)
-    # Lógica de filtro (exemplo):
-    # payments = await payment_service.get_payments_by_user(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    metadata_filter = _parse_metadata_filter(metadata, metadata_key, metadata_value)
+    payments = await payment_service.get_payments(
+        skip=skip,
+        limit=limit,
+        user_id=None if current_user.is_superuser else current_user.id,
+        metadata=metadata_filter,
+        created_from=created_from,
+        created_to=created_to,
+    )
     return payments
 
+@router.get(
+    "/totals",
+    response_model=PaymentTotals,
+    summary="Totais dos pagamentos convertidos para uma moeda"
+)
+async def read_payment_totals(
+    currency: str = Query(settings.FX_BASE_CURRENCY, min_length=3, max_length=3, description="Moeda do total"),
+    statuses: List[PaymentStatus] = Query(
+        [PaymentStatus.APPROVED], alias="status", description="Status considerados (repetível)"
+    ),
+    created_from: Optional[datetime] = Query(None, description="Criados a partir de (inclusive)"),
+    created_to: Optional[datetime] = Query(None, description="Criados antes de (exclusive)"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Soma dos pagamentos por moeda e o total convertido para **currency** com as
+    cotações atuais (**fx_version** identifica a versão usada). Moedas sem
+    cotação ficam fora do total e aparecem em **missing_rates**.
+    Usuários comuns só somam os próprios pagamentos.
+    """
+    return await payment_service.get_totals(
+        currency=currency,
+        statuses=statuses,
+        user_id=None if current_user.is_superuser else current_user.id,
+        created_from=created_from,
+        created_to=created_to,
+    )
+
 @router.get(
     "/{payment_id}", 
     response_model=PaymentRead,
@@ -64,16 +206,19 @@ async def read_payments(
 )
 async def read_payment(
     payment_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db_session),
+    response: Response,
     current_user: User = Depends(get_current_active_user),
 ): # O serviço será injetado ou usado diretamente
     """
     Retorna os detalhes de um pagamento específico pelo seu ID.
+    Leituras simultâneas do mesmo pagamento compartilham uma única consulta.
+    O header ETag traz a versão atual, para uso em If-Match no PATCH.
     """
-    db_payment = await payment_service.get_payment(db=db, payment_id=payment_id)
+    db_payment = await payment_service.get_payment_shared(payment_id)
     # Checagem de permissão: só o dono ou superuser pode ver
     if db_payment.user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Não autorizado a ver este pagamento")
+    response.headers["ETag"] = etag(db_payment.version)
     return db_payment
 
 @router.patch(
@@ -84,12 +229,16 @@ async def read_payment(
 async def update_payment(
     payment_id: uuid.UUID,
     payment_in: PaymentUpdate,
-    db: AsyncSession = Depends(get_db_session),
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag (versão) lido do pagamento"),
+    db: AsyncSession = Depends(get_payment_db_session),
     current_user: User = Depends(get_current_active_user),
 ): # O serviço será injetado ou usado diretamente
     """
     Atualiza campos permitidos de um pagamento existente (ex: description).
     Utiliza PATCH para atualizações parciais.
+    Com **If-Match**, a alteração só é aplicada se o pagamento ainda estiver
+    naquela versão (senão 412); conflitos sem If-Match são retentados ou respondem 409.
     """
     # Busca inicial para verificar existência E PERMISSÃO
     db_payment = await payment_service.get_payment(db=db, payment_id=payment_id) 
@@ -97,6 +246,108 @@ async def update_payment(
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Não autorizado a atualizar este pagamento")
 
     updated_payment = await payment_service.update_payment(
-        db=db, payment_id=payment_id, payment_in=payment_in
+        db=db,
+        payment_id=payment_id,
+        payment_in=payment_in,
+        expected_version=parse_if_match(if_match),
     )
+    response.headers["ETag"] = etag(updated_payment.version)
     return updated_payment
+
+
+async def _load_status_snapshot(payment_id: uuid.UUID, current_user: User) -> PaymentStatusRead:
+    """
+    Busca o status atual, checando permissão. A busca é agrupada com as de outros
+    clientes acompanhando o mesmo pagamento e usa uma sessão própria, devolvida
+    antes da espera por eventos: o endpoint não segura conexão do banco.
+    """
+    db_payment = await payment_service.get_payment_shared(payment_id)
+    if db_payment.user_id != current_user.id and not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Não autorizado a ver este pagamento")
+    return PaymentStatusRead.model_validate(db_payment)
+
+@router.get(
+    "/{payment_id}/status",
+    response_model=PaymentStatusRead,
+    summary="Aguardar mudança de status (long-poll)"
+)
+async def wait_payment_status(
+    payment_id: uuid.UUID,
+    since: Optional[PaymentStatus] = Query(
+        None, description="Status já conhecido pelo cliente; responde quando for diferente"
+    ),
+    wait: float = Query(
+        0, ge=0, le=settings.PAYMENT_EVENTS_MAX_WAIT_SECONDS,
+        description="Segundos para aguardar uma mudança antes de responder"
+    ),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Long-poll do status de um pagamento.
+    Responde imediatamente se o status atual for diferente de **since** (ou final);
+    caso contrário aguarda até **wait** segundos por uma mudança e retorna o status mais recente.
+    """
+    async with payment_events.subscribe(payment_id) as queue:
+        current = await _load_status_snapshot(payment_id, current_user)
+        since = since or current.status
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while current.status == since and current.status in OPEN_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                current = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+    return current
+
+async def _status_event_stream(
+    payment_id: uuid.UUID, queue: asyncio.Queue, current: PaymentStatusRead
+) -> AsyncIterator[str]:
+    """Gera eventos SSE até o pagamento sair de PENDING/PROCESSING."""
+    try:
+        yield f"event: status\ndata: {current.model_dump_json()}\n\n"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.PAYMENT_EVENTS_STREAM_MAX_SECONDS
+        while current.status in OPEN_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                current = await asyncio.wait_for(
+                    queue.get(), timeout=min(remaining, settings.PAYMENT_EVENTS_HEARTBEAT_SECONDS)
+                )
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém a conexão viva através de proxies
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: status\ndata: {current.model_dump_json()}\n\n"
+    finally:
+        payment_events.close_subscription(payment_id, queue)
+
+@router.get(
+    "/{payment_id}/events",
+    response_class=StreamingResponse,
+    summary="Acompanhar o status de um pagamento (Server-Sent Events)"
+)
+async def stream_payment_status(
+    payment_id: uuid.UUID,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Abre um stream SSE com o status do pagamento.
+    Envia o status atual e cada mudança seguinte; o stream termina quando o
+    pagamento sai de PENDING/PROCESSING.
+    """
+    queue = payment_events.open_subscription(payment_id)
+    try:
+        current = await _load_status_snapshot(payment_id, current_user)
+    except BaseException:
+        payment_events.close_subscription(payment_id, queue)
+        raise
+    return StreamingResponse(
+        _status_event_stream(payment_id, queue, current),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,9 +1,9 @@
 import uuid
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional, Dict, Any
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import AliasChoices, BaseModel, Field, ConfigDict, model_validator
 from .models import PaymentStatus
 
 
@@ -16,7 +16,10 @@ class PaymentBase(BaseModel):
 
 # Usado para criar um pagamento. user_id virá do contexto de autenticação.
 class PaymentCreate(PaymentBase):
-    pass
+    # Dados livres do lojista (ex: order_id), pesquisáveis na listagem
+    metadata_: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("metadata", "additional_data")
+    )
 
 
 # Usado para atualizar pagamento via PATCH. Apenas campos permitidos.
@@ -32,15 +35,111 @@ class PaymentRead(PaymentBase):
     gateway: str
     gateway_payment_id: Optional[str] = None
     error_message: Optional[str] = None
-    metadata_: Optional[Dict[str, Any]] = Field(None, alias="additional_data") 
+    metadata_: Optional[Dict[str, Any]] = Field(
+        None,
+        validation_alias=AliasChoices("metadata_", "additional_data"),
+        serialization_alias="additional_data",
+    )
     created_at: datetime
     updated_at: datetime
+    # Versão para controle de concorrência (também enviada no header ETag)
+    version: int
 
     # Habilita leitura de atributos do modelo ORM
     model_config = ConfigDict(from_attributes=True)
 
-    # Remapear metadata_ para metadata na saída (opcional, mas comum)
-    # Pydantic v2 usa serialization_alias ou alias diretamente
-    # O alias em metadata_ já deve cuidar disso na serialização se from_attributes=True estiver ativo.
-    # Se não funcionar, podemos usar um @computed_field ou root_validator/model_validator.
-    # Vamos manter simples por agora com o alias.
+    # metadata_ é lido do atributo do modelo ORM (validation_alias) e
+    # exposto como "additional_data" na saída (serialization_alias).
+
+
+# Usado para notificar/retornar apenas o status de um pagamento (SSE e long-poll).
+class PaymentStatusRead(BaseModel):
+    id: uuid.UUID
+    status: PaymentStatus
+    gateway_payment_id: Optional[str] = None
+    error_message: Optional[str] = None
+    updated_at: datetime
+    version: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Filtro da transição em massa (ex: todos os pagamentos de um lote de liquidação)
+class PaymentTransitionFilter(BaseModel):
+    status: Optional[PaymentStatus] = None
+    gateway: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+# Estorno/cancelamento em massa: por lista de ids ou por filtro
+class PaymentBulkTransition(BaseModel):
+    target_status: Literal[PaymentStatus.CANCELED, PaymentStatus.REFUNDED]
+    ids: Optional[List[uuid.UUID]] = Field(None, min_length=1, max_length=100_000)
+    filter: Optional[PaymentTransitionFilter] = None
+    # Motivo gravado em error_message dos pagamentos alterados
+    reason: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _check_selection(self) -> "PaymentBulkTransition":
+        if self.ids is None and (self.filter is None or not self.filter.model_dump(exclude_none=True)):
+            raise ValueError("Informe ids ou ao menos um critério em filter")
+        return self
+
+
+class PaymentTransitionSkip(BaseModel):
+    id: uuid.UUID
+    # Status atual que impediu a transição (None = não encontrado)
+    status: Optional[PaymentStatus] = None
+
+
+class PaymentBulkTransitionResult(BaseModel):
+    target_status: PaymentStatus
+    updated: int
+    updated_ids: List[uuid.UUID]
+    skipped: List[PaymentTransitionSkip]
+
+
+# Totais convertidos para uma moeda (relatórios)
+class PaymentCurrencyTotal(BaseModel):
+    currency: str
+    count: int
+    amount: Decimal
+    # Cotação e valor convertido (None quando a moeda não tem cotação)
+    rate: Optional[Decimal] = None
+    converted: Optional[Decimal] = None
+
+
+class PaymentTotals(BaseModel):
+    currency: str
+    total: Decimal
+    count: int
+    fx_version: int
+    by_currency: List[PaymentCurrencyTotal]
+    # Moedas sem cotação, fora de total
+    missing_rates: List[str]
+
+
+# Consulta de status em lote (conciliação dos back-offices)
+class PaymentStatusBatch(BaseModel):
+    ids: List[uuid.UUID] = Field(default_factory=list, max_length=5000)
+    gateway_payment_ids: List[str] = Field(default_factory=list, max_length=5000)
+    # Restringe gateway_payment_ids a um gateway (ids de gateways diferentes podem coincidir)
+    gateway: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _check_selection(self) -> "PaymentStatusBatch":
+        if not self.ids and not self.gateway_payment_ids:
+            raise ValueError("Informe ids ou gateway_payment_ids")
+        return self
+
+
+class PaymentStatusBatchResult(BaseModel):
+    # id -> status
+    statuses: Dict[uuid.UUID, PaymentStatus]
+    # gateway_payment_id -> status
+    gateway_statuses: Dict[str, PaymentStatus]
+    # Não encontrados ou de outro usuário
+    not_found_ids: List[uuid.UUID]
+    not_found_gateway_payment_ids: List[str]
@@ -1,13 +1,67 @@
+import asyncio
 import uuid
-from typing import Sequence, Optional
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence, Optional
 
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from .models import Payment
+from app.core.database import end_unit_of_work
+from app.core.sharding import Shard, get_shard_router, merge_pages
+from app.core.singleflight import SingleFlight
+from app.modules.fx import service as fx_service
+from app.modules.gateway.base import GatewayError
+from app.modules.gateway.factory import route_payment
+from app.modules.gateway.routing import NoGatewayRouteError
+from .group_commit import ABANDONED_MESSAGE, get_payment_writer
+from .models import ConcurrentUpdateError, Payment, PaymentRecord, PaymentStatus, can_transition, transition_sources
 from .repository import PaymentRepository
-from .schema import PaymentCreate, PaymentUpdate
+from .schema import (
+    PaymentBulkTransition,
+    PaymentBulkTransitionResult,
+    PaymentCreate,
+    PaymentCurrencyTotal,
+    PaymentStatusBatch,
+    PaymentStatusBatchResult,
+    PaymentTotals,
+    PaymentTransitionSkip,
+    PaymentUpdate,
+)
+
+# Tentativas de uma escrita que encontrou o pagamento em outra versão
+CONFLICT_RETRY_ATTEMPTS = 3
+
+
+def etag(version: int) -> str:
+    """Valor do header ETag para uma versão de pagamento."""
+    return f'"{version}"'
+
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """Extrai a versão esperada do header If-Match ("3", W/"3" ou 3); None se ausente ou "*"."""
+    if value is None or value.strip() == "*":
+        return None
+    raw = value.strip().removeprefix("W/").strip('"')
+    try:
+        return int(raw)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match deve conter a versão do pagamento (ETag)",
+        )
+
+
+# Buscas de pagamento por ID em andamento (single-flight)
+_payment_reads: SingleFlight[Optional[Payment]] = SingleFlight("payments")
+
+
+def _conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Pagamento alterado concorrentemente, tente novamente",
+    )
 
 
 class PaymentService:
@@ -21,34 +75,113 @@ class PaymentService:
         payment_in: PaymentCreate, 
         user_id: uuid.UUID
     ) -> Payment:
-        """Cria um novo pagamento."""
-        # Obtém o gateway ativo da configuração
-        active_gateway = settings.ACTIVE_GATEWAY
+        """
+        Cria um novo pagamento e o inicia no gateway escolhido pelo roteamento
+        (moeda, faixa de valor e peso ajustado pela saúde de cada gateway).
+        O gateway é chamado com prazo e circuit breaker: se falhar, expirar ou
+        estiver indisponível, o pagamento é marcado como FAILED com a mensagem de erro.
+        Se a requisição for cancelada depois do INSERT, o pagamento também vira FAILED.
+        """
+        try:
+            gateway = route_payment(payment_in.amount, payment_in.currency)
+        except NoGatewayRouteError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
         
         # Chama o repositório para criar o pagamento no banco
-        db_payment = await self.repository.create(
+        writer = get_payment_writer(get_shard_router().shard_for(user_id))
+        if settings.PAYMENTS_GROUP_COMMIT_ENABLED:
+            # Gravado junto com as escritas simultâneas do worker (um commit por lote)
+            db_payment = await writer.create(
+                payment_in=payment_in, user_id=user_id, gateway=gateway.name
+            )
+        else:
+            db_payment = await self.repository.create(
+                db,
+                payment_in=payment_in,
+                user_id=user_id,
+                gateway=gateway.name
+            )
+        
+        try:
+            gateway_response = await gateway.initiate_payment(
+                payment_id=db_payment.id,
+                amount=db_payment.amount,
+                currency=db_payment.currency,
+                description=db_payment.description,
+            )
+            result = (gateway_response.status, gateway_response.gateway_payment_id, gateway_response.error_message)
+        except GatewayError as e:
+            result = (PaymentStatus.FAILED, None, str(e))
+        except asyncio.CancelledError:
+            # Requisição cancelada (ex: cliente desconectou) com o pagamento já gravado:
+            # o writer do shard o marca como FAILED em segundo plano, em vez de deixar
+            # um PENDING que a reconciliação (que só consulta PROCESSING) nunca resolve
+            writer.submit_result(
+                db_payment=db_payment, new_status=PaymentStatus.FAILED, error_message=ABANDONED_MESSAGE
+            )
+            raise
+        new_status, gateway_payment_id, error_message = result
+
+        if settings.PAYMENTS_GROUP_COMMIT_ENABLED:
+            updated = await writer.apply_result(
+                db_payment=db_payment,
+                new_status=new_status,
+                gateway_payment_id=gateway_payment_id,
+                error_message=error_message,
+            )
+            if updated is not None:
+                _payment_reads.forget(db_payment.id)
+                return updated
+            # Alterado nesse meio tempo (ex: webhook ou cancelamento): relê e reavalia
+            db_payment = await self.get_payment(db, db_payment.id)
+
+        return await self._apply_status(
             db,
-            payment_in=payment_in,
-            user_id=user_id,
-            gateway=active_gateway
+            db_payment=db_payment,
+            new_status=new_status,
+            gateway_payment_id=gateway_payment_id,
+            error_message=error_message,
         )
-        
-        # TODO: Lógica futura - Chamar o GatewayService para iniciar o pagamento externo
-        # gateway_service = get_gateway_service() # Obter instância do serviço do gateway
-        # try:
-        #     gateway_response = await gateway_service.initiate_payment(payment_id=db_payment.id, amount=db_payment.amount, ...)
-        #     # Atualizar status/gateway_id com base na resposta
-        #     await self.repository.update_status(db, db_payment=db_payment, new_status=PaymentStatus.PROCESSING, gateway_payment_id=gateway_response.id)
-        # except GatewayError as e:
-        #     # Atualizar status para FAILED e registrar erro
-        #     await self.repository.update_status(db, db_payment=db_payment, new_status=PaymentStatus.FAILED, error_message=str(e))
-        #     # Relançar ou tratar o erro conforme necessário
-        
-        return db_payment
+
+    async def _apply_status(
+        self,
+        db: AsyncSession,
+        *,
+        db_payment: Payment,
+        new_status: PaymentStatus,
+        gateway_payment_id: Optional[str] = None,
+        error_message: Optional[str] = None
+    ) -> Payment:
+        """
+        update_status com retentativa em conflito de versão: relê o pagamento e
+        reavalia a transição (ex: um cancelamento concorrente vence a resposta do gateway).
+        Sem SELECT FOR UPDATE, nenhuma linha fica bloqueada enquanto o gateway responde.
+        """
+        payment_id = db_payment.id
+        for _ in range(CONFLICT_RETRY_ATTEMPTS):
+            if not can_transition(db_payment.status, new_status):
+                return db_payment
+            try:
+                db_payment = await self.repository.update_status(
+                    db,
+                    db_payment=db_payment,
+                    new_status=new_status,
+                    gateway_payment_id=gateway_payment_id,
+                    error_message=error_message,
+                )
+                _payment_reads.forget(payment_id)
+                return db_payment
+            except ConcurrentUpdateError:
+                db_payment = await self.get_payment(db, payment_id)
+        raise _conflict()
 
     async def get_payment(self, db: AsyncSession, payment_id: uuid.UUID) -> Payment:
         """Busca um pagamento pelo ID. Lança exceção se não encontrado."""
         db_payment = await self.repository.get_by_id(db, payment_id)
+        await end_unit_of_work(db)
         if not db_payment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -56,35 +189,289 @@ class PaymentService:
             )
         return db_payment
 
+    async def get_payment_shared(self, payment_id: uuid.UUID) -> Payment:
+        """
+        Como get_payment, mas buscas simultâneas do mesmo ID compartilham uma única
+        consulta (single-flight), feita em sessão própria no shard do pagamento.
+        O objeto retornado é destacado da sessão e compartilhado: use-o apenas para leitura.
+        """
+        async def load() -> Optional[Payment]:
+            _, db_payment = await get_shard_router().locate(
+                payment_id, lambda db: self.repository.get_by_id(db, payment_id)
+            )
+            return db_payment
+
+        db_payment = await _payment_reads.do(payment_id, load)
+        if not db_payment:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Pagamento não encontrado",
+            )
+        return db_payment
+
+    async def shard_of(self, payment_id: uuid.UUID) -> Shard:
+        """Shard que guarda o pagamento (o do id, se ele não for encontrado em nenhum)."""
+        router = get_shard_router()
+        if len(router.shards) == 1:
+            return router.shards[0]
+        shard, _ = await router.locate(payment_id, lambda db: self.repository.exists(db, payment_id))
+        return shard
+
     async def get_payments(
-        self, db: AsyncSession, *, skip: int = 0, limit: int = 100
-    ) -> Sequence[Payment]:
-        """Busca múltiplos pagamentos."""
-        return await self.repository.get_multi(db, skip=skip, limit=limit)
+        self,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        user_id: Optional[uuid.UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> List[PaymentRecord]:
+        """
+        Busca múltiplos pagamentos, opcionalmente filtrando pelo metadata e pelo período.
+        Com user_id, só os pagamentos do usuário, no shard dele. Sem user_id
+        (superuser), consulta todos os shards (scatter-gather): cada um devolve os
+        skip + limit mais recentes e as páginas são intercaladas por created_at.
+        """
+        router = get_shard_router()
+
+        def page(skip: int, limit: int):
+            return lambda db: self.repository.get_multi(
+                db,
+                skip=skip,
+                limit=limit,
+                user_id=user_id,
+                metadata=metadata,
+                created_from=created_from,
+                created_to=created_to,
+            )
+
+        if user_id is not None:
+            return await router.run(router.shard_for(user_id), page(skip, limit))
+        if len(router.shards) == 1:
+            return await router.run(router.shards[0], page(skip, limit))
+        pages = await router.gather(page(0, skip + limit))
+        return merge_pages(pages, key=lambda payment: payment.created_at, skip=skip, limit=limit)
         
     async def update_payment(
         self, 
         db: AsyncSession, 
         *, 
         payment_id: uuid.UUID,
-        payment_in: PaymentUpdate
+        payment_in: PaymentUpdate,
+        expected_version: Optional[int] = None
     ) -> Payment:
-        """Atualiza um pagamento existente (apenas campos permitidos)."""
-        db_payment = await self.get_payment(db, payment_id) # Reusa get_payment para buscar e tratar 404
-        
-        # Verifica se há dados para atualizar
+        """
+        Atualiza um pagamento existente (apenas campos permitidos).
+        Com expected_version (If-Match), falha com 412 se o pagamento estiver em
+        outra versão; sem ela, conflitos com escritas concorrentes são retentados.
+        """
         update_data = payment_in.model_dump(exclude_unset=True)
-        if not update_data:
-            # Se nada foi enviado no PATCH, apenas retorna o objeto existente
+        for _ in range(CONFLICT_RETRY_ATTEMPTS):
+            db_payment = await self.get_payment(db, payment_id) # Reusa get_payment para buscar e tratar 404
+            if expected_version is not None and db_payment.version != expected_version:
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail=f"Pagamento está na versão {db_payment.version}",
+                    headers={"ETag": etag(db_payment.version)},
+                )
+            # Verifica se há dados para atualizar
+            if not update_data:
+                # Se nada foi enviado no PATCH, apenas retorna o objeto existente
+                return db_payment
+            try:
+                db_payment = await self.repository.update(
+                    db, db_payment=db_payment, payment_in=update_data
+                )
+                _payment_reads.forget(payment_id)
+                return db_payment
+            except ConcurrentUpdateError:
+                # A próxima leitura traz a versão nova (e responde 412 se havia If-Match)
+                continue
+        raise _conflict()
+
+    async def handle_gateway_update(
+        self,
+        *,
+        gateway: str,
+        gateway_payment_id: str,
+        new_status: PaymentStatus,
+        error_message: Optional[str] = None
+    ) -> Payment:
+        """
+        Aplica uma notificação de status enviada pelo gateway (webhook).
+        O id do gateway não indica o shard: a busca consulta todos em paralelo.
+        Mudanças não permitidas pela máquina de estados (ex: reenvios e
+        notificações fora de ordem para pagamentos já finalizados) são ignoradas.
+        """
+        found = await get_shard_router().find(
+            lambda db: self.repository.get_by_gateway_payment_id(
+                db, gateway=gateway, gateway_payment_id=gateway_payment_id
+            )
+        )
+        if not found:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Pagamento não encontrado",
+            )
+        shard, db_payment = found
+        if db_payment.status == new_status:
             return db_payment
-            
-        return await self.repository.update(
-            db, db_payment=db_payment, payment_in=update_data
+        async with shard.session() as db:
+            return await self._apply_status(
+                db, db_payment=db_payment, new_status=new_status, error_message=error_message
+            )
+
+    async def get_statuses(
+        self, *, batch_in: PaymentStatusBatch, user_id: Optional[uuid.UUID] = None
+    ) -> PaymentStatusBatchResult:
+        """
+        Status de muitos pagamentos de uma vez, por id e/ou gateway_payment_id.
+        Com user_id, uma única consulta no shard do usuário, restrita aos pagamentos dele;
+        sem user_id (superuser), a mesma consulta em todos os shards.
+        """
+        ids = list(dict.fromkeys(batch_in.ids))
+        gateway_payment_ids = list(dict.fromkeys(batch_in.gateway_payment_ids))
+        router = get_shard_router()
+        results = await router.gather(
+            lambda db: self.repository.get_statuses(
+                db,
+                ids=ids,
+                gateway_payment_ids=gateway_payment_ids,
+                gateway=batch_in.gateway,
+                user_id=user_id,
+            ),
+            [router.shard_for(user_id)] if user_id is not None else None,
+        )
+        requested_gateway_ids = set(gateway_payment_ids)
+        statuses: Dict[uuid.UUID, PaymentStatus] = {}
+        gateway_statuses: Dict[str, PaymentStatus] = {}
+        for rows in results:
+            for row in rows:
+                statuses[row.id] = row.status
+                if row.gateway_payment_id in requested_gateway_ids and batch_in.gateway in (None, row.gateway):
+                    gateway_statuses[row.gateway_payment_id] = row.status
+        return PaymentStatusBatchResult(
+            statuses={payment_id: statuses[payment_id] for payment_id in ids if payment_id in statuses},
+            gateway_statuses=gateway_statuses,
+            not_found_ids=[payment_id for payment_id in ids if payment_id not in statuses],
+            not_found_gateway_payment_ids=[
+                gateway_id for gateway_id in gateway_payment_ids if gateway_id not in gateway_statuses
+            ],
+        )
+
+    async def get_totals(
+        self,
+        *,
+        currency: str,
+        statuses: Sequence[PaymentStatus],
+        user_id: Optional[uuid.UUID] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> PaymentTotals:
+        """
+        Soma dos pagamentos convertida para currency. Cada shard agrega por moeda
+        no banco (GROUP BY) e só os totais por moeda são convertidos, com a mesma
+        versão das cotações e aritmética Decimal exata; o arredondamento para
+        centavos é feito uma vez, no total (e em cada linha exibida).
+        """
+        snapshot = await fx_service.get_snapshot()
+        currency = currency.upper()
+        if currency not in snapshot.rates:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Sem cotação para {currency}",
+            )
+        router = get_shard_router()
+        results = await router.gather(
+            lambda db: self.repository.totals_by_currency(
+                db,
+                statuses=statuses,
+                user_id=user_id,
+                created_from=created_from,
+                created_to=created_to,
+            ),
+            [router.shard_for(user_id)] if user_id is not None else None,
+        )
+        counts: Dict[str, int] = {}
+        amounts: Dict[str, Decimal] = {}
+        for rows in results:
+            for row in rows:
+                counts[row.currency] = counts.get(row.currency, 0) + row.count
+                amounts[row.currency] = amounts.get(row.currency, Decimal(0)) + row.amount
+        converted, missing = snapshot.convert_totals(amounts, currency)
+        by_currency = [
+            PaymentCurrencyTotal(
+                currency=code,
+                count=counts[code],
+                amount=amounts[code],
+                rate=snapshot.rates.get(code),
+                converted=fx_service.quantize_money(converted[code]) if code in converted else None,
+            )
+            for code in sorted(amounts)
+        ]
+        return PaymentTotals(
+            currency=currency,
+            total=fx_service.quantize_money(sum(converted.values(), Decimal(0))),
+            count=sum(counts[code] for code in converted),
+            fx_version=snapshot.version,
+            by_currency=by_currency,
+            missing_rates=sorted(missing),
         )
 
-    # TODO: Adicionar métodos para lidar com respostas do gateway (webhooks?)
-    # async def handle_gateway_update(self, db: AsyncSession, gateway_payload: Dict) -> None:
-    #     gateway_payment_id = gateway_payload.get("id")
-    #     # Buscar pagamento pelo gateway_payment_id
-    #     # Atualizar status usando self.repository.update_status
-    #     pass
+    async def transition_payments(
+        self,
+        *,
+        transition_in: PaymentBulkTransition,
+        user_id: Optional[uuid.UUID] = None
+    ) -> PaymentBulkTransitionResult:
+        """
+        Aplica um estorno/cancelamento em massa com um UPDATE set-based.
+        Só são alterados pagamentos cujo status atual permite a transição;
+        user_id restringe a operação aos pagamentos de um usuário (e ao shard dele).
+        Sem user_id, o UPDATE roda em todos os shards, uma transação em cada.
+        """
+        from_statuses = transition_sources(transition_in.target_status)
+        selection = transition_in.filter
+        if selection is not None and selection.status is not None:
+            from_statuses = from_statuses & {selection.status}
+            if not from_statuses:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Transição {selection.status.value} -> {transition_in.target_status.value} não permitida",
+                )
+        router = get_shard_router()
+        results = await router.gather(
+            lambda db: self.repository.transition_status(
+                db,
+                new_status=transition_in.target_status,
+                from_statuses=from_statuses,
+                ids=transition_in.ids,
+                user_id=user_id,
+                gateway=selection.gateway if selection else None,
+                metadata=selection.metadata if selection else None,
+                created_from=selection.created_from if selection else None,
+                created_to=selection.created_to if selection else None,
+                error_message=transition_in.reason,
+            ),
+            [router.shard_for(user_id)] if user_id is not None else None,
+        )
+        events = [event for shard_events, _ in results for event in shard_events]
+        # Cada id está em um único shard: nos demais ele aparece como não encontrado (None)
+        changed = {event.id for event in events}
+        skipped: Dict[uuid.UUID, Optional[PaymentStatus]] = {}
+        for _, shard_skipped in results:
+            for payment_id, current in shard_skipped.items():
+                if payment_id not in changed and skipped.get(payment_id) is None:
+                    skipped[payment_id] = current
+        for event in events:
+            _payment_reads.forget(event.id)
+        return PaymentBulkTransitionResult(
+            target_status=transition_in.target_status,
+            updated=len(events),
+            updated_ids=[event.id for event in events],
+            skipped=[
+                PaymentTransitionSkip(id=payment_id, status=current)
+                for payment_id, current in skipped.items()
+            ],
+        )
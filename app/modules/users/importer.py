@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator, Literal, Optional, Tuple
+
+from app.core.config import settings
+
+ImportFormat = Literal["csv", "ndjson"]
+
+# Colunas aceitas no arquivo de importação (demais colunas são ignoradas)
+IMPORT_FIELDS = ("email", "password", "full_name")
+# Chave usada para sinalizar linhas ilegíveis; o serviço as reporta como erro da linha
+ROW_ERROR_KEY = "_error"
+
+
+class ImportFileError(ValueError):
+    """Arquivo de importação ilegível (formato desconhecido, cabeçalho inválido, etc.)."""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> ImportFormat:
+    """Descobre o formato do arquivo pelo content-type ou pela extensão."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ImportFileError("Unsupported file format. Use CSV or NDJSON.")
+
+
+def _parse_csv(text: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"email", "password"} <= set(reader.fieldnames):
+        raise ImportFileError("CSV header must contain at least 'email' and 'password' columns.")
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, {
+            field: (row.get(field) or None) for field in IMPORT_FIELDS
+        }
+
+
+def _parse_ndjson(text: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    row_number = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, {ROW_ERROR_KEY: f"Invalid JSON: {e.msg}"}
+            continue
+        if not isinstance(data, dict):
+            yield row_number, {ROW_ERROR_KEY: "Each line must be a JSON object"}
+            continue
+        yield row_number, {field: data.get(field) for field in IMPORT_FIELDS}
+
+
+def parse_import_file(content: bytes, fmt: ImportFormat) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lê o arquivo de importação e gera tuplas (numero_da_linha, dados).
+    Levanta ImportFileError se o arquivo for ilegível ou exceder USER_IMPORT_MAX_ROWS.
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("File must be UTF-8 encoded.")
+    rows = _parse_csv(text) if fmt == "csv" else _parse_ndjson(text)
+    for row_number, data in rows:
+        if row_number > settings.USER_IMPORT_MAX_ROWS:
+            raise ImportFileError(
+                f"File exceeds the limit of {settings.USER_IMPORT_MAX_ROWS} rows."
+            )
+        yield row_number, data
+
+
+async def _run_import(path: str, fmt: Optional[ImportFormat]) -> None:
+    from app.core.security import shutdown_hash_executor
+    from . import service as user_service
+
+    with open(path, "rb") as f:
+        content = f.read()
+    rows = list(parse_import_file(content, fmt or detect_format(path, None)))
+    try:
+        result = await user_service.import_users(rows)
+    finally:
+        shutdown_hash_executor()
+    print(result.model_dump_json(indent=2))
+
+
+def main() -> None:
+    """Importa usuários de um arquivo CSV/NDJSON pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Importa usuários em massa (CSV ou NDJSON).")
+    parser.add_argument("path", help="Arquivo de importação")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    args = parser.parse_args()
+    asyncio.run(_run_import(args.path, args.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
-import uuid
-from sqlalchemy import Column, String, DateTime, func, Boolean
+from sqlalchemy import Column, String, DateTime, func, Boolean, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship, Mapped
 from app.core.database import Base
-from typing import List
+from app.core.ids import new_id
+import uuid
+from datetime import datetime
+from typing import List, NamedTuple, Optional
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from app.modules.payments.models import Payment
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=new_id)
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     full_name = Column(String, index=True)
@@ -19,11 +24,47 @@ class User(Base):
     is_superuser = Column(Boolean(), default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Preenchido ao remover o usuário; os pagamentos são apagados em lotes depois
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
-    # Relacionamento reverso com Payment
+    # Relacionamento reverso com Payment.
+    # passive_deletes: a remoção dos pagamentos fica com o banco (ON DELETE CASCADE)
+    # em vez de o ORM carregar e apagar cada pagamento na sessão.
     payments: Mapped[List["Payment"]] = relationship(
-        "Payment", back_populates="user", cascade="all, delete-orphan"
+        "Payment", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
 
+    # Busca created_at/updated_at gerados pelo banco via RETURNING no próprio
+    # INSERT/UPDATE, em vez de um refresh (e nova conexão) depois do commit
+    __mapper_args__ = {"eager_defaults": True}
+
     def __repr__(self):
-        return f"<User(id={self.id}, email='{self.email}')>" 
\ No newline at end of file
+        return f"<User(id={self.id}, email='{self.email}')>" 
+
+
+class UserEmail(Base):
+    """
+    Dono de cada email cadastrado, em qualquer shard. A tabela só é usada no
+    shard 0 (banco de lookup): a chave primária garante a unicidade global do
+    email, que a constraint de users só garante dentro de cada shard.
+    """
+    __tablename__ = "user_emails"
+
+    email = Column(String, primary_key=True)
+    # Sem FK: o usuário pode estar em outro shard
+    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<UserEmail(email='{self.email}', user_id={self.user_id})>"
+
+
+class UserRecord(NamedTuple):
+    """Usuário somente leitura usado na listagem (sem o hash da senha e sem estado do ORM)."""
+    id: uuid.UUID
+    email: str
+    full_name: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    created_at: datetime
+    updated_at: Optional[datetime]
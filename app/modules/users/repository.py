@@ -1,48 +1,127 @@
 import uuid
-from typing import Sequence, Optional
-from sqlalchemy import select, update, delete
+from typing import Any, Dict, List, Sequence, Optional, Set, Tuple
+from sqlalchemy import String, any_, bindparam, select, update, delete, func
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload # Se precisarmos carregar relacionamentos no futuro
 
-from .models import User
+from app.core.ids import new_id
+from .models import User, UserEmail, UserRecord
 from .schema import UserCreate, UserUpdate
 
 # Nota: A lógica de hash de senha NÃO deve estar aqui.
 # O repository recebe e salva os dados como estão. O Service prepara os dados.
 
+# Colunas lidas na listagem, na ordem dos campos de UserRecord
+_RECORD_COLUMNS = tuple(getattr(User, field) for field in UserRecord._fields)
+
 async def get_user_by_id(db: AsyncSession, user_id: uuid.UUID) -> Optional[User]:
-    """Busca um usuário pelo seu ID."""
-    result = await db.execute(select(User).filter(User.id == user_id))
+    """Busca um usuário (não removido) pelo seu ID."""
+    result = await db.execute(
+        select(User).filter(User.id == user_id, User.deleted_at.is_(None))
+    )
     return result.scalars().first()
 
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Busca um usuário pelo seu email."""
-    result = await db.execute(select(User).filter(User.email == email))
+    result = await db.execute(
+        select(User).filter(User.email == email, User.deleted_at.is_(None))
+    )
     return result.scalars().first()
 
-async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> Sequence[User]:
-    """Busca uma lista paginada de usuários."""
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[UserRecord]:
+    """Busca uma lista paginada de usuários (só leitura, sem instanciar o modelo ORM)."""
     result = await db.execute(
-        select(User)
+        select(*_RECORD_COLUMNS)
+        .filter(User.deleted_at.is_(None))
         .offset(skip)
         .limit(limit)
         .order_by(User.created_at.desc()) # Exemplo de ordenação
     )
-    return result.scalars().all()
+    return [UserRecord._make(row) for row in result]
 
-async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
-    """Cria um novo usuário no banco de dados."""
+async def create_user(
+    db: AsyncSession, user_in: UserCreate, user_id: Optional[uuid.UUID] = None
+) -> User:
+    """Cria um novo usuário no banco de dados (user_id None = gerado pelo modelo)."""
     # Assume que user_in.password já é o hash! O hash deve ser feito no Service.
     db_user = User(
+        id=user_id or new_id(),
         email=user_in.email,
         password=user_in.password, # Salva a string recebida (espera-se hash)
         full_name=user_in.full_name
     )
     db.add(db_user)
+    # created_at volta no próprio INSERT (eager_defaults), sem refresh depois do commit
     await db.commit()
-    await db.refresh(db_user) # Atualiza o objeto db_user com dados do DB (como ID, created_at)
     return db_user
 
+async def claim_emails(db: AsyncSession, claims: Sequence[Tuple[str, uuid.UUID]]) -> Set[str]:
+    """
+    Reserva cada (email, user_id) na tabela de lookup user_emails (shard 0) com
+    um único INSERT ... ON CONFLICT DO NOTHING. Retorna os emails reservados;
+    os demais já têm dono. Não faz commit: quem chama controla a transação.
+    """
+    if not claims:
+        return set()
+    stmt = (
+        pg_insert(UserEmail)
+        .values([{"email": email, "user_id": user_id} for email, user_id in claims])
+        .on_conflict_do_nothing(index_elements=[UserEmail.email])
+        .returning(UserEmail.email)
+    )
+    result = await db.execute(stmt)
+    return set(result.scalars().all())
+
+async def get_email_claim(db: AsyncSession, email: str) -> Optional[UserEmail]:
+    """Dono atual de um email na tabela de lookup."""
+    return await db.get(UserEmail, email)
+
+async def transfer_email_claim(
+    db: AsyncSession, email: str, from_user_id: uuid.UUID, to_user_id: uuid.UUID
+) -> bool:
+    """Passa o email para to_user_id se ele ainda for de from_user_id (com commit)."""
+    result = await db.execute(
+        update(UserEmail)
+        .where(UserEmail.email == email, UserEmail.user_id == from_user_id)
+        .values(user_id=to_user_id, created_at=func.now())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def release_emails(
+    db: AsyncSession, user_ids: Sequence[uuid.UUID], emails: Optional[Sequence[str]] = None
+) -> None:
+    """Libera os emails reservados pelos user_ids (todos, ou só os informados), com commit."""
+    user_id_array = bindparam(None, list(user_ids), type_=ARRAY(UUID(as_uuid=True)))
+    stmt = delete(UserEmail).where(UserEmail.user_id == any_(user_id_array))
+    if emails is not None:
+        stmt = stmt.where(UserEmail.email == any_(bindparam(None, list(emails), type_=ARRAY(String))))
+    await db.execute(stmt)
+    await db.commit()
+
+async def user_exists(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    """Se a linha do usuário existe (removidos inclusive, até o purge)."""
+    return await db.scalar(select(select(User.id).where(User.id == user_id).exists()))
+
+async def bulk_create_users(db: AsyncSession, rows: List[Dict[str, Any]]) -> Set[str]:
+    """
+    Insere vários usuários com um único INSERT multi-row.
+    Espera que 'password' já seja o hash. Linhas cujo email já existe
+    (ex: inseridas em paralelo por outra requisição) são ignoradas via
+    ON CONFLICT DO NOTHING. Retorna os emails efetivamente inseridos.
+    Não faz commit: quem chama controla a transação.
+    """
+    if not rows:
+        return set()
+    stmt = (
+        pg_insert(User)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.email)
+    )
+    result = await db.execute(stmt)
+    return set(result.scalars().all())
+
 async def update_user(db: AsyncSession, db_user: User, user_in: UserUpdate) -> User:
     """Atualiza um usuário existente no banco de dados."""
     update_data = user_in.model_dump(exclude_unset=True) # Pega só os campos que foram enviados
@@ -62,10 +141,31 @@ async def update_user(db: AsyncSession, db_user: User, user_in: UserUpdate) -> U
 
     db.add(db_user) # Adiciona o objeto modificado à sessão
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
 async def delete_user(db: AsyncSession, db_user: User) -> None:
-    """Remove um usuário do banco de dados."""
-    await db.delete(db_user)
+    """
+    Marca o usuário como removido (soft delete) e o desativa.
+    Os pagamentos e a linha do usuário são apagados depois, em lotes, pelo purge.
+    """
+    db_user.deleted_at = func.now()
+    db_user.is_active = False
+    db.add(db_user)
+    await db.commit()
+
+async def get_deleted_user_ids(db: AsyncSession, limit: int = 100) -> Sequence[uuid.UUID]:
+    """IDs de usuários removidos cujo purge ainda não terminou."""
+    result = await db.execute(
+        select(User.id).filter(User.deleted_at.is_not(None)).limit(limit)
+    )
+    return result.scalars().all()
+
+async def purge_user(db: AsyncSession, user_id: uuid.UUID) -> None:
+    """
+    Apaga definitivamente a linha de um usuário removido, sem carregá-lo na sessão.
+    Pagamentos restantes são apagados pelo ON DELETE CASCADE.
+    """
+    await db.execute(
+        delete(User).where(User.id == user_id, User.deleted_at.is_not(None))
+    )
     await db.commit() 
\ No newline at end of file
@@ -1,16 +1,24 @@
+import logging
 import uuid
 from typing import List # Import List for Python < 3.9 compatibility
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db_session
+from app.core.content_negotiation import NegotiatedRoute
+from app.core.dependencies import get_current_active_user
+from app.core.sharding import get_user_db_session
+from .models import User
 from . import schema as user_schema
 from . import service as user_service
+from .importer import ImportFileError, detect_format, parse_import_file
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"],
     responses={404: {"description": "Not found"}},
+    route_class=NegotiatedRoute,
 )
 
 @router.post(
@@ -22,7 +30,6 @@ router = APIRouter(
 )
 async def create_user_endpoint(
     user_in: user_schema.UserCreate,
-    db: AsyncSession = Depends(get_db_session),
 ):
     """
     Cria um novo usuário.
@@ -32,20 +39,48 @@ async def create_user_endpoint(
     - **full_name**: Nome completo (opcional).
     """
     try:
-        created_user = await user_service.create_user(db=db, user_in=user_in)
+        created_user = await user_service.create_user(user_in=user_in)
         return created_user
     except HTTPException as e:
         # Repassa exceções HTTP levantadas pelo serviço (ex: email duplicado)
         raise e
     except Exception as e:
-        # Logar o erro e retornar um erro genérico
-        # logger.error(f"Error creating user: {e}") # Adicionar logging real depois
+        # Loga o erro e retorna um erro genérico
+        logger.exception("Error creating user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred while creating the user.",
         )
 
 
+@router.post(
+    "/import",
+    response_model=user_schema.UserImportResult,
+    summary="Bulk import users from CSV or NDJSON",
+    description="Imports many users at once. Invalid rows and email conflicts are reported per row.",
+)
+async def import_users_endpoint(
+    file: UploadFile = File(..., description="CSV (email,password,full_name) or NDJSON file"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Importa usuários em massa.
+
+    - Formato detectado pelo content-type ou pela extensão (.csv, .ndjson, .jsonl).
+    - Senhas são hasheadas em paralelo em todos os núcleos.
+    - Linhas inválidas ou com email já cadastrado são listadas em **errors**.
+    - Apenas superusers (o hash ocupa todos os núcleos).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to import users")
+    try:
+        fmt = detect_format(file.filename, file.content_type)
+        rows = list(parse_import_file(await file.read(), fmt))
+    except ImportFileError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await user_service.import_users(rows=rows)
+
+
 # Endpoint para listar usuários
 @router.get(
     "/",
@@ -55,10 +90,9 @@ async def create_user_endpoint(
 async def get_users_endpoint(
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(100, ge=1, le=200, description="Maximum number of records to return"),
-    db: AsyncSession = Depends(get_db_session),
 ):
-    """Retorna uma lista paginada de usuários."""
-    users = await user_service.get_users(db, skip=skip, limit=limit)
+    """Retorna uma lista paginada de usuários (de todos os shards)."""
+    users = await user_service.get_users(skip=skip, limit=limit)
     return users
 
 
@@ -70,10 +104,9 @@ async def get_users_endpoint(
 )
 async def get_user_endpoint(
     user_id: uuid.UUID, # ID recebido na URL
-    db: AsyncSession = Depends(get_db_session),
 ):
-    """Busca e retorna um usuário pelo seu UUID."""
-    db_user = await user_service.get_user(db, user_id=user_id)
+    """Busca e retorna um usuário pelo seu UUID (buscas simultâneas do mesmo ID são agrupadas)."""
+    db_user = await user_service.get_user_shared(user_id)
     if db_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return db_user
@@ -88,7 +121,7 @@ async def get_user_endpoint(
 async def update_user_endpoint(
     user_id: uuid.UUID,
     user_in: user_schema.UserUpdate, # Dados de atualização no corpo
-    db: AsyncSession = Depends(get_db_session),
+    db: AsyncSession = Depends(get_user_db_session),
 ):
     """
     Atualiza parcialmente um usuário existente.
@@ -101,7 +134,7 @@ async def update_user_endpoint(
         # Repassa 404 ou outros erros do serviço
         raise e
     except Exception as e:
-        # logger.error(f"Error updating user {user_id}: {e}")
+        logger.exception("Error updating user %s", user_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred while updating the user.",
@@ -115,17 +148,22 @@ async def update_user_endpoint(
 )
 async def delete_user_endpoint(
     user_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db_session),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_user_db_session),
 ):
-    """Deleta um usuário pelo seu UUID."""
+    """
+    Deleta um usuário pelo seu UUID.
+    O usuário é desativado imediatamente; seus pagamentos são apagados em lotes em background.
+    """
     try:
         await user_service.delete_user(db=db, user_id=user_id)
+        background_tasks.add_task(user_service.purge_deleted_user, user_id)
         # Nenhum retorno aqui, pois o status é 204
     except HTTPException as e:
          # Repassa 404 do serviço
         raise e
     except Exception as e:
-        # logger.error(f"Error deleting user {user_id}: {e}")
+        logger.exception("Error deleting user %s", user_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred while deleting the user.",
@@ -39,4 +39,16 @@ class UserPublic(UserInDBBase):
 
 # Schema interno que inclui a senha (raramente exposto)
 class User(UserInDBBase):
-    hashed_password: str 
\ No newline at end of file
+    hashed_password: str 
+
+# Erro de uma linha específica do arquivo de importação
+class UserImportRowError(BaseModel):
+    row: int = Field(..., description="Número da linha de dados no arquivo (a partir de 1)")
+    email: Optional[str] = None
+    detail: str
+
+# Resultado da importação em massa de usuários
+class UserImportResult(BaseModel):
+    total_rows: int
+    created: int
+    errors: List[UserImportRowError] = []
@@ -1,52 +1,152 @@
+import asyncio
+import logging
 import uuid
-from typing import Sequence, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Sequence, Optional, Set, Tuple
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from app.core.security import get_password_hash
+from app.core.config import settings
+from app.core.database import end_unit_of_work
+from app.core.ids import new_id
+from app.core.security import get_password_hash_async, get_password_hashes
+from app.core.sharding import Shard, get_shard_router, merge_pages
+from app.core.singleflight import SingleFlight
 from . import repository as user_repo # Alias para o repositório
-from .models import User
-from .schema import UserCreate, UserUpdate, UserPublic
+from .importer import ROW_ERROR_KEY
+from .models import User, UserRecord
+from .schema import UserCreate, UserUpdate, UserPublic, UserImportResult, UserImportRowError
+from app.modules.payments.repository import PaymentRepository
 
-async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
+logger = logging.getLogger(__name__)
+
+# Buscas de usuário em andamento, por ("id", uuid) ou ("email", email)
+_user_reads: SingleFlight[Optional[User]] = SingleFlight("users")
+
+# Reservas de email mais antigas que isso, cujo usuário não existe, são de
+# cadastros interrompidos (ex: o processo caiu entre a reserva e o INSERT)
+EMAIL_CLAIM_GRACE = timedelta(minutes=5)
+
+
+def _lookup_shard() -> Shard:
+    """Shard com a tabela user_emails, que garante a unicidade global dos emails."""
+    return get_shard_router().shards[0]
+
+
+async def _claim_email(email: str, user_id: uuid.UUID) -> bool:
     """
-    Cria um novo usuário, fazendo o hash da senha antes de salvar.
-    Levanta HTTPException se o email já existir.
+    Reserva email para user_id em user_emails. Retorna False se ele já é de
+    outro usuário: entre cadastros simultâneos, a chave primária decide.
     """
-    db_user = await user_repo.get_user_by_email(db, email=user_in.email)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+    router = get_shard_router()
+    for _ in range(2):
+        async with _lookup_shard().session() as db:
+            claimed = await user_repo.claim_emails(db, [(email, user_id)])
+            if not claimed:
+                claim = await user_repo.get_email_claim(db, email)
+            await db.commit()
+        if claimed:
+            return True
+        if claim is None:
+            # Liberado entre o INSERT e a leitura: tenta de novo
+            continue
+        if claim.created_at > datetime.now(timezone.utc) - EMAIL_CLAIM_GRACE:
+            return False
+        owner_id = claim.user_id
+        if await router.run(router.shard_for(owner_id), lambda db: user_repo.user_exists(db, owner_id)):
+            return False
+        async with _lookup_shard().session() as db:
+            return await user_repo.transfer_email_claim(db, email, owner_id, user_id)
+    return False
+
 
-    # Gera o hash da senha
-    hashed_password = get_password_hash(user_in.password)
+async def _release_emails(user_ids: Sequence[uuid.UUID], emails: Optional[Sequence[str]] = None) -> None:
+    async with _lookup_shard().session() as db:
+        await user_repo.release_emails(db, user_ids, emails)
 
-    # Cria um objeto User model com os dados corretos (incluindo o hash)
-    # O repositório espera o hash no campo 'password' do UserCreate, então adaptamos.
-    # Uma abordagem alternativa seria refatorar o repositório para aceitar 'hashed_password'.
-    user_data_for_repo = UserCreate(
-        email=user_in.email,
-        full_name=user_in.full_name,
-        password=hashed_password # Passa o HASH para o campo password do schema de entrada
+
+def _email_taken() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered",
     )
 
-    return await user_repo.create_user(db=db, user_in=user_data_for_repo)
+
+async def create_user(user_in: UserCreate) -> User:
+    """
+    Cria um novo usuário, fazendo o hash da senha antes de salvar.
+    O id é gerado aqui e define o shard do usuário; o email é antes reservado
+    em user_emails (shard 0). Levanta HTTPException se o email já existir.
+    """
+    router = get_shard_router()
+    user_id = new_id()
+    if not await _claim_email(user_in.email, user_id):
+        raise _email_taken()
+
+    try:
+        # Gera o hash da senha (bcrypt em thread, fora do event loop)
+        hashed_password = await get_password_hash_async(user_in.password)
+
+        # Cria um objeto User model com os dados corretos (incluindo o hash)
+        # O repositório espera o hash no campo 'password' do UserCreate, então adaptamos.
+        # Uma abordagem alternativa seria refatorar o repositório para aceitar 'hashed_password'.
+        user_data_for_repo = UserCreate(
+            email=user_in.email,
+            full_name=user_in.full_name,
+            password=hashed_password # Passa o HASH para o campo password do schema de entrada
+        )
+
+        async with router.shard_for(user_id).session() as db:
+            return await user_repo.create_user(db=db, user_in=user_data_for_repo, user_id=user_id)
+    except Exception:
+        # O usuário não foi criado: libera o email para uma nova tentativa
+        await _release_emails([user_id], [user_in.email])
+        raise
 
 async def get_user(db: AsyncSession, user_id: uuid.UUID) -> Optional[User]:
     """Busca um usuário pelo ID."""
-    return await user_repo.get_user_by_id(db, user_id=user_id)
+    db_user = await user_repo.get_user_by_id(db, user_id=user_id)
+    await end_unit_of_work(db)
+    return db_user
+
+async def get_user_by_email(email: str) -> Optional[User]:
+    """
+    Busca um usuário pelo email. O email não indica o shard: consulta todos em
+    paralelo, cada um em sessão própria já encerrada no retorno.
+    """
+    found = await get_shard_router().find(lambda db: user_repo.get_user_by_email(db, email=email))
+    return found[1] if found else None
+
+
+async def get_user_shared(user_id: uuid.UUID) -> Optional[User]:
+    """
+    Busca um usuário pelo ID agrupando buscas concorrentes iguais em uma única
+    consulta (single-flight), em sessão própria. O objeto retornado é destacado
+    da sessão e compartilhado entre as requisições: use-o apenas para leitura.
+    """
+    async def load() -> Optional[User]:
+        async with get_shard_router().shard_for(user_id).session() as db:
+            return await user_repo.get_user_by_id(db, user_id=user_id)
 
-async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
-    """Busca um usuário pelo email."""
-    # Reutiliza a função do repositório diretamente
-    return await user_repo.get_user_by_email(db, email=email)
+    return await _user_reads.do(("id", user_id), load)
 
 
-async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> Sequence[User]:
-    """Busca usuários com paginação."""
-    return await user_repo.get_users(db, skip=skip, limit=limit)
+async def get_user_by_email_shared(email: str) -> Optional[User]:
+    """Como get_user_shared, buscando pelo email (tokens antigos usam o email como sub)."""
+    return await _user_reads.do(("email", email), lambda: get_user_by_email(email))
+
+
+async def get_users(skip: int = 0, limit: int = 100) -> List[UserRecord]:
+    """
+    Busca usuários com paginação, em todos os shards (scatter-gather): cada
+    shard devolve os skip + limit mais recentes e as páginas são intercaladas.
+    """
+    router = get_shard_router()
+    if len(router.shards) == 1:
+        return await router.run(router.shards[0], lambda db: user_repo.get_users(db, skip=skip, limit=limit))
+    pages = await router.gather(lambda db: user_repo.get_users(db, skip=0, limit=skip + limit))
+    return merge_pages(pages, key=lambda user: user.created_at, skip=skip, limit=limit)
 
 async def update_user(
     db: AsyncSession, user_id: uuid.UUID, user_in: UserUpdate
@@ -67,7 +167,7 @@ async def update_user(
 
     # Se a senha está sendo atualizada, calcula o novo hash
     if "password" in update_data and update_data["password"]:
-        hashed_password = get_password_hash(update_data["password"])
+        hashed_password = await get_password_hash_async(update_data["password"])
         # Coloca o hash no dicionário de dados para o repositório
         update_data["password"] = hashed_password
     elif "password" in update_data:
@@ -77,12 +177,31 @@ async def update_user(
     # (Adaptando à assinatura atual do repositório)
     user_update_for_repo = UserUpdate(**update_data)
 
-    return await user_repo.update_user(db=db, db_user=db_user, user_in=user_update_for_repo)
+    # Um novo email precisa ser reservado antes; o anterior é liberado depois
+    old_email = db_user.email
+    new_email = update_data.get("email")
+    email_changed = new_email is not None and new_email != old_email
+    if email_changed and not await _claim_email(new_email, db_user.id):
+        raise _email_taken()
+
+    # O email pode mudar: esquece também as buscas pelo email anterior
+    _forget_user(db_user)
+    try:
+        updated_user = await user_repo.update_user(db=db, db_user=db_user, user_in=user_update_for_repo)
+    except Exception:
+        if email_changed:
+            await _release_emails([db_user.id], [new_email])
+        raise
+    if email_changed:
+        await _release_emails([db_user.id], [old_email])
+    _forget_user(updated_user)
+    return updated_user
 
 
 async def delete_user(db: AsyncSession, user_id: uuid.UUID) -> None:
     """
-    Deleta um usuário.
+    Deleta um usuário (soft delete; retorna rápido mesmo com muitos pagamentos).
+    Os dados são apagados depois por purge_deleted_user.
     Levanta HTTPException se o usuário não for encontrado.
     """
     db_user = await get_user(db, user_id=user_id)
@@ -91,4 +210,150 @@ async def delete_user(db: AsyncSession, user_id: uuid.UUID) -> None:
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    await user_repo.delete_user(db=db, db_user=db_user) 
\ No newline at end of file
+    await user_repo.delete_user(db=db, db_user=db_user)
+    _forget_user(db_user)
+
+
+def _forget_user(db_user: User) -> None:
+    """Garante que buscas iniciadas depois de uma escrita não reaproveitem uma leitura anterior."""
+    _user_reads.forget(("id", db_user.id))
+    _user_reads.forget(("email", db_user.email))
+
+
+async def purge_deleted_user(user_id: uuid.UUID) -> None:
+    """
+    Apaga os pagamentos de um usuário removido em lotes de USER_PURGE_BATCH_SIZE
+    (uma transação por lote, memória constante) e, por fim, o próprio usuário.
+    Usa uma sessão própria: roda em background, fora do ciclo da requisição.
+    """
+    payment_repo = PaymentRepository()
+    async with get_shard_router().shard_for(user_id).session() as db:
+        while True:
+            deleted = await payment_repo.delete_batch_by_user(
+                db, user_id=user_id, batch_size=settings.USER_PURGE_BATCH_SIZE
+            )
+            if deleted < settings.USER_PURGE_BATCH_SIZE:
+                break
+            # Cede o event loop entre os lotes
+            await asyncio.sleep(0)
+        await user_repo.purge_user(db, user_id)
+    # Só agora o email volta a ficar disponível
+    await _release_emails([user_id])
+
+
+async def purge_deleted_users() -> None:
+    """Conclui o purge de todos os usuários removidos (ex: purges interrompidos por um restart)."""
+    try:
+        pages = await get_shard_router().gather(
+            lambda db: user_repo.get_deleted_user_ids(db, limit=1000)
+        )
+    except Exception:
+        logger.exception("Failed to list deleted users to purge")
+        return
+    for user_id in (user_id for page in pages for user_id in page):
+        try:
+            await purge_deleted_user(user_id)
+        except Exception:
+            logger.exception("Failed to purge deleted user %s", user_id)
+
+
+async def import_users(rows: Iterable[Tuple[int, Dict[str, Any]]]) -> UserImportResult:
+    """
+    Importa usuários em massa a partir de linhas já lidas do arquivo (numero_da_linha, dados).
+    Valida cada linha, reserva os emails em lote na tabela user_emails, gera os
+    hashes em paralelo no pool de processos e insere em lotes multi-row no shard de cada id.
+    Linhas inválidas ou duplicadas são reportadas sem abortar a importação.
+    """
+    errors: List[UserImportRowError] = []
+    valid: List[Tuple[int, UserCreate]] = []
+    seen_emails: Dict[str, int] = {}
+    total_rows = 0
+
+    for row_number, data in rows:
+        total_rows += 1
+        email = data.get("email") if isinstance(data.get("email"), str) else None
+        if ROW_ERROR_KEY in data:
+            errors.append(UserImportRowError(row=row_number, email=email, detail=data[ROW_ERROR_KEY]))
+            continue
+        try:
+            user_in = UserCreate.model_validate(data)
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            errors.append(UserImportRowError(row=row_number, email=email, detail=detail))
+            continue
+        if user_in.email in seen_emails:
+            errors.append(UserImportRowError(
+                row=row_number,
+                email=user_in.email,
+                detail=f"Email duplicated in file (first seen at row {seen_emails[user_in.email]})",
+            ))
+            continue
+        seen_emails[user_in.email] = row_number
+        valid.append((row_number, user_in))
+
+    # Reserva os emails em user_emails (shard 0), em lotes: os já cadastrados,
+    # inclusive por requisições simultâneas, ficam de fora
+    router = get_shard_router()
+    batch_size = settings.USER_IMPORT_BATCH_SIZE
+    user_ids = [new_id() for _ in valid]
+    claimed: Set[str] = set()
+    async with _lookup_shard().session() as db:
+        for start in range(0, len(valid), batch_size):
+            claimed |= await user_repo.claim_emails(db, [
+                (user_in.email, user_id)
+                for (_, user_in), user_id in zip(valid[start:start + batch_size], user_ids[start:start + batch_size])
+            ])
+        await db.commit()
+    pending = [
+        (row_number, user_in, user_id)
+        for (row_number, user_in), user_id in zip(valid, user_ids)
+        if user_in.email in claimed
+    ]
+    errors.extend(
+        UserImportRowError(row=row_number, email=user_in.email, detail="Email already registered")
+        for row_number, user_in in valid
+        if user_in.email not in claimed
+    )
+
+    created = 0
+    # Emails reservados sem usuário criado (lote com erro ou conflito no shard): liberados no final
+    unused: Dict[str, uuid.UUID] = {user_in.email: user_id for _, user_in, user_id in pending}
+    try:
+        hashed_passwords = await get_password_hashes([user_in.password for _, user_in, _ in pending])
+
+        # O id gerado para cada linha define o shard em que ela é inserida
+        by_shard: Dict[int, List[Tuple[int, UserCreate, Dict[str, Any]]]] = {}
+        for (row_number, user_in, user_id), hashed in zip(pending, hashed_passwords):
+            by_shard.setdefault(router.shard_for(user_id).index, []).append((row_number, user_in, {
+                "id": user_id,
+                "email": user_in.email,
+                "password": hashed,
+                "full_name": user_in.full_name,
+                "is_active": True,
+                "is_superuser": False,
+            }))
+
+        for shard_index, shard_rows in by_shard.items():
+            async with router.shards[shard_index].session() as db:
+                inserted: Set[str] = set()
+                for start in range(0, len(shard_rows), batch_size):
+                    batch = shard_rows[start:start + batch_size]
+                    inserted |= await user_repo.bulk_create_users(db, [db_row for _, _, db_row in batch])
+                    # Email já presente no shard sem reserva (ex: dados anteriores ao user_emails)
+                    errors.extend(
+                        UserImportRowError(row=row_number, email=user_in.email, detail="Email already registered")
+                        for row_number, user_in, _ in batch
+                        if user_in.email not in inserted
+                    )
+                await db.commit()
+            created += len(inserted)
+            for email in inserted:
+                del unused[email]
+    finally:
+        if unused:
+            await _release_emails(list(unused.values()), list(unused))
+
+    errors.sort(key=lambda error: error.row)
+    return UserImportResult(total_rows=total_rows, created=created, errors=errors)
@@ -0,0 +1,67 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+
+from app.core.config import settings
+from app.modules.gateway.factory import get_gateways
+from app.modules.payments.service import PaymentService
+from .schema import GatewayWebhookPayload, WebhookAck
+from .signature import verify_signature
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
+payment_service = PaymentService()
+
+
+async def verify_webhook_signature(
+    request: Request,
+    x_webhook_signature: Optional[str] = Header(None),
+) -> None:
+    """
+    Confere a assinatura HMAC (header X-Webhook-Signature) do corpo recebido.
+    Sem WEBHOOK_SECRET configurado, recusa tudo: a rota altera status de
+    pagamentos e nunca pode ficar aberta.
+    """
+    if settings.WEBHOOK_SECRET is None:
+        logger.error("Webhook rejected: WEBHOOK_SECRET is not configured")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Webhooks are disabled: no secret configured",
+        )
+    if not verify_signature(
+        settings.WEBHOOK_SECRET.get_secret_value(),
+        await request.body(),
+        x_webhook_signature,
+        settings.WEBHOOK_SIGNATURE_TOLERANCE_SECONDS,
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook signature",
+        )
+
+
+@router.post(
+    "/{gateway_name}",
+    response_model=WebhookAck,
+    summary="Receber notificação de status de um gateway",
+    dependencies=[Depends(verify_webhook_signature)],
+)
+async def receive_gateway_webhook(
+    gateway_name: str,
+    payload: GatewayWebhookPayload,
+):
+    """
+    Atualiza o status de um pagamento a partir do callback do gateway.
+    Notificações repetidas ou para pagamentos já finalizados são aceitas sem efeito.
+    """
+    if gateway_name not in {gateway.name for gateway in get_gateways()}:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Gateway não encontrado")
+    await payment_service.handle_gateway_update(
+        gateway=gateway_name,
+        gateway_payment_id=payload.gateway_payment_id,
+        new_status=payload.status,
+        error_message=payload.error_message,
+    )
+    return WebhookAck()
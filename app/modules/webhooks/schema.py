@@ -0,0 +1,19 @@
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.modules.payments.models import PaymentStatus
+
+
+# Notificação de status enviada por um gateway de pagamento
+class GatewayWebhookPayload(BaseModel):
+    gateway_payment_id: str
+    status: PaymentStatus
+    error_message: Optional[str] = None
+    # ID do pagamento no SpiderPay, quando o gateway o devolve (apenas informativo)
+    payment_id: Optional[uuid.UUID] = None
+
+
+class WebhookAck(BaseModel):
+    received: bool = True
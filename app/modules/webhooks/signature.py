@@ -0,0 +1,41 @@
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+# Header com a assinatura dos callbacks: "t=<unix>,v1=<hex>"
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def compute_signature(secret: str, timestamp: int, body: bytes) -> str:
+    """HMAC-SHA256 de "<timestamp>.<corpo>" com o segredo compartilhado, em hex."""
+    message = str(timestamp).encode("ascii") + b"." + body
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def sign_payload(secret: str, body: bytes, timestamp: Optional[int] = None) -> str:
+    """Valor do header SIGNATURE_HEADER para body (usado por quem envia o callback)."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f"t={timestamp},v1={compute_signature(secret, timestamp, body)}"
+
+
+def verify_signature(
+    secret: str, body: bytes, header: Optional[str], tolerance_seconds: float, now: Optional[float] = None
+) -> bool:
+    """
+    Confere a assinatura do corpo exato recebido. O timestamp assinado precisa
+    estar a até tolerance_seconds do relógio local: um callback capturado não
+    pode ser reenviado depois.
+    """
+    if not header:
+        return False
+    fields = dict(part.strip().partition("=")[::2] for part in header.split(","))
+    try:
+        timestamp = int(fields["t"])
+        signature = fields["v1"]
+    except (KeyError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > tolerance_seconds:
+        return False
+    return hmac.compare_digest(signature, compute_signature(secret, timestamp, body))
@@ -0,0 +1,126 @@
+"""
+Benchmark do caminho de leitura das listagens: modelo ORM x registros só leitura.
+
+Dentro de uma transação que é desfeita no final, insere um usuário com --rows
+pagamentos (e --rows usuários) no banco de DATABASE_URL e lê a página inteira
+de cada jeito, serializando com o schema de resposta como o FastAPI faz:
+
+- orm: select(Payment) / select(User), instâncias com identity map e instrumentação
+- records: PaymentRepository.get_multi / users.repository.get_users (NamedTuples)
+
+Mostra a mediana do tempo por linha em --repeat execuções e os bytes alocados
+por linha (pico do tracemalloc em uma execução à parte). Cada execução usa uma
+sessão nova, então o ORM sempre hidrata as instâncias do zero.
+
+Uso:
+    python -m benchmarks.bench_read_path --rows 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.database import engine
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.payments.schema import PaymentRead
+from app.modules.users import repository as user_repo
+from app.modules.users.models import User
+from app.modules.users.schema import UserPublic
+
+Reader = Callable[[AsyncSession], Awaitable[List[Any]]]
+
+
+async def _seed(conn: AsyncConnection, rows: int) -> uuid.UUID:
+    run = uuid.uuid4().hex[:8]
+    owner_id = uuid.uuid4()
+    users = [{"id": owner_id, "email": f"bench-{run}@spiderpay.dev", "password": "x"}]
+    users += [
+        {"id": uuid.uuid4(), "email": f"bench-{run}-{i}@spiderpay.dev", "password": "x", "full_name": f"User {i}"}
+        for i in range(rows - 1)
+    ]
+    await conn.execute(insert(User.__table__), users)
+    await conn.execute(
+        insert(Payment.__table__),
+        [
+            {
+                "id": uuid.uuid4(),
+                "user_id": owner_id,
+                "amount": Decimal("10.00"),
+                "currency": "BRL",
+                "status": PaymentStatus.APPROVED,
+                "description": f"bench {i}",
+                "gateway": "mock",
+                "gateway_payment_id": f"mock_{uuid.uuid4().hex}",
+                "metadata": {"order_id": str(i), "bench_run": run},
+            }
+            for i in range(rows)
+        ],
+    )
+    return owner_id
+
+
+async def _read_and_serialize(conn: AsyncConnection, reader: Reader, adapter: TypeAdapter) -> int:
+    async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint") as session:
+        items = await reader(session)
+        adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+        return len(items)
+
+
+async def _measure(conn: AsyncConnection, label: str, reader: Reader, adapter: TypeAdapter, repeat: int) -> None:
+    rows = await _read_and_serialize(conn, reader, adapter)  # aquecimento
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await _read_and_serialize(conn, reader, adapter)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    await _read_and_serialize(conn, reader, adapter)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_row_us = statistics.median(timings) / rows * 1e6
+    print(f"  {label:<8} {rows} rows: {per_row_us:7.2f} us/row, peak {peak / rows:8.0f} B/row")
+
+
+async def main(rows: int, repeat: int) -> None:
+    payment_repo = PaymentRepository()
+    payments = TypeAdapter(List[PaymentRead])
+    users = TypeAdapter(List[UserPublic])
+
+    async def orm_payments(session: AsyncSession) -> List[Any]:
+        stmt = select(Payment).order_by(Payment.created_at.desc()).limit(rows)
+        return list((await session.execute(stmt)).scalars())
+
+    async def orm_users(session: AsyncSession) -> List[Any]:
+        stmt = select(User).filter(User.deleted_at.is_(None)).order_by(User.created_at.desc()).limit(rows)
+        return list((await session.execute(stmt)).scalars())
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await _seed(conn, rows)
+            print("payments:")
+            await _measure(conn, "orm", orm_payments, payments, repeat)
+            await _measure(conn, "records", lambda s: payment_repo.get_multi(s, limit=rows), payments, repeat)
+            print("users:")
+            await _measure(conn, "orm", orm_users, users, repeat)
+            await _measure(conn, "records", lambda s: user_repo.get_users(s, limit=rows), users, repeat)
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
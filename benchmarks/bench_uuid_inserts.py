@@ -0,0 +1,79 @@
+"""
+Benchmark de throughput de inserção: chaves primárias UUIDv4 x UUIDv7.
+
+Cria duas tabelas temporárias no banco de DATABASE_URL, carrega cada uma com
+--rows linhas em lotes de --batch e mede o throughput ao longo da carga.
+Com v4 as inserções se espalham por todo o índice da PK e o throughput cai
+quando o índice deixa de caber no cache; com v7 elas vão sempre para o fim.
+
+Uso:
+    python -m benchmarks.bench_uuid_inserts --rows 5000000 --batch 10000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Callable, List
+
+import asyncpg
+
+from app.core.database import asyncpg_dsn
+from app.core.ids import uuid7
+
+STRATEGIES = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+async def _run_strategy(
+    conn: asyncpg.Connection, name: str, generate: Callable[[], uuid.UUID], rows: int, batch: int
+) -> None:
+    table = f"bench_ids_{name}"
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"CREATE TABLE {table} (id uuid PRIMARY KEY, created_at timestamptz NOT NULL DEFAULT now(), payload text)"
+    )
+    checkpoints = 10
+    per_checkpoint = max(1, rows // checkpoints)
+    inserted = 0
+    window_start = time.perf_counter()
+    window_rows = 0
+    started = window_start
+    rates: List[float] = []
+    try:
+        while inserted < rows:
+            size = min(batch, rows - inserted)
+            ids = [generate() for _ in range(size)]
+            await conn.execute(
+                f"INSERT INTO {table} (id, payload) SELECT unnest($1::uuid[]), 'x'", ids
+            )
+            inserted += size
+            window_rows += size
+            if window_rows >= per_checkpoint or inserted == rows:
+                now = time.perf_counter()
+                rates.append(window_rows / (now - window_start))
+                window_start, window_rows = now, 0
+        elapsed = time.perf_counter() - started
+        index_size = await conn.fetchval(
+            "SELECT pg_size_pretty(pg_relation_size($1::regclass))", f"{table}_pkey"
+        )
+        print(f"{name}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s), pkey index {index_size}")
+        print("  rows/s per 10% of the load: " + " ".join(f"{rate:,.0f}" for rate in rates))
+    finally:
+        await conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+async def main(rows: int, batch: int, strategies: List[str]) -> None:
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        for name in strategies:
+            await _run_strategy(conn, name, STRATEGIES[name], rows, batch)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), action="append")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch, args.strategy or sorted(STRATEGIES)))
@@ -0,0 +1,106 @@
+"""
+Benchmark do formato de transporte: JSON x MessagePack para PaymentRead e PaymentCreate.
+
+Sem banco: gera --rows pagamentos em memória e mede, pelo mesmo caminho que as
+rotas usam (app.core.content_negotiation.NegotiatedRoute):
+
+- encode json:    TypeAdapter.dump_json (caminho rápido do FastAPI)
+- encode msgpack: dump_python(mode="json") + msgpack.packb (direto do response_model)
+- decode json:    json.loads + validate_python (como o FastAPI lê o corpo)
+- decode msgpack: msgpack.unpackb + validate_python
+
+Mostra o tamanho do payload (cru e com gzip) e a mediana do tempo em --repeat execuções.
+
+Uso:
+    python -m benchmarks.bench_wire_format --rows 1000 --repeat 50
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, List
+
+import msgpack
+from pydantic import TypeAdapter
+
+from app.modules.payments.models import PaymentStatus
+from app.modules.payments.schema import PaymentCreate, PaymentRead
+
+
+def _payments(rows: int) -> List[PaymentRead]:
+    user_id = uuid.uuid4()
+    created_at = datetime.now(timezone.utc)
+    return [
+        PaymentRead(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            amount=Decimal(f"{10 + i % 5000}.{i % 100:02d}"),
+            currency="BRL",
+            status=PaymentStatus.APPROVED,
+            description=f"Pedido {i}",
+            gateway="mock",
+            gateway_payment_id=f"mock_{uuid.uuid4().hex}",
+            metadata_={"order_id": str(i), "channel": "web"},
+            created_at=created_at - timedelta(seconds=i),
+            updated_at=created_at,
+            version=1,
+        )
+        for i in range(rows)
+    ]
+
+
+def _median_us(fn: Callable[[], Any], repeat: int) -> float:
+    fn()  # aquecimento
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def _compare(label: str, adapter: TypeAdapter, value: Any, repeat: int) -> None:
+    json_body = adapter.dump_json(value)
+    msgpack_body = msgpack.packb(adapter.dump_python(value, mode="json"))
+    assert adapter.validate_python(msgpack.unpackb(msgpack_body, timestamp=3)) == value
+
+    results = {
+        "json": (
+            json_body,
+            _median_us(lambda: adapter.dump_json(value), repeat),
+            _median_us(lambda: adapter.validate_python(json.loads(json_body)), repeat),
+        ),
+        "msgpack": (
+            msgpack_body,
+            _median_us(lambda: msgpack.packb(adapter.dump_python(value, mode="json")), repeat),
+            _median_us(lambda: adapter.validate_python(msgpack.unpackb(msgpack_body, timestamp=3)), repeat),
+        ),
+    }
+    print(f"{label}:")
+    for name, (body, encode_us, decode_us) in results.items():
+        print(
+            f"  {name:<8} {len(body):>9} B ({len(gzip.compress(body)):>8} B gzip)"
+            f"  encode {encode_us:10.1f} us  decode {decode_us:10.1f} us"
+        )
+
+
+def main(rows: int, repeat: int) -> None:
+    payments = _payments(rows)
+    _compare(f"List[PaymentRead] x {rows}", TypeAdapter(List[PaymentRead]), payments, repeat)
+    _compare("PaymentRead", TypeAdapter(PaymentRead), payments[0], repeat * 100)
+    create = PaymentCreate(
+        amount=Decimal("199.90"), currency="BRL", description="Pedido 1", metadata_={"order_id": "1"}
+    )
+    _compare("PaymentCreate", TypeAdapter(PaymentCreate), create, repeat * 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
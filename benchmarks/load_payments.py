@@ -0,0 +1,105 @@
+"""
+Teste de carga do pipeline de pagamentos contra uma instância rodando com o MockGateway.
+
+Cria (ou reutiliza) um usuário, faz login e dispara POST /payments/ em uma
+taxa alvo (--rps) por --duration segundos, com no máximo --concurrency
+requisições em voo. Ao final mostra throughput, percentis de latência e a
+distribuição de status HTTP e de status dos pagamentos. Combine com as
+variáveis MOCK_GATEWAY_* (latência, erros, timeouts, callbacks) no servidor.
+
+Uso:
+    python -m benchmarks.load_payments --base-url http://localhost:8000 --rps 200 --duration 60
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+from typing import List
+
+import httpx
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    await client.post(
+        "/users/users/", json={"email": email, "password": password, "full_name": "Load Test"}
+    )
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def main(base_url: str, rps: float, duration: float, concurrency: int, email: str, password: str) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        token = await _login(client, email, password)
+        headers = {"Authorization": f"Bearer {token}"}
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        http_statuses: Counter = Counter()
+        payment_statuses: Counter = Counter()
+
+        async def send() -> None:
+            try:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/payments/",
+                        json={
+                            "amount": "10.00",
+                            "currency": "BRL",
+                            "description": "load test",
+                            "metadata": {"load_test_run": run_id},
+                        },
+                        headers=headers,
+                    )
+                except httpx.HTTPError as e:
+                    http_statuses[type(e).__name__] += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                http_statuses[response.status_code] += 1
+                if response.status_code == 201:
+                    payment_statuses[response.json()["status"]] += 1
+            finally:
+                semaphore.release()
+
+        run_id = uuid.uuid4().hex
+        tasks = []
+        started = time.perf_counter()
+        interval = 1 / rps
+        next_at = started
+        while time.perf_counter() - started < duration:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(send()))
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    print(f"run {run_id}: {len(tasks)} requests in {elapsed:.1f}s ({len(tasks) / elapsed:,.1f} req/s)")
+    print(
+        "latency ms: "
+        + " ".join(f"p{p}={_percentile(latencies, p) * 1000:.1f}" for p in (50, 90, 99, 99.9))
+    )
+    print(f"http status: {dict(http_statuses)}")
+    print(f"payment status: {dict(payment_statuses)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--email", default="load-test@spiderpay.dev")
+    parser.add_argument("--password", default="load-test-password")
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.rps, args.duration, args.concurrency, args.email, args.password))
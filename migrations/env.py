@@ -17,10 +17,12 @@ sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..'
 # Importar a Base e a URL do banco de dados das configurações da aplicação
 from app.core.database import Base
 from app.core.config import settings
+from app.core.sharding import shard_urls
 
 # Importar modelos aqui para que o autogenerate funcione
 from app.modules.users.models import User
 from app.modules.payments.models import Payment
+from app.modules.fx.models import FxRate
 # from app.modules.transactions.models import Transaction # Exemplo
 
 # this is the Alembic Config object, which provides
@@ -32,8 +34,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# Obter a URL async da configuração
-db_url_async = str(settings.DATABASE_URL)
+# Obter a URL async da configuração. Com sharding, cada shard é migrado
+# separadamente: alembic -x shard=N upgrade head (padrão: shard 0 = DATABASE_URL)
+shard_index = int(context.get_x_argument(as_dictionary=True).get("shard", 0))
+db_url_async = shard_urls()[shard_index]
 # Criar uma URL síncrona substituindo o driver (se presente)
 db_url_sync = db_url_async.replace("postgresql+asyncpg://", "postgresql://")
 # Ou, mais explicitamente, forçar psycopg2:
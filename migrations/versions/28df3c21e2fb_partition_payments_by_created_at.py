@@ -0,0 +1,128 @@
+"""Partition payments by created_at (monthly ranges)
+
+Revision ID: 28df3c21e2fb
+Revises: c712139300dd
+Create Date: 2026-10-19 10:02:54.118406
+
+Recria a tabela payments como particionada por RANGE (created_at), com uma
+partição por mês e uma partição DEFAULT de segurança. Os dados existentes
+são copiados para a nova tabela; rodar em janela de manutenção.
+A chave primária passa a ser (id, created_at), exigência do Postgres para
+tabelas particionadas: o banco deixa de garantir que o id sozinho é único, e a
+unicidade passa a depender da geração dos ids (UUIDv4/v7).
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '28df3c21e2fb'
+down_revision: Union[str, None] = 'c712139300dd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partições futuras criadas já na migration (as demais são criadas pela manutenção)
+MONTHS_AHEAD = 3
+
+_INDEXES = (
+    ('ix_payments_gateway_payment_id', ['gateway_payment_id']),
+    ('ix_payments_status', ['status']),
+    ('ix_payments_user_id', ['user_id']),
+)
+
+
+def _payment_columns() -> list:
+    return [
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('status', postgresql.ENUM(name='paymentstatus', create_type=False), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('gateway', sa.String(length=50), nullable=False),
+        sa.Column('gateway_payment_id', sa.String(), nullable=True),
+        sa.Column('error_message', sa.String(), nullable=True),
+        sa.Column('metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    ]
+
+
+def _create_indexes() -> None:
+    for name, columns in _INDEXES:
+        op.create_index(name, 'payments', columns, unique=False)
+    op.create_index(
+        'ix_payments_metadata',
+        'payments',
+        ['metadata'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'metadata': 'jsonb_path_ops'},
+    )
+
+
+def _rename_existing(table: str, new_table: str) -> None:
+    """Renomeia a tabela atual e seus índices/constraints para liberar os nomes."""
+    op.rename_table(table, new_table)
+    op.execute(f'ALTER TABLE {new_table} RENAME CONSTRAINT payments_pkey TO {new_table}_pkey')
+    op.execute(f'ALTER TABLE {new_table} RENAME CONSTRAINT payments_user_id_fkey TO {new_table}_user_id_fkey')
+    for name, _ in _INDEXES:
+        op.execute(f'ALTER INDEX {name} RENAME TO {name.replace("payments", new_table)}')
+    op.execute(f'ALTER INDEX ix_payments_metadata RENAME TO ix_{new_table}_metadata')
+
+
+def upgrade() -> None:
+    _rename_existing('payments', 'payments_unpartitioned')
+
+    op.create_table(
+        'payments',
+        *_payment_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='payments_user_id_fkey'),
+        sa.PrimaryKeyConstraint('id', 'created_at', name='payments_pkey'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    _create_indexes()
+
+    # Uma partição por mês, do pagamento mais antigo até MONTHS_AHEAD meses à frente
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month_start date := date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM payments_unpartitioned), now()
+            ))::date;
+            last_month date := (date_trunc('month', now()) + interval '{MONTHS_AHEAD} months')::date;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF payments FOR VALUES FROM (%L) TO (%L)',
+                    'payments_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END $$
+    """)
+    # Recebe linhas fora de qualquer faixa (ex: manutenção atrasada); deve ficar vazia
+    op.execute('CREATE TABLE payments_default PARTITION OF payments DEFAULT')
+
+    op.execute('INSERT INTO payments SELECT * FROM payments_unpartitioned')
+    op.drop_table('payments_unpartitioned')
+
+
+def downgrade() -> None:
+    _rename_existing('payments', 'payments_partitioned')
+
+    op.create_table(
+        'payments',
+        *_payment_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='payments_user_id_fkey'),
+        sa.PrimaryKeyConstraint('id', name='payments_pkey'),
+    )
+    _create_indexes()
+    op.execute('INSERT INTO payments SELECT * FROM payments_partitioned')
+    # Remove a tabela particionada junto com todas as partições
+    op.drop_table('payments_partitioned')
@@ -0,0 +1,31 @@
+"""Add optimistic concurrency version to payments
+
+Revision ID: 3f9c2d71a4be
+Revises: 6092bbd9e513
+Create Date: 2026-10-19 14:05:41.218377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d71a4be'
+down_revision: Union[str, None] = '6092bbd9e513'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Coluna com default constante: no Postgres 11+ não reescreve a tabela
+    # (propaga para todas as partições de payments)
+    op.add_column(
+        'payments',
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('payments', 'version')
@@ -0,0 +1,41 @@
+"""Soft delete users and cascade payments on delete
+
+Revision ID: 6092bbd9e513
+Revises: 28df3c21e2fb
+Create Date: 2026-10-19 11:20:07.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6092bbd9e513'
+down_revision: Union[str, None] = '28df3c21e2fb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    # Índice parcial: só os usuários aguardando a remoção dos pagamentos
+    op.create_index(
+        'ix_users_deleted_at',
+        'users',
+        ['deleted_at'],
+        unique=False,
+        postgresql_where=sa.text('deleted_at IS NOT NULL'),
+    )
+    op.drop_constraint('payments_user_id_fkey', 'payments', type_='foreignkey')
+    op.create_foreign_key(
+        'payments_user_id_fkey', 'payments', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('payments_user_id_fkey', 'payments', type_='foreignkey')
+    op.create_foreign_key('payments_user_id_fkey', 'payments', 'users', ['user_id'], ['id'])
+    op.drop_index('ix_users_deleted_at', table_name='users')
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,35 @@
+"""Add fx_rates table
+
+Revision ID: b41e7d9a0c52
+Revises: 3f9c2d71a4be
+Create Date: 2026-10-19 16:20:12.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7d9a0c52'
+down_revision: Union[str, None] = '3f9c2d71a4be'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cotações atuais por moeda, em FX_BASE_CURRENCY. A aplicação só usa a
+    # tabela do shard 0; nos demais shards ela fica vazia
+    op.create_table(
+        'fx_rates',
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate', sa.Numeric(precision=20, scale=10), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('currency'),
+        sa.CheckConstraint('rate > 0', name='ck_fx_rates_rate_positive'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fx_rates')
@@ -0,0 +1,37 @@
+"""Add GIN index on payments metadata
+
+Revision ID: c712139300dd
+Revises: f20ae08ead44
+Create Date: 2026-10-19 09:12:31.482113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c712139300dd'
+down_revision: Union[str, None] = 'f20ae08ead44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY não bloqueia escritas na tabela, mas não pode rodar em transação
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_payments_metadata',
+            'payments',
+            ['metadata'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'metadata': 'jsonb_path_ops'},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_payments_metadata', table_name='payments', postgresql_concurrently=True)
@@ -0,0 +1,43 @@
+"""Add user_emails lookup table
+
+Revision ID: d5a3e9f17c20
+Revises: b41e7d9a0c52
+Create Date: 2026-10-19 21:10:37.640219
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a3e9f17c20'
+down_revision: Union[str, None] = 'b41e7d9a0c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Dono de cada email entre todos os shards. A aplicação só usa a tabela do
+    # shard 0; nos demais shards ela fica vazia
+    op.create_table(
+        'user_emails',
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('email'),
+    )
+    op.create_index(op.f('ix_user_emails_user_id'), 'user_emails', ['user_id'], unique=False)
+    if int(context.get_x_argument(as_dictionary=True).get("shard", 0)) == 0:
+        # Usuários do próprio shard 0; os dos demais shards são trazidos por
+        # python -m app.core.sharding sync-emails
+        op.execute(
+            "INSERT INTO user_emails (email, user_id) SELECT email, id FROM users "
+            "ON CONFLICT (email) DO NOTHING"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_emails_user_id'), table_name='user_emails')
+    op.drop_table('user_emails')
@@ -0,0 +1,142 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import AsyncIterator
+
+import httpx
+import msgpack
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Response, status
+from pydantic import BaseModel
+
+from app.core.content_negotiation import MSGPACK_MEDIA_TYPE, NegotiatedRoute, accepts_msgpack
+
+pytestmark = pytest.mark.anyio
+
+
+class Item(BaseModel):
+    id: uuid.UUID
+    amount: Decimal
+    created_at: datetime
+
+
+def _app() -> FastAPI:
+    router = APIRouter(route_class=NegotiatedRoute)
+
+    @router.post("/items", response_model=Item, status_code=status.HTTP_201_CREATED)
+    async def create_item(item: Item, response: Response) -> Item:
+        response.headers["X-Item-Id"] = str(item.id)
+        await asyncio.sleep(0)
+        return item
+
+    @router.get("/items/{item_id}", response_model=Item, response_model_exclude={"created_at"})
+    def read_item(item_id: uuid.UUID) -> dict:
+        return {"id": item_id, "amount": Decimal("7.25"), "created_at": datetime(2026, 1, 2, tzinfo=timezone.utc)}
+
+    @router.get("/missing")
+    async def missing() -> None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+    async def delete_item(item_id: uuid.UUID) -> None:
+        return None
+
+    async def tenant() -> str:
+        return "t1"
+
+    app = FastAPI()
+    # Rotas incluídas com prefixo e dependências: o handler vem do contexto de inclusão
+    app.include_router(router, prefix="/api", dependencies=[Depends(tenant)])
+    return app
+
+
+def _item() -> dict:
+    return {"id": str(uuid.uuid4()), "amount": "10.50", "created_at": "2026-01-02T03:04:05Z"}
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, False),
+        ("*/*", False),
+        ("application/json", False),
+        (MSGPACK_MEDIA_TYPE, True),
+        ("application/json;q=0.9, application/x-msgpack", True),
+        ("application/json, application/msgpack;q=0.5", False),
+    ],
+)
+def test_accepts_msgpack(accept: str, expected: bool) -> None:
+    assert accepts_msgpack(accept) is expected
+
+
+async def test_json_stays_the_default(client: httpx.AsyncClient) -> None:
+    item = _item()
+    response = await client.post("/api/items", json=item)
+
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == item
+    assert response.headers["vary"] == "Accept"
+
+
+async def test_msgpack_request_and_response(client: httpx.AsyncClient) -> None:
+    item = _item()
+    timestamp = msgpack.Timestamp.from_datetime(datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+    response = await client.post(
+        "/api/items",
+        content=msgpack.packb({**item, "created_at": timestamp}),
+        headers={"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 201
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.headers["x-item-id"] == item["id"]
+    assert msgpack.unpackb(response.content) == item
+
+
+async def test_concurrent_requests_keep_their_own_format(client: httpx.AsyncClient) -> None:
+    accepts = [MSGPACK_MEDIA_TYPE if index % 2 else "application/json" for index in range(40)]
+
+    responses = await asyncio.gather(
+        *(client.post("/api/items", json=_item(), headers={"Accept": accept}) for accept in accepts)
+    )
+
+    assert [response.headers["content-type"] for response in responses] == accepts
+
+
+async def test_errors_and_empty_bodies_are_not_converted(client: httpx.AsyncClient) -> None:
+    headers = {"Accept": MSGPACK_MEDIA_TYPE}
+
+    missing = await client.get("/api/missing", headers=headers)
+    assert (missing.status_code, missing.json()) == (404, {"detail": "Not found"})
+
+    deleted = await client.delete(f"/api/items/{uuid.uuid4()}", headers=headers)
+    assert (deleted.status_code, deleted.content) == (204, b"")
+
+
+async def test_msgpack_wire_types(client: httpx.AsyncClient) -> None:
+    item = _item()
+    response = await client.post("/api/items", json=item, headers={"Accept": MSGPACK_MEDIA_TYPE})
+
+    # Sem conversão no cliente: os mesmos tipos do JSON, não ext types nem floats
+    body = msgpack.unpackb(response.content, timestamp=0, strict_map_key=True)
+    assert {name: type(value) for name, value in body.items()} == {"id": str, "amount": str, "created_at": str}
+    assert body == item
+
+
+async def test_msgpack_applies_the_response_model(client: httpx.AsyncClient) -> None:
+    item_id = uuid.uuid4()
+    # Endpoint síncrono, sem parâmetro Response e com response_model_exclude
+    response = await client.get(f"/api/items/{item_id}", headers={"Accept": MSGPACK_MEDIA_TYPE})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert msgpack.unpackb(response.content) == {"id": str(item_id), "amount": "7.25"}
@@ -0,0 +1,215 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal, localcontext
+from types import MappingProxyType, SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.core.ids import new_id
+from app.core.sharding import ShardRouter
+from app.modules.fx import service as fx_service
+from app.modules.fx.service import FxRateCache, FxSnapshot, quantize_money
+from app.modules.payments import service as payment_service
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+
+def _snapshot(rates: Dict[str, str], version: int = 1) -> FxSnapshot:
+    return FxSnapshot(
+        version=version,
+        base_currency="BRL",
+        rates=MappingProxyType({"BRL": Decimal(1), **{code: Decimal(rate) for code, rate in rates.items()}}),
+        loaded_at=datetime.now(timezone.utc),
+        loaded_monotonic=0.0,
+    )
+
+
+def test_convert_totals_is_exact_per_currency() -> None:
+    snapshot = _snapshot({"USD": "5.1234567891", "EUR": "5.5"})
+
+    converted, missing = snapshot.convert_totals(
+        {"BRL": Decimal("102.47"), "USD": Decimal("10"), "EUR": Decimal("0.01"), "JPY": Decimal("1000")}, "USD"
+    )
+
+    assert converted["USD"] == Decimal("10")
+    with localcontext() as ctx:
+        ctx.prec = 60
+        assert converted["BRL"] == Decimal("102.47") / Decimal("5.1234567891")
+    # Sem arredondamentos intermediários: o erro fica só no centavo final
+    assert quantize_money(sum(converted.values())) == Decimal("30.01")
+    assert missing == ["JPY"]
+    with pytest.raises(KeyError):
+        snapshot.convert_totals({"BRL": Decimal(1)}, "GBP")
+
+
+@pytest.mark.parametrize("amount, rounded", [("0.125", "0.12"), ("0.135", "0.14"), ("-0.125", "-0.12")])
+def test_quantize_money_rounds_half_to_even(amount: str, rounded: str) -> None:
+    assert quantize_money(Decimal(amount)) == Decimal(rounded)
+
+
+class FakeRates:
+    """Tabela fx_rates em memória, servida pela sessão do shard 0."""
+
+    def __init__(self, rates: Dict[str, str]) -> None:
+        self.rates = rates
+        self.reads = 0
+        self.error: Optional[Exception] = None
+
+    async def get_rates(self, db: Any) -> List[Tuple[str, Decimal]]:
+        self.reads += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return [(code, Decimal(rate)) for code, rate in self.rates.items()]
+
+
+@pytest.fixture
+def table(monkeypatch: pytest.MonkeyPatch) -> FakeRates:
+    table = FakeRates({"usd": "5.0"})
+
+    @asynccontextmanager
+    async def session() -> AsyncIterator[None]:
+        yield None
+
+    shard = SimpleNamespace(session=session)
+    monkeypatch.setattr(fx_service, "get_shard_router", lambda: SimpleNamespace(shards=[shard]))
+    monkeypatch.setattr(fx_service.fx_repo, "get_rates", table.get_rates)
+    return table
+
+
+async def test_cache_loads_once_within_the_ttl(table: FakeRates) -> None:
+    cache = FxRateCache(ttl_seconds=60, base_currency="BRL")
+
+    snapshots = await asyncio.gather(*(cache.get() for _ in range(10)))
+
+    assert table.reads == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert dict(snapshots[0].rates) == {"USD": Decimal("5.0"), "BRL": Decimal(1)}
+    assert await cache.get() is snapshots[0]
+
+
+async def test_version_changes_only_with_the_rates(table: FakeRates) -> None:
+    cache = FxRateCache(ttl_seconds=0, base_currency="BRL")
+
+    first = await cache.get()
+    same = await cache.get()
+    table.rates["EUR"] = "5.5"
+    changed = await cache.get()
+
+    assert table.reads == 3
+    assert (first.version, same.version, changed.version) == (1, 1, 2)
+    # A versão anterior segue imutável para quem ainda a usa
+    assert "EUR" not in first.rates
+
+
+async def test_failed_refresh_keeps_the_previous_version(table: FakeRates) -> None:
+    cache = FxRateCache(ttl_seconds=0, base_currency="BRL")
+    table.error = RuntimeError("db down")
+    with pytest.raises(RuntimeError):
+        await cache.get()
+
+    table.error = None
+    loaded = await cache.get()
+    table.error = RuntimeError("db down")
+
+    assert await cache.get() is loaded
+    assert cache.snapshot()["load_errors"] == 2
+
+
+async def test_base_currency_rate_cannot_be_written() -> None:
+    with pytest.raises(HTTPException) as error:
+        await fx_service.update_rates({fx_service.settings.FX_BASE_CURRENCY.upper(): Decimal("1.1")})
+    assert error.value.status_code == 422
+
+
+class FakeShards:
+    """Roteador cujos shards devolvem linhas (currency, count, amount) já agregadas."""
+
+    def __init__(self, *pages: List[Tuple[str, int, str]]) -> None:
+        self.pages = pages
+
+    def shard_for(self, user_id: uuid.UUID) -> int:
+        return 0
+
+    async def gather(self, fn: Any, shards: Optional[List[int]] = None) -> List[List[Any]]:
+        pages = [self.pages[shard] for shard in shards] if shards is not None else self.pages
+        return [
+            [SimpleNamespace(currency=currency, count=count, amount=Decimal(amount)) for currency, count, amount in page]
+            for page in pages
+        ]
+
+
+@pytest.fixture
+def rates(monkeypatch: pytest.MonkeyPatch) -> FxSnapshot:
+    snapshot = _snapshot({"USD": "5.0", "EUR": "6.0"}, version=7)
+
+    async def get_snapshot() -> FxSnapshot:
+        return snapshot
+
+    monkeypatch.setattr(payment_service.fx_service, "get_snapshot", get_snapshot)
+    return snapshot
+
+
+async def test_totals_sum_shards_then_convert_once(rates: FxSnapshot, monkeypatch: pytest.MonkeyPatch) -> None:
+    shards = FakeShards(
+        [("BRL", 2, "10.00"), ("USD", 1, "1.00")],
+        [("USD", 3, "2.00"), ("JPY", 1, "500")],
+        [("EUR", 1, "0.01")],
+    )
+    monkeypatch.setattr(payment_service, "get_shard_router", lambda: shards)
+
+    totals = await payment_service.PaymentService().get_totals(currency="usd", statuses=[PaymentStatus.APPROVED])
+
+    assert (totals.currency, totals.fx_version) == ("USD", 7)
+    # 10 BRL = 2 USD; 3 USD; 0.01 EUR = 0.012 USD → 5.012 arredondado só no total
+    assert totals.total == Decimal("5.01")
+    assert totals.count == 7
+    assert totals.missing_rates == ["JPY"]
+    assert [(row.currency, row.count, row.amount, row.converted) for row in totals.by_currency] == [
+        ("BRL", 2, Decimal("10.00"), Decimal("2.00")),
+        ("EUR", 1, Decimal("0.01"), Decimal("0.01")),
+        ("JPY", 1, Decimal("500"), None),
+        ("USD", 4, Decimal("3.00"), Decimal("3.00")),
+    ]
+
+
+async def test_totals_in_a_currency_without_rate(rates: FxSnapshot) -> None:
+    with pytest.raises(HTTPException) as error:
+        await payment_service.PaymentService().get_totals(currency="GBP", statuses=[PaymentStatus.APPROVED])
+    assert error.value.status_code == 422
+
+
+# --- Com bancos (fixture shard_router) -----------------------------------------
+
+
+async def test_rates_and_totals_from_the_database(shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(fx_service, "get_shard_router", lambda: shard_router)
+    monkeypatch.setattr(payment_service, "get_shard_router", lambda: shard_router)
+    monkeypatch.setattr(fx_service, "fx_rates", FxRateCache(ttl_seconds=60, base_currency="BRL"))
+    monkeypatch.setattr(fx_service.settings, "FX_BASE_CURRENCY", "BRL")
+    for _ in range(4):
+        user_id = new_id()
+        async with shard_router.shard_for(user_id).session() as db:
+            await db.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"}])
+            await db.execute(insert(Payment), [
+                {"id": shard_router.colocated_id(user_id), "user_id": user_id, "amount": Decimal(amount),
+                 "currency": currency, "status": PaymentStatus.APPROVED, "gateway": "mock"}
+                for currency, amount in (("BRL", "10.00"), ("usd", "1.50"))
+            ])
+            await db.commit()
+
+    first = await fx_service.update_rates({"USD": Decimal("5.0")})
+    second = await fx_service.update_rates({"USD": Decimal("4.0")})
+    totals = await payment_service.PaymentService().get_totals(currency="BRL", statuses=[PaymentStatus.APPROVED])
+
+    assert (first.version, second.version) == (1, 2)
+    assert totals.fx_version == 2
+    # 4 x (10.00 BRL + 1.50 USD x 4.0)
+    assert (totals.total, totals.count) == (Decimal("64.00"), 8)
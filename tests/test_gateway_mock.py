@@ -0,0 +1,48 @@
+import uuid
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from app.modules.gateway.base import GatewayError
+from app.modules.gateway.mock import MockGateway, MockGatewayConfig
+from app.modules.payments.models import PaymentStatus
+
+pytestmark = pytest.mark.anyio
+
+
+async def _initiate(gateway: MockGateway) -> str:
+    result = await gateway.initiate_payment(payment_id=uuid.uuid4(), amount=Decimal("1.00"), currency="BRL")
+    return result.gateway_payment_id
+
+
+async def test_tracked_payments_are_bounded() -> None:
+    gateway = MockGateway(config=MockGatewayConfig(max_tracked_payments=3))
+    ids = [await _initiate(gateway) for _ in range(5)]
+
+    assert gateway.snapshot()["tracked_payments"] == 3
+    assert gateway.stats["evicted"] == 2
+    with pytest.raises(GatewayError):
+        await gateway.get_payment_status(ids[0])
+    assert (await gateway.get_payment_status(ids[-1])).status == PaymentStatus.APPROVED
+
+
+async def test_delivered_callback_forgets_payment(monkeypatch: pytest.MonkeyPatch) -> None:
+    delivered = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        delivered.append(request)
+        return httpx.Response(200)
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx, "AsyncClient", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)
+    )
+    gateway = MockGateway(config=MockGatewayConfig(callback_url="http://testserver/webhooks/mock"))
+    await _initiate(gateway)
+    for task in list(gateway._callbacks):
+        await task
+
+    assert len(delivered) == 1
+    assert gateway.stats["callbacks_sent"] == 1
+    assert gateway.snapshot()["tracked_payments"] == 0
@@ -0,0 +1,226 @@
+import asyncio
+import uuid
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+import pytest
+
+from app.modules.gateway.base import (
+    AbstractGateway,
+    GatewayError,
+    GatewayPaymentResult,
+    GatewayTimeoutError,
+    GatewayUnavailableError,
+)
+from app.modules.gateway.mock import MockGateway, MockGatewayConfig
+from app.modules.gateway.resilience import CircuitBreaker, CircuitState, ResilientGateway
+from app.modules.payments.models import PaymentStatus
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ScriptedGateway(AbstractGateway):
+    """Gateway cujas consultas de status seguem um roteiro de (atraso em s, falha?)."""
+
+    name = "scripted"
+
+    def __init__(self, script: List[Tuple[float, bool]]) -> None:
+        self.script = list(script)
+        self.calls = 0
+
+    async def initiate_payment(
+        self, *, payment_id: uuid.UUID, amount: Decimal, currency: str, description: Optional[str] = None
+    ) -> GatewayPaymentResult:
+        return await self.get_payment_status(f"scripted_{payment_id.hex}")
+
+    async def get_payment_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        delay, fails = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(delay)
+        if fails:
+            raise GatewayError(f"scripted failure #{call}")
+        return GatewayPaymentResult(f"{gateway_payment_id}#{call}", PaymentStatus.APPROVED)
+
+
+def _breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    options = {"window_size": 10, "min_calls": 4, "error_rate_threshold": 0.5, "open_seconds": 30.0}
+    return CircuitBreaker(clock=clock, **{**options, **kwargs})
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_breaker_needs_min_calls_before_opening() -> None:
+    breaker = _breaker(FakeClock())
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.times_opened == 1
+
+
+def test_breaker_stays_closed_below_error_rate() -> None:
+    breaker = _breaker(FakeClock())
+    for _ in range(10):
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+    assert breaker.error_rate < 0.5
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_breaker_half_open_probe_success_closes() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+    assert not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # só uma chamada de teste por vez
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_half_open_probe_failure_reopens() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.times_opened == 2
+    clock.now += 29
+    assert not breaker.allow_request()
+
+
+def test_release_probe_ignores_previous_half_open() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock, half_open_max_calls=2)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    stale = breaker.times_opened
+    assert breaker.allow_request()
+    breaker.record_failure()  # reabre
+    clock.now += 30
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    breaker.release_probe(stale)
+    assert not breaker.allow_request()
+
+
+async def test_cancelled_probe_releases_half_open_slot() -> None:
+    clock = FakeClock()
+    gateway = ResilientGateway(
+        ScriptedGateway([(10.0, False), (0.0, False)]),
+        breaker=_breaker(clock),
+        initiate_timeout=60,
+        status_timeout=60,
+    )
+    _open(gateway.breaker)
+    clock.now += 30
+
+    probe = asyncio.create_task(gateway.get_payment_status("p1"))
+    await asyncio.sleep(0.01)
+    with pytest.raises(GatewayUnavailableError):
+        await gateway.get_payment_status("p2")
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert gateway.breaker.state == CircuitState.HALF_OPEN
+    result = await gateway.get_payment_status("p3")
+    assert result.status == PaymentStatus.APPROVED
+    assert gateway.breaker.state == CircuitState.CLOSED
+
+
+async def test_timeout_is_recorded_as_failure() -> None:
+    gateway = ResilientGateway(
+        ScriptedGateway([(1.0, False)]),
+        breaker=_breaker(FakeClock(), min_calls=1),
+        initiate_timeout=0.01,
+        status_timeout=0.01,
+    )
+    with pytest.raises(GatewayTimeoutError):
+        await gateway.get_payment_status("p1")
+    assert gateway.stats["timeouts"] == 1
+    assert gateway.breaker.state == CircuitState.OPEN
+
+    with pytest.raises(GatewayUnavailableError):
+        await gateway.get_payment_status("p1")
+    assert gateway.stats["rejected"] == 1
+    assert gateway.gateway.calls == 1
+
+
+async def test_hedge_wins_when_first_attempt_is_slow() -> None:
+    inner = ScriptedGateway([(1.0, False), (0.0, False)])
+    gateway = ResilientGateway(
+        inner, breaker=_breaker(FakeClock()), initiate_timeout=5, status_timeout=5, hedge_delay=0.01
+    )
+    result = await gateway.get_payment_status("p1")
+    assert result.gateway_payment_id == "p1#2"
+    assert gateway.stats["hedges"] == 1
+    assert gateway.stats["hedge_wins"] == 1
+    assert gateway.breaker.state == CircuitState.CLOSED
+
+
+async def test_no_hedge_when_first_attempt_is_fast() -> None:
+    inner = ScriptedGateway([(0.0, False)])
+    gateway = ResilientGateway(
+        inner, breaker=_breaker(FakeClock()), initiate_timeout=5, status_timeout=5, hedge_delay=0.5
+    )
+    result = await gateway.get_payment_status("p1")
+    assert result.gateway_payment_id == "p1#1"
+    assert inner.calls == 1
+    assert gateway.stats["hedges"] == 0
+
+
+async def test_hedge_fires_immediately_after_fast_failure() -> None:
+    inner = ScriptedGateway([(0.0, True), (0.0, False)])
+    gateway = ResilientGateway(
+        inner, breaker=_breaker(FakeClock()), initiate_timeout=5, status_timeout=5, hedge_delay=1.0
+    )
+    result = await asyncio.wait_for(gateway.get_payment_status("p1"), timeout=0.5)
+    assert result.gateway_payment_id == "p1#2"
+    assert gateway.stats["hedge_wins"] == 1
+
+
+async def test_hedge_raises_last_error_when_all_attempts_fail() -> None:
+    inner = ScriptedGateway([(0.0, True)])
+    gateway = ResilientGateway(
+        inner, breaker=_breaker(FakeClock()), initiate_timeout=5, status_timeout=5, hedge_delay=0.01
+    )
+    with pytest.raises(GatewayError, match="#2"):
+        await gateway.get_payment_status("p1")
+    assert inner.calls == 2
+    assert gateway.stats["failures"] == 1
+
+
+async def test_resilient_mock_gateway_round_trip() -> None:
+    mock = MockGateway(config=MockGatewayConfig(latency_ms=1, seed=7))
+    gateway = ResilientGateway(
+        mock, breaker=_breaker(FakeClock()), initiate_timeout=1, status_timeout=1, hedge_delay=0.5
+    )
+    initiated = await gateway.initiate_payment(payment_id=uuid.uuid4(), amount=Decimal("10.00"), currency="BRL")
+    assert initiated.status == PaymentStatus.PROCESSING
+    settled = await gateway.get_payment_status(initiated.gateway_payment_id)
+    assert settled.status == PaymentStatus.APPROVED
+    assert gateway.stats["calls"] == 2
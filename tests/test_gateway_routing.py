@@ -0,0 +1,143 @@
+import random
+from collections import Counter
+from decimal import Decimal
+from typing import Any, List, Tuple
+
+import pytest
+
+from app.modules.gateway import factory
+from app.modules.gateway.base import GatewayError
+from app.modules.gateway.mock import MockGateway, MockGatewayConfig
+from app.modules.gateway.resilience import CircuitBreaker, CircuitState, ResilientGateway
+from app.modules.gateway.routing import GatewayRoute, GatewayRouter, NoGatewayRouteError
+
+
+def _gateway(name: str) -> ResilientGateway:
+    return ResilientGateway(
+        MockGateway(name, MockGatewayConfig()),
+        breaker=CircuitBreaker(window_size=10, min_calls=5),
+        initiate_timeout=1.0,
+        status_timeout=1.0,
+    )
+
+
+def _router(*routes: GatewayRoute) -> GatewayRouter:
+    return GatewayRouter([(route, _gateway(route.name)) for route in routes], rng=random.Random(7))
+
+
+def _picks(router: GatewayRouter, n: int = 4000, amount: str = "10.00", currency: str = "BRL") -> Counter:
+    return Counter(router.choose(Decimal(amount), currency).name for _ in range(n))
+
+
+def test_route_accepts_currency_and_amount_range() -> None:
+    route = GatewayRoute(name="br", currencies=["brl"], min_amount=Decimal("1"), max_amount=Decimal("100"))
+
+    assert route.currencies == ["BRL"]
+    assert route.accepts(Decimal("1"), "brl")
+    assert route.accepts(Decimal("100"), "BRL")
+    assert not route.accepts(Decimal("100.01"), "BRL")
+    assert not route.accepts(Decimal("0.99"), "BRL")
+    assert not route.accepts(Decimal("10"), "USD")
+
+
+@pytest.mark.parametrize("routes", [[], [GatewayRoute(name="a"), GatewayRoute(name="a")]])
+def test_router_rejects_empty_or_duplicate_routes(routes: List[GatewayRoute]) -> None:
+    with pytest.raises(ValueError):
+        _router(*routes)
+
+
+def test_traffic_follows_the_weights() -> None:
+    router = _router(GatewayRoute(name="a", weight=3), GatewayRoute(name="b", weight=1))
+
+    picks = _picks(router)
+
+    assert picks["a"] / sum(picks.values()) == pytest.approx(0.75, abs=0.03)
+
+
+def test_only_eligible_routes_are_chosen() -> None:
+    router = _router(
+        GatewayRoute(name="br", currencies=["BRL"]),
+        GatewayRoute(name="big", max_amount=Decimal("1000"), min_amount=Decimal("500")),
+    )
+
+    assert set(_picks(router, n=200, currency="USD", amount="600")) == {"big"}
+    assert set(_picks(router, n=200, currency="BRL", amount="10")) == {"br"}
+    with pytest.raises(NoGatewayRouteError):
+        router.choose(Decimal("10"), "USD")
+
+
+def test_failing_gateway_loses_traffic() -> None:
+    router = _router(GatewayRoute(name="a"), GatewayRoute(name="b"))
+    failing = router.get("b")
+    for _ in range(2):
+        failing.breaker.record_success()
+        failing.breaker.record_failure()
+
+    # 50% de erro: peso cai para (1 - 0.5)² = 0.25 do configurado
+    weights = dict(zip("ab", router._effective_weights(router.routes)))
+    assert weights == {"a": 1.0, "b": 0.25}
+    assert _picks(router)["b"] / 4000 == pytest.approx(0.2, abs=0.03)
+
+
+def test_slow_gateway_loses_traffic() -> None:
+    router = _router(GatewayRoute(name="fast"), GatewayRoute(name="slow"))
+    router.get("fast").latency_ewma = 0.1
+    router.get("slow").latency_ewma = 0.4
+
+    weights = dict(zip(["fast", "slow"], router._effective_weights(router.routes)))
+
+    assert weights == pytest.approx({"fast": 1.0, "slow": 0.25})
+
+
+def test_open_circuit_is_skipped_while_another_is_closed() -> None:
+    router = _router(GatewayRoute(name="a", weight=100), GatewayRoute(name="b"))
+    broken = router.get("a")
+    for _ in range(5):
+        broken.breaker.record_failure()
+    assert broken.breaker.state == CircuitState.OPEN
+
+    assert set(_picks(router, n=200)) == {"b"}
+
+    router.get("b").breaker._state = CircuitState.OPEN
+    # Sem nenhum fechado, volta a sortear entre todos os elegíveis
+    assert set(_picks(router, n=200)) == {"a", "b"}
+
+
+def test_get_unknown_gateway() -> None:
+    router = _router(GatewayRoute(name="a"))
+
+    assert router.default is router.get("a")
+    with pytest.raises(GatewayError):
+        router.get("missing")
+
+
+def test_snapshot_reports_route_and_effective_weight() -> None:
+    router = _router(GatewayRoute(name="a", weight=2, options={"secret": "x"}))
+
+    [entry] = router.snapshot()
+
+    assert entry["name"] == "a"
+    assert entry["effective_weight"] == 2.0
+    assert "options" not in entry["route"]
+
+
+@pytest.mark.parametrize(
+    "configured, expected",
+    [
+        ([], [("mock", 1.0)]),
+        ([{"name": "primary", "weight": 3}, {"name": "backup", "options": {"latency_ms": 5}}],
+         [("primary", 3.0), ("backup", 1.0)]),
+    ],
+)
+def test_routes_from_settings(
+    monkeypatch: pytest.MonkeyPatch, configured: List[Any], expected: List[Tuple[str, float]]
+) -> None:
+    monkeypatch.setattr(factory.settings, "GATEWAY_ROUTES", configured)
+    monkeypatch.setattr(factory.settings, "ACTIVE_GATEWAY", "mock")
+    factory.get_gateway_router.cache_clear()
+    try:
+        router = factory.get_gateway_router()
+        assert [(route.name, route.weight) for route, _ in router.routes] == expected
+        assert [gateway.name for gateway in factory.get_gateways()] == [name for name, _ in expected]
+    finally:
+        factory.get_gateway_router.cache_clear()
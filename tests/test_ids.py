@@ -0,0 +1,45 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core import ids
+from app.core.ids import new_id, uuid7, uuid7_datetime
+
+
+def test_uuid7_layout_and_timestamp() -> None:
+    before = datetime.now(timezone.utc)
+    value = uuid7()
+    after = datetime.now(timezone.utc)
+
+    assert (value.version, value.variant) == (7, uuid.RFC_4122)
+    # Precisão de milissegundo no UUID
+    assert before - timedelta(milliseconds=1) <= uuid7_datetime(value) <= after
+
+
+def test_uuid7_is_strictly_increasing() -> None:
+    values = [uuid7() for _ in range(5000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_counter_overflow_advances_the_logical_clock(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Relógio parado: o contador de 12 bits esgota e o timestamp avança 1 ms
+    now_ms = 1_700_000_000_000
+    monkeypatch.setattr(ids, "_last_ms", 0)
+    monkeypatch.setattr(ids, "_counter", 0)
+    monkeypatch.setattr(ids.time, "time_ns", lambda: now_ms * 1_000_000)
+    values = [uuid7() for _ in range(ids._COUNTER_MAX + 2)]
+
+    assert values == sorted(values)
+    assert {value.int >> 80 for value in values} == {now_ms, now_ms + 1}
+
+
+def test_uuid7_datetime_ignores_other_versions() -> None:
+    assert uuid7_datetime(uuid.uuid4()) is None
+
+
+@pytest.mark.parametrize("strategy, version", [("uuid4", 4), ("uuid7", 7)])
+def test_new_id_follows_the_strategy(monkeypatch: pytest.MonkeyPatch, strategy: str, version: int) -> None:
+    monkeypatch.setattr(ids.settings, "ID_STRATEGY", strategy)
+    assert new_id().version == version
@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.ids import new_id
+from app.modules.payments.models import Payment, PaymentRecord, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.payments.schema import PaymentRead
+from app.modules.users import repository as user_repo
+from app.modules.users.models import User, UserRecord
+from app.modules.users.schema import UserPublic
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+def _payment_values(**values: object) -> dict:
+    return {
+        "id": uuid.uuid4(), "user_id": uuid.uuid4(), "amount": Decimal("10.00"), "currency": "BRL",
+        "status": PaymentStatus.APPROVED, "description": None, "gateway": "mock", "gateway_payment_id": "gw-1",
+        "error_message": None, "metadata_": {"order_id": "42"}, "created_at": NOW, "updated_at": NOW,
+        "version": 3, **values,
+    }
+
+
+def test_payment_record_serializes_like_the_model() -> None:
+    values = _payment_values()
+
+    from_record = PaymentRead.model_validate(PaymentRecord(**values)).model_dump(mode="json", by_alias=True)
+    from_model = PaymentRead.model_validate(Payment(**values)).model_dump(mode="json", by_alias=True)
+
+    assert from_record == from_model
+    assert from_record["additional_data"] == {"order_id": "42"}
+
+
+def test_user_record_leaves_out_the_password() -> None:
+    assert "password" not in UserRecord._fields
+    assert set(UserRecord._fields) <= {column.key for column in User.__mapper__.column_attrs}
+
+    record = UserRecord(
+        id=uuid.uuid4(), email="a@example.com", full_name=None, is_active=True,
+        is_superuser=False, created_at=NOW, updated_at=None,
+    )
+    assert UserPublic.model_validate(record).email == "a@example.com"
+
+
+# --- Com banco (fixture db) ----------------------------------------------------
+
+
+async def test_payment_list_reads_records_without_orm_state(db: AsyncSession) -> None:
+    user_id = new_id()
+    await db.execute(insert(User), [{"id": user_id, "email": "owner@example.com", "password": "x"}])
+    await db.execute(insert(Payment), [
+        {"id": new_id(), "user_id": user_id, "amount": Decimal("10.00"), "currency": "BRL",
+         "status": PaymentStatus.APPROVED, "gateway": "mock", "metadata_": {"i": i},
+         "created_at": NOW + timedelta(minutes=i)}
+        for i in range(5)
+    ])
+    await db.commit()
+
+    page = await PaymentRepository().get_multi(db, skip=1, limit=3, user_id=user_id)
+
+    assert all(type(record) is PaymentRecord for record in page)
+    assert [record.metadata_ for record in page] == [{"i": 3}, {"i": 2}, {"i": 1}]
+    assert len(db.identity_map) == 0
+
+
+async def test_user_list_reads_records_without_orm_state(db: AsyncSession) -> None:
+    ids = [new_id() for _ in range(3)]
+    await db.execute(insert(User), [
+        {"id": user_id, "email": f"user{i}@example.com", "password": "secret-hash"}
+        for i, user_id in enumerate(ids)
+    ])
+    await db.execute(update(User).where(User.id == ids[0]).values(deleted_at=NOW))
+    await db.commit()
+
+    users = await user_repo.get_users(db)
+
+    assert all(type(record) is UserRecord for record in users)
+    assert {record.id for record in users} == set(ids[1:])
+    assert len(db.identity_map) == 0
@@ -0,0 +1,64 @@
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from fastapi import APIRouter
+
+from app.core.load_shedding import LoadSheddingMiddleware, Priority, route_rules
+from app.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+def test_rules_follow_the_included_paths() -> None:
+    router = APIRouter(prefix="/people")
+
+    @router.get("/")
+    async def get_users_endpoint() -> None:
+        return None
+
+    @router.get("/{user_id}/events")
+    async def stream_payment_status(user_id: str) -> None:
+        return None
+
+    middleware = LoadSheddingMiddleware(app=None, rules=route_rules(router.routes, prefix="/v2"))
+
+    assert middleware.classify("GET", "/v2/people/") == (Priority.LOW, False)
+    assert middleware.classify("POST", "/v2/people/") == (Priority.NORMAL, False)
+    assert middleware.classify("GET", "/users/users/") == (Priority.NORMAL, False)
+    assert middleware.classify("GET", "/v2/people/42/events") == (Priority.NORMAL, True)
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize(
+    "level, shed",
+    [
+        (0.5, {"low": False, "normal": False, "critical": False}),
+        (1.5, {"low": True, "normal": False, "critical": False}),
+        (2.5, {"low": True, "normal": True, "critical": False}),
+    ],
+)
+async def test_low_priority_routes_are_shed_first(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch, level: float, shed: dict
+) -> None:
+    async def no_users(**kwargs: object) -> list:
+        return []
+
+    monkeypatch.setattr(LoadSheddingMiddleware, "load_level", lambda self: level)
+    monkeypatch.setattr("app.modules.users.service.get_users", no_users)
+
+    responses = {
+        "low": await client.get("/users/users/"),
+        "normal": await client.get("/"),
+        "critical": await client.get("/gateways/health"),
+    }
+
+    # Admitidas seguem para a rota (a de health responde 401 sem token)
+    assert {name: response.status_code == 503 for name, response in responses.items()} == shed
+    if shed["low"]:
+        assert responses["low"].headers["retry-after"]
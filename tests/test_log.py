@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+import app.main as main
+from app.core import log
+
+pytestmark = pytest.mark.anyio
+
+
+def test_importing_the_app_keeps_the_logging_setup() -> None:
+    # Importar app.main (testes, scripts, alembic) não troca os handlers do logger raiz
+    assert log._listener is None
+    assert not any(isinstance(handler, log.NonBlockingQueueHandler) for handler in logging.getLogger().handlers)
+
+
+async def test_lifespan_configures_and_shuts_down_logging(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def no_purge() -> None:
+        return None
+
+    monkeypatch.setattr(main, "purge_deleted_users", no_purge)
+    monkeypatch.setattr(main.settings, "PAYMENTS_PARTITION_MAINTENANCE_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(main.settings, "RECONCILIATION_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(main.settings, "PAYMENT_EVENTS_PG_NOTIFY", False)
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "handlers", list(root.handlers))
+    monkeypatch.setattr(root, "level", root.level)
+
+    async with main.lifespan(main.app):
+        assert log._listener is not None
+        assert log._handler in root.handlers
+
+    assert log._listener is None
+    assert log._handler not in root.handlers
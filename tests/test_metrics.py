@@ -0,0 +1,48 @@
+import uuid
+from types import SimpleNamespace
+from typing import AsyncIterator
+
+import httpx
+import pytest
+
+from app.core.dependencies import get_current_active_user
+from app.core.loop_monitor import LoopLagMonitor
+from app.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def _login_as(is_superuser: bool) -> None:
+    user = SimpleNamespace(id=uuid.uuid4(), is_active=True, is_superuser=is_superuser)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+
+
+async def test_metrics_require_a_superuser(client: httpx.AsyncClient) -> None:
+    assert (await client.get("/metrics")).status_code == 401
+
+    _login_as(is_superuser=False)
+    assert (await client.get("/metrics")).status_code == 403
+
+    _login_as(is_superuser=True)
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert "event_loop_lag" in response.json()
+
+
+def test_blocked_loop_stack_goes_to_the_log_only(caplog: pytest.LogCaptureFixture) -> None:
+    monitor = LoopLagMonitor(interval=0.1, window_seconds=10, block_threshold=0.05)
+
+    with caplog.at_level("WARNING", logger="app.core.loop_monitor"):
+        monitor._report(0.25, ['  File "app/slow.py", line 3, in handler'])
+
+    assert "app/slow.py" in caplog.text
+    [report] = monitor.snapshot()["blocked"]["recent"]
+    assert set(report) == {"at", "blocked_ms"}
+    assert report["blocked_ms"] == 250.0
@@ -0,0 +1,90 @@
+import uuid
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.database import create_session_factory
+from app.core.ids import new_id
+from app.modules.payments.models import ConcurrentUpdateError, Payment, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.payments.schema import PaymentUpdate
+from app.modules.payments.service import PaymentService, etag, parse_if_match
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    "value, version",
+    [(None, None), ("*", None), (' "7" ', 7), ('W/"7"', 7), ("7", 7)],
+)
+def test_parse_if_match(value: Optional[str], version: Optional[int]) -> None:
+    assert parse_if_match(value) == version
+
+
+def test_parse_if_match_rejects_other_etags() -> None:
+    with pytest.raises(HTTPException) as error:
+        parse_if_match('"abc"')
+    assert error.value.status_code == 400
+
+
+def test_etag_round_trip() -> None:
+    assert parse_if_match(etag(12)) == 12
+
+
+# --- Com banco (fixture pg_engine) ---------------------------------------------
+
+
+async def _payment_id(engine: AsyncEngine) -> uuid.UUID:
+    user_id, payment_id = new_id(), new_id()
+    async with create_session_factory(engine)() as db:
+        await db.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"}])
+        await db.execute(insert(Payment), [{
+            "id": payment_id, "user_id": user_id, "amount": Decimal("10.00"), "currency": "BRL",
+            "status": PaymentStatus.PENDING, "gateway": "mock",
+        }])
+        await db.commit()
+    return payment_id
+
+
+async def test_stale_write_raises_concurrent_update(pg_engine: AsyncEngine) -> None:
+    payment_id = await _payment_id(pg_engine)
+    repository = PaymentRepository()
+    sessions = create_session_factory(pg_engine)
+
+    async with sessions() as first, sessions() as second:
+        mine = await repository.get_by_id(first, payment_id)
+        theirs = await repository.get_by_id(second, payment_id)
+        assert mine.version == theirs.version == 1
+
+        await repository.update(second, db_payment=theirs, payment_in={"description": "theirs"})
+        with pytest.raises(ConcurrentUpdateError):
+            await repository.update(first, db_payment=mine, payment_in={"description": "mine"})
+
+    async with sessions() as db:
+        stored = await repository.get_by_id(db, payment_id)
+        assert (stored.description, stored.version) == ("theirs", 2)
+
+
+async def test_service_checks_the_expected_version(pg_engine: AsyncEngine) -> None:
+    payment_id = await _payment_id(pg_engine)
+    service = PaymentService(PaymentRepository())
+    sessions = create_session_factory(pg_engine)
+
+    async with sessions() as db:
+        updated = await service.update_payment(
+            db, payment_id=payment_id, payment_in=PaymentUpdate(description="v2"), expected_version=1
+        )
+        assert updated.version == 2
+
+    async with sessions() as db:
+        with pytest.raises(HTTPException) as error:
+            await service.update_payment(
+                db, payment_id=payment_id, payment_in=PaymentUpdate(description="late"), expected_version=1
+            )
+    assert error.value.status_code == 412
+    assert error.value.headers == {"ETag": '"2"'}
@@ -0,0 +1,192 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.modules.payments import service as payment_service_module
+from app.modules.payments.group_commit import ABANDONED_MESSAGE, GroupCommitWriter
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.payments.schema import PaymentCreate
+from app.modules.payments.service import PaymentService
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRepository:
+    """Registra cada write_batch; os pagamentos cujo id está em conflicts "mudaram de versão"."""
+
+    def __init__(self) -> None:
+        self.batches: List[Any] = []
+        self.conflicts: set = set()
+        self.release: Optional[asyncio.Event] = None
+
+    async def write_batch(self, db: Any, *, payments: Any = (), gateway_results: Any = ()) -> Any:
+        self.batches.append((list(payments), list(gateway_results)))
+        if self.release is not None:
+            await self.release.wait()
+        created = [
+            SimpleNamespace(
+                id=uuid.uuid4(), user_id=user_id, status=PaymentStatus.PENDING, version=1,
+                amount=payment_in.amount, currency=payment_in.currency, description=None,
+            )
+            for payment_in, user_id, _ in payments
+        ]
+        updated = []
+        for db_payment, new_status, _, error_message in gateway_results:
+            if db_payment.id in self.conflicts:
+                continue
+            db_payment.status, db_payment.error_message = new_status, error_message
+            updated.append(db_payment)
+        return created, updated
+
+
+@asynccontextmanager
+async def _session():
+    yield None
+
+
+def _writer(repository: FakeRepository, max_delay: float = 0.01, max_batch: int = 100) -> GroupCommitWriter:
+    return GroupCommitWriter(repository, max_delay=max_delay, max_batch=max_batch, session_factory=_session)
+
+
+def _payment_in() -> PaymentCreate:
+    return PaymentCreate(amount=Decimal("10.00"), currency="BRL")
+
+
+async def test_creates_and_gateway_results_share_a_commit() -> None:
+    repository = FakeRepository()
+    writer = _writer(repository)
+
+    async def create_and_apply() -> Any:
+        payment = await writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock")
+        return await writer.apply_result(db_payment=payment, new_status=PaymentStatus.APPROVED)
+
+    payments = await asyncio.gather(*(create_and_apply() for _ in range(20)))
+    await writer.stop()
+
+    assert all(payment.status == PaymentStatus.APPROVED for payment in payments)
+    # Um lote com os 20 INSERTs e outro com as 20 respostas: dois commits, não 40
+    assert [(len(creates), len(results)) for creates, results in repository.batches] == [(20, 0), (0, 20)]
+    assert writer.snapshot()["mean_batch_size"] == 20.0
+
+
+async def test_max_batch_splits_the_queue() -> None:
+    repository = FakeRepository()
+    writer = _writer(repository, max_delay=10, max_batch=5)
+
+    await asyncio.gather(
+        *(writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock") for _ in range(12))
+    )
+    await writer.stop()
+
+    assert [len(creates) for creates, _ in repository.batches] == [5, 5, 2]
+
+
+async def test_conflicting_result_returns_none() -> None:
+    repository = FakeRepository()
+    writer = _writer(repository)
+    payment = await writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock")
+    repository.conflicts.add(payment.id)
+
+    assert await writer.apply_result(db_payment=payment, new_status=PaymentStatus.APPROVED) is None
+    await writer.stop()
+    assert writer.stats["conflicts"] == 1
+
+
+async def test_cancelled_create_before_flush_is_dropped() -> None:
+    repository = FakeRepository()
+    writer = _writer(repository, max_delay=0.05)
+    task = asyncio.create_task(writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock"))
+    await asyncio.sleep(0)
+    task.cancel()
+    await writer.stop()
+
+    assert repository.batches == []
+
+
+async def test_create_cancelled_during_insert_is_marked_failed() -> None:
+    repository = FakeRepository()
+    repository.release = asyncio.Event()
+    writer = _writer(repository)
+    task = asyncio.create_task(writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock"))
+    while not repository.batches:
+        await asyncio.sleep(0.005)
+    task.cancel()
+    repository.release.set()
+    await writer.stop()
+
+    [(created_rows, _), (_, results)] = repository.batches
+    assert len(created_rows) == 1
+    [(db_payment, new_status, _, error_message)] = results
+    assert (new_status, error_message) == (PaymentStatus.FAILED, ABANDONED_MESSAGE)
+    assert writer.stats["abandoned"] == 1
+
+
+async def test_gateway_result_is_written_even_if_the_waiter_is_cancelled() -> None:
+    repository = FakeRepository()
+    writer = _writer(repository, max_delay=0.05)
+    payment = await writer.create(payment_in=_payment_in(), user_id=uuid.uuid4(), gateway="mock")
+    task = asyncio.create_task(writer.apply_result(db_payment=payment, new_status=PaymentStatus.APPROVED))
+    await asyncio.sleep(0)
+    task.cancel()
+    await writer.stop()
+
+    assert payment.status == PaymentStatus.APPROVED
+
+
+class HangingGateway:
+    name = "hanging"
+
+    def __init__(self) -> None:
+        self.called = asyncio.Event()
+
+    async def initiate_payment(self, **kwargs: Any) -> Any:
+        self.called.set()
+        await asyncio.Event().wait()
+
+
+async def test_cancelled_request_marks_created_payment_failed(monkeypatch: pytest.MonkeyPatch) -> None:
+    repository = FakeRepository()
+    writer = _writer(repository)
+    gateway = HangingGateway()
+    monkeypatch.setattr(payment_service_module.settings, "PAYMENTS_GROUP_COMMIT_ENABLED", True)
+    monkeypatch.setattr(payment_service_module, "route_payment", lambda amount, currency: gateway)
+    monkeypatch.setattr(payment_service_module, "get_payment_writer", lambda shard: writer)
+
+    task = asyncio.create_task(
+        PaymentService().create_payment(None, payment_in=_payment_in(), user_id=uuid.uuid4())
+    )
+    await gateway.called.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await writer.stop()
+
+    [(db_payment, new_status, _, error_message)] = repository.batches[-1][1]
+    assert db_payment.status == PaymentStatus.FAILED
+    assert error_message == ABANDONED_MESSAGE
+
+
+async def test_gateway_results_are_one_versioned_update() -> None:
+    payment = Payment(id=uuid.uuid4(), status=PaymentStatus.PENDING, version=1)
+    payment.created_at = datetime.now(timezone.utc)
+    statements: List[Any] = []
+
+    class CapturingSession:
+        async def execute(self, statement: Any) -> Any:
+            statements.append(statement)
+            return SimpleNamespace(all=lambda: [])
+
+    await PaymentRepository()._apply_gateway_results(
+        CapturingSession(), [(payment, PaymentStatus.APPROVED, "gw_1", None)]
+    )
+    sql = str(statements[0].compile(dialect=asyncpg.dialect()))
+    assert "payments.created_at = gateway_results.created_at" in sql
+    assert "payments.version = gateway_results.version" in sql
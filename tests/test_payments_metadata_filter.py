@@ -0,0 +1,97 @@
+import uuid
+from decimal import Decimal
+from typing import Any, List
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.payments.router import _parse_metadata_filter
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 20_000
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN de uma consulta do SQLAlchemy, com os mesmos parâmetros."""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Any) -> None:
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+class _RecordingSession:
+    """Captura a consulta montada pelo repository sem executá-la."""
+
+    async def execute(self, statement: Any) -> List[Any]:
+        self.statement = statement
+        return []
+
+
+async def _seed(db: AsyncSession) -> List[uuid.UUID]:
+    user_ids = [uuid.uuid4(), uuid.uuid4()]
+    await db.execute(
+        insert(User),
+        [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"} for user_id in user_ids],
+    )
+    await db.execute(
+        insert(Payment),
+        [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_ids[i % 2],
+                "amount": Decimal("10.00"),
+                "currency": "BRL",
+                "status": PaymentStatus.APPROVED,
+                "gateway": "mock",
+                "metadata_": {"order_id": str(i), "channel": "web"},
+            }
+            for i in range(ROWS)
+        ],
+    )
+    await db.commit()
+    await db.execute(text("ANALYZE payments"))
+    return user_ids
+
+
+async def _plan(db: AsyncSession, **filters: Any) -> str:
+    recorder = _RecordingSession()
+    await PaymentRepository().get_multi(recorder, **filters)
+    result = await db.execute(Explain(recorder.statement))
+    return "\n".join(row[0] for row in result)
+
+
+async def test_metadata_key_lookup_uses_gin_index(db: AsyncSession) -> None:
+    user_ids = await _seed(db)
+    metadata = _parse_metadata_filter(None, "order_id", "4242")
+
+    plan = await _plan(db, metadata=metadata)
+    assert "Bitmap Index Scan on ix_payments_metadata" in plan, plan
+
+    plan = await _plan(db, metadata=metadata, user_id=user_ids[0])
+    assert "Bitmap Index Scan on ix_payments_metadata" in plan, plan
+
+
+async def test_metadata_filter_is_scoped_to_user(db: AsyncSession) -> None:
+    user_ids = await _seed(db)
+    repository = PaymentRepository()
+    metadata = _parse_metadata_filter('{"order_id": "4242"}', None, None)
+
+    payments = await repository.get_multi(db, metadata=metadata)
+    assert [payment.metadata_["order_id"] for payment in payments] == ["4242"]
+    assert payments[0].user_id == user_ids[0]
+
+    assert await repository.get_multi(db, metadata=metadata, user_id=user_ids[1]) == []
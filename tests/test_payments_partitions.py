@@ -0,0 +1,156 @@
+import csv
+import gzip
+import uuid
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator
+
+import asyncpg
+import pytest
+
+from app.core.database import asyncpg_dsn
+from app.core.ids import uuid7, uuid7_datetime
+from app.modules.payments import partitions
+from app.modules.payments.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    archive_partition,
+    detach_old_partitions,
+    ensure_partitions,
+    list_detached_partitions,
+    list_partitions,
+    partition_month,
+    partition_name,
+)
+from app.modules.payments.repository import ID_CLOCK_SKEW, PaymentRepository
+
+from .conftest import TEST_DATABASE_URL
+
+pytestmark = pytest.mark.anyio
+
+TODAY = date(2026, 10, 19)
+
+
+def test_partition_names() -> None:
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2026, 2, 1)) == "payments_y2026m02"
+    assert partition_month("payments_y2026m02") == date(2026, 2, 1)
+    assert partition_month(DEFAULT_PARTITION) is None
+
+
+def test_id_lookups_carry_the_uuid7_creation_window() -> None:
+    payment_id = uuid7()
+    _, created_from, created_to = PaymentRepository()._id_filter(payment_id)
+
+    created_at = uuid7_datetime(payment_id)
+    assert (created_from.right.value, created_to.right.value) == (
+        created_at - ID_CLOCK_SKEW, created_at + ID_CLOCK_SKEW
+    )
+    # v4 legado: sem instante embutido, a busca continua só pelo id
+    assert len(PaymentRepository()._id_filter(uuid.uuid4())) == 1
+
+
+@pytest.fixture
+async def conn(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Conexão em um schema descartável com uma tabela payments particionada como a
+    da migration (chave (id, created_at), RANGE por created_at e partição DEFAULT).
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL não definida")
+    monkeypatch.setattr(partitions, "_today", lambda: TODAY)
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = await asyncpg.connect(asyncpg_dsn(TEST_DATABASE_URL))
+    await admin.execute(f'CREATE SCHEMA "{schema}"')
+    connection = await asyncpg.connect(asyncpg_dsn(TEST_DATABASE_URL), server_settings={"search_path": schema})
+    try:
+        await connection.execute(
+            """
+            CREATE TABLE payments (
+                id uuid NOT NULL,
+                amount numeric(10, 2) NOT NULL,
+                created_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+            """
+        )
+        await connection.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF payments DEFAULT")
+        yield connection
+    finally:
+        await connection.close()
+        await admin.execute(f'DROP SCHEMA "{schema}" CASCADE')
+        await admin.close()
+
+
+async def _insert(conn: asyncpg.Connection, *created_at: datetime) -> None:
+    await conn.executemany(
+        "INSERT INTO payments (id, amount, created_at) VALUES ($1, 10, $2)",
+        [(uuid.uuid4(), value) for value in created_at],
+    )
+
+
+async def _count(conn: asyncpg.Connection, table: str) -> int:
+    return await conn.fetchval(f'SELECT count(*) FROM "{table}"')
+
+
+async def test_ensure_partitions_is_idempotent(conn: asyncpg.Connection) -> None:
+    created = await ensure_partitions(conn, months_ahead=2)
+
+    assert created == ["payments_y2026m10", "payments_y2026m11", "payments_y2026m12"]
+    assert await ensure_partitions(conn, months_ahead=2) == []
+    assert await list_partitions(conn) == created
+
+
+async def test_date_range_query_reads_a_single_partition(conn: asyncpg.Connection) -> None:
+    await ensure_partitions(conn, months_ahead=2)
+
+    plan = "\n".join(
+        row[0]
+        for row in await conn.fetch(
+            "EXPLAIN SELECT * FROM payments WHERE created_at >= $1 AND created_at < $2",
+            datetime(2026, 11, 3, tzinfo=timezone.utc),
+            datetime(2026, 11, 10, tzinfo=timezone.utc),
+        )
+    )
+
+    assert "payments_y2026m11" in plan
+    for other in ("payments_y2026m10", "payments_y2026m12", DEFAULT_PARTITION):
+        assert other not in plan
+
+
+async def test_rows_in_default_move_to_the_new_partition(conn: asyncpg.Connection) -> None:
+    # Manutenção atrasada: pagamentos de novembro caíram na partição DEFAULT
+    await _insert(conn, datetime(2026, 11, 2, tzinfo=timezone.utc), datetime(2026, 11, 30, tzinfo=timezone.utc))
+    await _insert(conn, datetime(2027, 3, 1, tzinfo=timezone.utc))
+
+    created = await ensure_partitions(conn, months_ahead=1)
+
+    assert created == ["payments_y2026m10", "payments_y2026m11"]
+    assert await _count(conn, "payments_y2026m11") == 2
+    # Só o mês sem partição continua na DEFAULT
+    assert await _count(conn, DEFAULT_PARTITION) == 1
+    assert await _count(conn, "payments") == 3
+
+
+async def test_detach_and_archive_old_partitions(conn: asyncpg.Connection, tmp_path: Path) -> None:
+    await ensure_partitions(conn, months_ahead=0)
+    await partitions._create_partition(conn, "payments_y2025m01", date(2025, 1, 1))
+    await _insert(conn, datetime(2025, 1, 15, tzinfo=timezone.utc), datetime(2026, 10, 1, tzinfo=timezone.utc))
+
+    with pytest.raises(ValueError):
+        await archive_partition(conn, "payments_y2025m01", str(tmp_path))
+
+    assert await detach_old_partitions(conn, retention_months=12) == ["payments_y2025m01"]
+    assert await list_partitions(conn) == ["payments_y2026m10"]
+    assert await list_detached_partitions(conn) == ["payments_y2025m01"]
+    # O pagamento antigo sai das consultas em payments, mas continua na tabela desanexada
+    assert await _count(conn, "payments") == 1
+
+    path = await archive_partition(conn, "payments_y2025m01", str(tmp_path))
+
+    with gzip.open(path, "rt") as archive:
+        rows = list(csv.DictReader(archive))
+    assert [row["created_at"][:10] for row in rows] == ["2025-01-15"]
+    assert await list_detached_partitions(conn) == []
+    assert not list(tmp_path.glob("*.tmp"))
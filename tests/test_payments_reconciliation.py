@@ -0,0 +1,57 @@
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+from app.modules.gateway.base import GatewayError, GatewayPaymentResult
+from app.modules.payments import reconciliation
+from app.modules.payments.models import PaymentStatus
+from app.modules.payments.reconciliation import ReconciliationReport, ReconciliationSweeper
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRepository:
+    def __init__(self) -> None:
+        self.applied: List[Any] = []
+
+    async def apply_status_updates(self, db: Any, *, updates: Any, expected_status: PaymentStatus) -> List[Any]:
+        self.applied.extend(updates)
+        return [payment_id for payment_id, _, _ in updates]
+
+
+class FakeGateway:
+    async def get_payment_status(self, gateway_payment_id: str) -> GatewayPaymentResult:
+        if gateway_payment_id == "broken":
+            raise RuntimeError("unexpected payload")
+        if gateway_payment_id == "down":
+            raise GatewayError("gateway error")
+        if gateway_payment_id == "pending":
+            return GatewayPaymentResult(gateway_payment_id, PaymentStatus.PROCESSING)
+        return GatewayPaymentResult(gateway_payment_id, PaymentStatus.APPROVED)
+
+
+@asynccontextmanager
+async def _session():
+    yield None
+
+
+def _row(gateway_payment_id: str) -> SimpleNamespace:
+    return SimpleNamespace(id=uuid.uuid4(), gateway="fake", gateway_payment_id=gateway_payment_id)
+
+
+async def test_failing_row_does_not_abort_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(reconciliation, "get_gateway", lambda name: FakeGateway())
+    repository = FakeRepository()
+    sweeper = ReconciliationSweeper(repository, max_concurrency=4, rate_per_second=1000)
+    rows = [_row("ok-1"), _row("broken"), _row("down"), _row("pending"), _row("ok-2")]
+    report = ReconciliationReport()
+
+    await sweeper._reconcile_batch(SimpleNamespace(session_factory=_session), rows, report)
+
+    assert [update[0] for update in repository.applied] == [rows[0].id, rows[4].id]
+    assert report.updated == 2
+    assert report.unchanged == 1
+    assert report.errors == 2
@@ -0,0 +1,179 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.dependencies import get_current_active_user
+from app.modules.payments import router as payments_router
+from app.modules.payments.models import ConcurrentUpdateError, Payment, PaymentStatus
+
+pytestmark = pytest.mark.anyio
+
+USER = SimpleNamespace(id=uuid.uuid4(), is_active=True, is_superuser=False)
+
+
+def _payment(**values: Any) -> Payment:
+    now = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    payment = Payment(
+        id=uuid.uuid4(), user_id=USER.id, amount=Decimal("10.00"), currency="BRL",
+        status=PaymentStatus.APPROVED, gateway="mock", version=1, created_at=now, updated_at=now,
+    )
+    for name, value in values.items():
+        setattr(payment, name, value)
+    return payment
+
+
+@pytest.fixture
+def service(monkeypatch: pytest.MonkeyPatch) -> Any:
+    async def no_shard_lookup(payment_id: uuid.UUID) -> Any:
+        raise AssertionError("endpoint must not resolve the payment shard")
+
+    monkeypatch.setattr(payments_router.payment_service, "shard_of", no_shard_lookup)
+    return payments_router.payment_service
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    app = FastAPI()
+    app.include_router(payments_router.router, prefix="/payments")
+    app.dependency_overrides[get_current_active_user] = lambda: USER
+    app.dependency_overrides[payments_router.get_payment_db_session] = lambda: None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_status_endpoints_do_not_open_a_payment_session(
+    client: httpx.AsyncClient, service: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    payment = _payment()
+
+    async def shared(payment_id: uuid.UUID) -> Payment:
+        return payment
+
+    monkeypatch.setattr(service, "get_payment_shared", shared)
+
+    waited = await client.get(f"/payments/{payment.id}/status")
+    assert (waited.status_code, waited.json()["status"]) == (200, "APPROVED")
+
+    streamed = await client.get(f"/payments/{payment.id}/events")
+    assert streamed.status_code == 200
+    assert streamed.text.startswith("event: status\n")
+
+
+async def test_status_of_another_users_payment_is_forbidden(
+    client: httpx.AsyncClient, service: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    payment = _payment(user_id=uuid.uuid4())
+
+    async def shared(payment_id: uuid.UUID) -> Payment:
+        return payment
+
+    monkeypatch.setattr(service, "get_payment_shared", shared)
+
+    assert (await client.get(f"/payments/{payment.id}/status")).status_code == 403
+    assert (await client.get(f"/payments/{payment.id}/events")).status_code == 403
+
+
+class VersionedStore:
+    """Pagamento em memória cuja versão avança a cada escrita; conflicts simula escritas concorrentes."""
+
+    def __init__(self, payment: Payment, conflicts: int = 0) -> None:
+        self.payment = payment
+        self.conflicts = conflicts
+        self.writes: List[dict] = []
+
+    async def get_payment(self, db: Any, payment_id: uuid.UUID) -> Payment:
+        return _payment(id=self.payment.id, version=self.payment.version, description=self.payment.description)
+
+    async def update(self, db: Any, *, db_payment: Payment, payment_in: dict) -> Payment:
+        if db_payment.version != self.payment.version or self.conflicts:
+            if self.conflicts:
+                # Outra transação escreveu entre a leitura e o UPDATE
+                self.conflicts -= 1
+                self.payment.version += 1
+            raise ConcurrentUpdateError("stale")
+        self.writes.append(payment_in)
+        self.payment = _payment(id=self.payment.id, version=self.payment.version + 1, **payment_in)
+        return self.payment
+
+
+@pytest.fixture
+def store(service: Any, monkeypatch: pytest.MonkeyPatch) -> VersionedStore:
+    store = VersionedStore(_payment(version=1))
+    monkeypatch.setattr(service, "get_payment", store.get_payment)
+    monkeypatch.setattr(service.repository, "update", store.update)
+
+    async def shared(payment_id: uuid.UUID) -> Payment:
+        return await store.get_payment(None, payment_id)
+
+    monkeypatch.setattr(service, "get_payment_shared", shared)
+    return store
+
+
+async def test_read_sends_the_version_as_etag(client: httpx.AsyncClient, store: VersionedStore) -> None:
+    response = await client.get(f"/payments/{store.payment.id}")
+
+    assert response.headers["etag"] == '"1"'
+
+
+@pytest.mark.parametrize("if_match", ['"1"', 'W/"1"', "1", "*", None])
+async def test_update_with_current_version(
+    client: httpx.AsyncClient, store: VersionedStore, if_match: Any
+) -> None:
+    headers = {"If-Match": if_match} if if_match else {}
+
+    response = await client.patch(f"/payments/{store.payment.id}", json={"description": "new"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+    assert (response.json()["description"], response.json()["version"]) == ("new", 2)
+
+
+async def test_update_with_stale_if_match_is_rejected(client: httpx.AsyncClient, store: VersionedStore) -> None:
+    store.payment.version = 3
+
+    response = await client.patch(
+        f"/payments/{store.payment.id}", json={"description": "new"}, headers={"If-Match": '"2"'}
+    )
+
+    assert response.status_code == 412
+    assert response.headers["etag"] == '"3"'
+    assert store.writes == []
+
+
+async def test_invalid_if_match(client: httpx.AsyncClient, store: VersionedStore) -> None:
+    response = await client.patch(
+        f"/payments/{store.payment.id}", json={"description": "new"}, headers={"If-Match": "abc"}
+    )
+
+    assert response.status_code == 400
+
+
+async def test_lost_race_with_if_match_is_a_failed_precondition(
+    client: httpx.AsyncClient, store: VersionedStore
+) -> None:
+    store.conflicts = 1
+
+    response = await client.patch(
+        f"/payments/{store.payment.id}", json={"description": "new"}, headers={"If-Match": '"1"'}
+    )
+
+    assert (response.status_code, response.headers["etag"]) == (412, '"2"')
+    assert store.writes == []
+
+
+@pytest.mark.parametrize("conflicts, status_code", [(2, 200), (3, 409)])
+async def test_lost_race_without_if_match_is_retried(
+    client: httpx.AsyncClient, store: VersionedStore, conflicts: int, status_code: int
+) -> None:
+    store.conflicts = conflicts
+
+    response = await client.patch(f"/payments/{store.payment.id}", json={"description": "new"})
+
+    assert response.status_code == status_code
+    assert store.writes == ([{"description": "new"}] if status_code == 200 else [])
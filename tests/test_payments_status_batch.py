@@ -0,0 +1,117 @@
+import uuid
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import insert
+
+from app.core.dependencies import get_current_active_user
+from app.core.ids import new_id
+from app.core.sharding import ShardRouter
+from app.modules.payments import router as payments_router
+from app.modules.payments import service as payment_service
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+OWNER = SimpleNamespace(id=new_id(), is_active=True, is_superuser=False)
+OTHER = SimpleNamespace(id=new_id(), is_active=True, is_superuser=False)
+ADMIN = SimpleNamespace(id=new_id(), is_active=True, is_superuser=True)
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(payments_router.router, prefix="/payments")
+    app.dependency_overrides[get_current_active_user] = lambda: OWNER
+    return app
+
+
+@pytest.fixture
+async def client(app: FastAPI) -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"ids": [], "gateway_payment_ids": []},
+        {"ids": [str(uuid.uuid4())] * 5001},
+        {"ids": ["not-a-uuid"]},
+    ],
+)
+async def test_invalid_batches_are_rejected(client: httpx.AsyncClient, body: Dict[str, Any]) -> None:
+    assert (await client.post("/payments/status:batch", json=body)).status_code == 422
+
+
+# --- Com bancos (fixture shard_router) -----------------------------------------
+
+
+@pytest.fixture
+async def payments(shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """Pagamentos de OWNER e OTHER (em shards possivelmente diferentes), por gateway_payment_id."""
+    monkeypatch.setattr(payment_service, "get_shard_router", lambda: shard_router)
+    rows: List[Dict[str, Any]] = []
+    for user, prefix in ((OWNER, "own"), (OTHER, "other")):
+        async with shard_router.shard_for(user.id).session() as db:
+            await db.execute(insert(User), [{"id": user.id, "email": f"{prefix}@example.com", "password": "x"}])
+            user_rows = [
+                {"id": shard_router.colocated_id(user.id), "user_id": user.id, "amount": Decimal("10.00"),
+                 "currency": "BRL", "status": status, "gateway": gateway, "gateway_payment_id": f"{prefix}-{i}"}
+                for i, (status, gateway) in enumerate([
+                    (PaymentStatus.APPROVED, "mock"), (PaymentStatus.PROCESSING, "mock"), (PaymentStatus.FAILED, "other"),
+                ])
+            ]
+            await db.execute(insert(Payment), user_rows)
+            await db.commit()
+        rows += user_rows
+    return {row["gateway_payment_id"]: SimpleNamespace(**row) for row in rows}
+
+
+async def test_owner_gets_statuses_of_own_payments_only(
+    client: httpx.AsyncClient, payments: Dict[str, Any]
+) -> None:
+    unknown = new_id()
+    body = {
+        "ids": [str(payments["own-0"].id), str(payments["own-1"].id), str(payments["other-0"].id), str(unknown),
+                str(payments["own-0"].id)],
+        "gateway_payment_ids": ["own-2", "other-1", "missing"],
+    }
+
+    response = await client.post("/payments/status:batch", json=body)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "statuses": {str(payments["own-0"].id): "APPROVED", str(payments["own-1"].id): "PROCESSING"},
+        "gateway_statuses": {"own-2": "FAILED"},
+        "not_found_ids": [str(payments["other-0"].id), str(unknown)],
+        "not_found_gateway_payment_ids": ["other-1", "missing"],
+    }
+
+
+async def test_gateway_restricts_gateway_payment_ids(client: httpx.AsyncClient, payments: Dict[str, Any]) -> None:
+    body = {"gateway_payment_ids": ["own-0", "own-2"], "gateway": "mock", "ids": [str(payments["own-2"].id)]}
+
+    result = (await client.post("/payments/status:batch", json=body)).json()
+
+    assert result["gateway_statuses"] == {"own-0": "APPROVED"}
+    assert result["not_found_gateway_payment_ids"] == ["own-2"]
+    # O filtro de gateway não se aplica aos ids internos
+    assert result["statuses"] == {str(payments["own-2"].id): "FAILED"}
+
+
+async def test_superuser_reads_every_shard(
+    app: FastAPI, client: httpx.AsyncClient, payments: Dict[str, Any]
+) -> None:
+    app.dependency_overrides[get_current_active_user] = lambda: ADMIN
+
+    result = (await client.post("/payments/status:batch", json={"ids": [str(p.id) for p in payments.values()]})).json()
+
+    assert result["statuses"] == {str(p.id): p.status.value for p in payments.values()}
+    assert result["not_found_ids"] == []
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import asyncpg
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import asyncpg_dsn
+from app.modules.payments.events import NOTIFY_CHANNEL, payment_events
+from app.modules.payments.models import (
+    Payment,
+    PaymentStatus,
+    can_transition,
+    transition_sources,
+)
+from app.modules.payments.repository import PaymentRepository
+from app.modules.users.models import User
+
+from .conftest import TEST_DATABASE_URL
+
+pytestmark = pytest.mark.anyio
+
+TERMINAL = [PaymentStatus.FAILED, PaymentStatus.CANCELED, PaymentStatus.REFUNDED, PaymentStatus.CHARGEBACK]
+
+
+@pytest.mark.parametrize("status", list(PaymentStatus))
+def test_keeping_the_status_is_always_allowed(status: PaymentStatus) -> None:
+    assert can_transition(status, status)
+
+
+@pytest.mark.parametrize("status", TERMINAL)
+def test_terminal_statuses_are_final(status: PaymentStatus) -> None:
+    assert [target for target in PaymentStatus if target != status and can_transition(status, target)] == []
+
+
+def test_transitions() -> None:
+    assert can_transition(PaymentStatus.PENDING, PaymentStatus.PROCESSING)
+    assert can_transition(PaymentStatus.PROCESSING, PaymentStatus.APPROVED)
+    assert can_transition(PaymentStatus.APPROVED, PaymentStatus.REFUNDED)
+    assert not can_transition(PaymentStatus.PROCESSING, PaymentStatus.PENDING)
+    assert not can_transition(PaymentStatus.PENDING, PaymentStatus.REFUNDED)
+    assert not can_transition(PaymentStatus.APPROVED, PaymentStatus.CANCELED)
+
+
+def test_transition_sources() -> None:
+    assert transition_sources(PaymentStatus.REFUNDED) == {PaymentStatus.APPROVED}
+    assert transition_sources(PaymentStatus.CANCELED) == {PaymentStatus.PENDING, PaymentStatus.PROCESSING}
+    assert transition_sources(PaymentStatus.PENDING) == set()
+
+
+class RecordingSession:
+    """Sessão falsa: devolve as linhas do UPDATE e registra cada comando executado."""
+
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.statements: List[Any] = []
+        self.commits = 0
+
+    async def execute(self, statement: Any) -> Any:
+        self.statements.append(statement)
+        rows = [SimpleNamespace(_mapping=row) for row in self.rows]
+        self.rows = []
+        return SimpleNamespace(all=lambda: rows)
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+async def test_bulk_transition_notifies_in_one_statement(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "PAYMENT_EVENTS_PG_NOTIFY", True)
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"id": uuid.uuid4(), "status": PaymentStatus.REFUNDED, "gateway_payment_id": None,
+         "error_message": None, "updated_at": now, "version": 2}
+        for _ in range(500)
+    ]
+    db = RecordingSession(rows)
+
+    async with payment_events.subscribe(rows[0]["id"]) as queue:
+        events, skipped = await PaymentRepository().transition_status(
+            db, new_status=PaymentStatus.REFUNDED, from_statuses={PaymentStatus.APPROVED}
+        )
+        assert queue.get_nowait().id == rows[0]["id"]
+
+    assert len(events) == 500
+    assert skipped == {}
+    assert db.commits == 1
+    # UPDATE ... RETURNING + um único SELECT pg_notify(...) FROM unnest(...)
+    assert len(db.statements) == 2
+    params = db.statements[1].compile().params
+    [payloads] = [value for value in params.values() if isinstance(value, list)]
+    assert len(payloads) == 500
+    assert json.loads(payloads[0])["event"]["id"] == str(rows[0]["id"])
+
+
+async def _seed(db: AsyncSession, statuses: List[PaymentStatus]) -> List[uuid.UUID]:
+    user_id = uuid.uuid4()
+    await db.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"}])
+    ids = [uuid.uuid4() for _ in statuses]
+    await db.execute(
+        insert(Payment),
+        [
+            {"id": payment_id, "user_id": user_id, "amount": Decimal("10.00"), "currency": "BRL",
+             "status": status, "gateway": "mock", "gateway_payment_id": f"mock_{payment_id.hex}"}
+            for payment_id, status in zip(ids, statuses)
+        ],
+    )
+    await db.commit()
+    return ids
+
+
+async def test_transition_status_is_set_based(db: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "PAYMENT_EVENTS_PG_NOTIFY", True)
+    statuses = [PaymentStatus.APPROVED] * 3 + [PaymentStatus.PENDING, PaymentStatus.REFUNDED]
+    ids = await _seed(db, statuses)
+    missing = uuid.uuid4()
+
+    received: List[str] = []
+    listener = await asyncpg.connect(asyncpg_dsn(TEST_DATABASE_URL))
+    try:
+        await listener.add_listener(NOTIFY_CHANNEL, lambda *args: received.append(args[-1]))
+        events, skipped = await PaymentRepository().transition_status(
+            db,
+            new_status=PaymentStatus.REFUNDED,
+            from_statuses=transition_sources(PaymentStatus.REFUNDED),
+            ids=ids + [missing],
+            error_message="bulk refund",
+        )
+        for _ in range(50):
+            if len(received) == 3:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await listener.close()
+
+    assert sorted(event.id for event in events) == sorted(ids[:3])
+    assert all(event.version == 2 for event in events)
+    assert skipped == {ids[3]: PaymentStatus.PENDING, ids[4]: PaymentStatus.REFUNDED, missing: None}
+    assert sorted(json.loads(payload)["event"]["id"] for payload in received) == sorted(map(str, ids[:3]))
+
+    rows = (await db.execute(select(Payment.id, Payment.status, Payment.error_message))).all()
+    current = {row.id: (row.status, row.error_message) for row in rows}
+    assert current[ids[0]] == (PaymentStatus.REFUNDED, "bulk refund")
+    assert current[ids[3]] == (PaymentStatus.PENDING, None)
+
+
+async def test_apply_status_updates_keeps_concurrent_changes(db: AsyncSession) -> None:
+    ids = await _seed(db, [PaymentStatus.PROCESSING, PaymentStatus.APPROVED, PaymentStatus.PROCESSING])
+
+    changed = await PaymentRepository().apply_status_updates(
+        db,
+        updates=[
+            (ids[0], PaymentStatus.APPROVED, None),
+            (ids[1], PaymentStatus.FAILED, "late"),  # já alterado (ex: por webhook)
+            (ids[2], PaymentStatus.FAILED, "declined"),
+        ],
+        expected_status=PaymentStatus.PROCESSING,
+    )
+
+    assert {event.id: event.status for event in changed} == {
+        ids[0]: PaymentStatus.APPROVED,
+        ids[2]: PaymentStatus.FAILED,
+    }
+    rows = (await db.execute(select(Payment.id, Payment.status))).all()
+    assert dict(rows)[ids[1]] == PaymentStatus.APPROVED
@@ -0,0 +1,94 @@
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from app.core import rate_limit
+from app.core.rate_limit import MemoryRateLimitBackend, Rate, client_ip
+from app.modules.auth import router as auth_router
+
+pytestmark = pytest.mark.anyio
+
+
+def _request(forwarded: List[str], peer: str = "10.0.0.2") -> Request:
+    headers: List[Tuple[bytes, bytes]] = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 4321)})
+
+
+@pytest.mark.parametrize(
+    "hops, forwarded, expected",
+    [
+        # Sem proxy confiável o header é ignorado
+        (0, ["1.1.1.1"], "10.0.0.2"),
+        # Um proxy: a entrada que ele acrescentou, não a forjada pelo cliente à esquerda
+        (1, ["6.6.6.6, 203.0.113.7"], "203.0.113.7"),
+        (1, ["6.6.6.6", "203.0.113.7"], "203.0.113.7"),
+        # CDN + load balancer: o cliente é a segunda entrada a partir da direita
+        (2, ["6.6.6.6, 203.0.113.7, 198.51.100.1"], "203.0.113.7"),
+        # Menos entradas que proxies: todas vieram dos proxies
+        (3, ["203.0.113.7, 198.51.100.1"], "203.0.113.7"),
+        (1, [], "10.0.0.2"),
+    ],
+)
+def test_client_ip_counts_trusted_hops_from_the_right(
+    monkeypatch: pytest.MonkeyPatch, hops: int, forwarded: List[str], expected: str
+) -> None:
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_TRUSTED_PROXY_HOPS", hops)
+    assert client_ip(_request(forwarded)) == expected
+
+
+def test_spoofed_entries_do_not_change_the_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_TRUSTED_PROXY_HOPS", 1)
+    keys = {client_ip(_request([f"10.9.{index}.1, 203.0.113.7"])) for index in range(20)}
+    assert keys == {"203.0.113.7"}
+
+
+async def test_memory_backend_allows_bursts_then_limits() -> None:
+    now = [0.0]
+    backend = MemoryRateLimitBackend(clock=lambda: now[0])
+    rate = Rate.parse("3/minute")
+
+    assert [await backend.hit("k", rate) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await backend.hit("k", rate) == pytest.approx(20.0)
+    now[0] = 20.0
+    assert await backend.hit("k", rate) == 0.0
+
+
+@pytest.fixture
+async def client(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[httpx.AsyncClient]:
+    async def no_user(email: str) -> Optional[object]:
+        return None
+
+    backend = MemoryRateLimitBackend()
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda: backend)
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_TRUSTED_PROXY_HOPS", 1)
+    monkeypatch.setattr(auth_router.user_service, "get_user_by_email", no_user)
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_login_is_limited_per_account_across_ips(client: httpx.AsyncClient) -> None:
+    limit = Rate.parse(rate_limit.settings.RATE_LIMIT_LOGIN_PER_ACCOUNT).limit
+    statuses = []
+    for attempt in range(limit + 1):
+        # Cada tentativa de um IP diferente e com outra grafia do mesmo email
+        email = "Victim@Example.com" if attempt % 2 else "victim@example.com"
+        response = await client.post(
+            "/auth/login",
+            json={"email": email, "password": "guess"},
+            headers={"X-Forwarded-For": f"203.0.113.{attempt}"},
+        )
+        statuses.append(response.status_code)
+
+    assert statuses == [401] * limit + [429]
+    assert int(response.headers["retry-after"]) >= 1
+
+    other = await client.post(
+        "/auth/login", json={"email": "other@example.com", "password": "guess"},
+        headers={"X-Forwarded-For": "203.0.113.250"},
+    )
+    assert other.status_code == 401
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from typing import Iterator, List
+
+import pytest
+
+from app.core import security
+from app.core.security import (
+    PasswordCheckRejected,
+    get_password_hash_async,
+    get_password_hashes,
+    verify_password,
+    verify_password_async,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fresh_slots(monkeypatch: pytest.MonkeyPatch) -> None:
+    # O semáforo é criado no primeiro uso e fica preso ao event loop do teste
+    monkeypatch.setattr(security, "_verify_slots", None)
+
+
+@pytest.fixture
+def hash_pool(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_WORKERS", 2)
+    yield
+    security.shutdown_hash_executor()
+
+
+async def test_hash_and_verify_run_off_the_event_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    threads: List[int] = []
+    hash_password, check_password = security.get_password_hash, security.verify_password
+
+    def recorded_hash(password: str) -> str:
+        threads.append(threading.get_ident())
+        return hash_password(password)
+
+    def recorded_verify(password: str, hashed: str) -> bool:
+        threads.append(threading.get_ident())
+        return check_password(password, hashed)
+
+    monkeypatch.setattr(security, "get_password_hash", recorded_hash)
+    monkeypatch.setattr(security, "verify_password", recorded_verify)
+
+    hashed = await get_password_hash_async("secret")
+
+    assert await verify_password_async("secret", hashed)
+    assert not await verify_password_async("wrong", hashed)
+    assert len(threads) == 3 and threading.get_ident() not in threads
+
+
+async def test_verify_is_rejected_when_no_slot_frees_up(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security.settings, "PASSWORD_VERIFY_CONCURRENCY", 1)
+    monkeypatch.setattr(security.settings, "PASSWORD_VERIFY_QUEUE_TIMEOUT_SECONDS", 0.05)
+    hashed = security.get_password_hash("secret")
+    busy = asyncio.Event()
+
+    async def hold_slot() -> None:
+        async with security._get_verify_slots():
+            busy.set()
+            await asyncio.sleep(0.5)
+
+    holder = asyncio.create_task(hold_slot())
+    await busy.wait()
+    try:
+        with pytest.raises(PasswordCheckRejected):
+            await verify_password_async("secret", hashed)
+    finally:
+        holder.cancel()
+
+    # A vaga liberada volta a ser usada
+    assert await verify_password_async("secret", hashed)
+
+
+async def test_bulk_hashes_keep_the_input_order(hash_pool: None) -> None:
+    passwords = [f"password-{i}" for i in range(4)]
+
+    hashes = await get_password_hashes(passwords)
+
+    assert len(hashes) == len(passwords)
+    assert all(verify_password(password, hashed) for password, hashed in zip(passwords, hashes))
+    assert await get_password_hashes([]) == []
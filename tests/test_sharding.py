@@ -0,0 +1,224 @@
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.core import sharding
+from app.core.ids import new_id
+from app.core.sharding import Shard, ShardRouter, bucket_clause, merge_pages, parse_buckets
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+
+def _fake_shards(count: int, results: Any = None) -> List[Shard]:
+    """Shards sem banco: a "sessão" de cada um devolve results[index] em db.result."""
+    shards = []
+    for index in range(count):
+        @asynccontextmanager
+        async def session_factory(index: int = index):
+            yield SimpleNamespace(index=index, result=None if results is None else results[index])
+
+        shards.append(Shard(index, f"postgresql+asyncpg://user:secret@db{index}/app", None, session_factory))
+    return shards
+
+
+def test_buckets_are_split_in_contiguous_ranges() -> None:
+    router = ShardRouter(_fake_shards(3), buckets=16)
+
+    owned = [router.buckets_of(shard) for shard in router.shards]
+    assert sorted(bucket for buckets in owned for bucket in buckets) == list(range(16))
+    for buckets in owned:
+        assert buckets == list(range(buckets[0], buckets[-1] + 1))
+
+
+def test_overrides_move_single_buckets() -> None:
+    router = ShardRouter(_fake_shards(2), buckets=8, overrides={0: 1, 7: 0})
+
+    assert router.buckets_of(router.shards[0]) == [1, 2, 3, 7]
+    assert router.buckets_of(router.shards[1]) == [0, 4, 5, 6]
+    assert router.shard_for(uuid.UUID(int=8 * 1234)) is router.shards[1]
+
+
+@pytest.mark.parametrize(
+    "shards, buckets, overrides",
+    [(0, 16, None), (2, 12, None), (2, 1 << 33, None), (2, 16, {16: 0}), (2, 16, {3: 2})],
+)
+def test_invalid_configuration_is_rejected(shards: int, buckets: int, overrides: Any) -> None:
+    with pytest.raises(ValueError):
+        ShardRouter(_fake_shards(shards), buckets=buckets, overrides=overrides)
+
+
+def test_colocated_id_routes_to_the_owner_shard() -> None:
+    router = ShardRouter(_fake_shards(3), buckets=64)
+    for _ in range(200):
+        user_id = new_id()
+        payment_id = router.colocated_id(user_id)
+        assert router.bucket_of(payment_id) == router.bucket_of(user_id)
+        assert router.shard_for(payment_id) is router.shard_for(user_id)
+        # Só os bits baixos mudam: versão e variante continuam as de new_id
+        assert (payment_id.version, payment_id.variant) == (user_id.version, user_id.variant)
+
+
+def test_shard_repr_hides_password() -> None:
+    assert "secret" not in repr(_fake_shards(1)[0])
+
+
+@pytest.mark.parametrize("skip, limit", [(0, 5), (3, 4), (10, 10), (40, 5)])
+def test_merge_pages_applies_global_skip_and_limit(skip: int, limit: int) -> None:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    items = [start + timedelta(minutes=minute) for minute in range(45)]
+    # Cada shard fica com uma parte e devolve os skip + limit mais recentes
+    pages = [sorted(items[shard::3], reverse=True)[: skip + limit] for shard in range(3)]
+
+    merged = merge_pages(pages, key=lambda item: item, skip=skip, limit=limit)
+
+    assert merged == sorted(items, reverse=True)[skip : skip + limit]
+
+
+def test_parse_buckets() -> None:
+    assert parse_buckets("17, 40-43,5") == [5, 17, 40, 41, 42, 43]
+
+
+async def test_gather_runs_on_every_shard() -> None:
+    router = ShardRouter(_fake_shards(3), buckets=16)
+
+    async def index(db: Any) -> int:
+        return db.index
+
+    assert await router.gather(index) == [0, 1, 2]
+    assert await router.gather(index, router.shards[1:]) == [1, 2]
+
+
+async def test_find_and_locate() -> None:
+    router = ShardRouter(_fake_shards(3, results=[None, None, "found"]), buckets=16)
+
+    async def result(db: Any) -> Any:
+        return db.result
+
+    shard, found = await router.find(result)
+    assert (shard.index, found) == (2, "found")
+
+    # O shard do id não tem o registro (id anterior ao sharding): procura nos demais
+    key = uuid.UUID(int=0)
+    assert router.shard_for(key).index == 0
+    shard, found = await router.locate(key, result)
+    assert (shard.index, found) == (2, "found")
+
+    empty = ShardRouter(_fake_shards(2, results=[None, None]), buckets=16)
+    shard, found = await empty.locate(key, result)
+    assert (shard.index, found) == (0, None)
+
+
+def test_cli_parser() -> None:
+    args = sharding._parser().parse_args(["copy", "--buckets", "1-3", "--source", "0", "--target", "2"])
+    assert (args.command, args.buckets, args.source, args.target, args.batch_size) == ("copy", "1-3", 0, 2, 1000)
+
+
+# --- Com bancos (fixture shard_router) -----------------------------------------
+
+
+async def _seed(shard: Shard, router: ShardRouter, users: int, payments_per_user: int = 2) -> List[uuid.UUID]:
+    user_ids = [new_id() for _ in range(users)]
+    async with shard.session() as db:
+        await db.execute(
+            insert(User), [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"} for user_id in user_ids]
+        )
+        if payments_per_user:
+            await db.execute(
+                insert(Payment),
+                [
+                    {"id": router.colocated_id(user_id), "user_id": user_id, "amount": Decimal("10.00"),
+                     "currency": "BRL", "status": PaymentStatus.APPROVED, "gateway": "mock"}
+                    for user_id in user_ids
+                    for _ in range(payments_per_user)
+                ],
+            )
+        await db.commit()
+    return user_ids
+
+
+async def _count(shard: Shard, model: Any) -> int:
+    async with shard.session() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+async def test_bucket_clause_matches_the_router(shard_router: ShardRouter) -> None:
+    shard = shard_router.shards[0]
+    user_ids = await _seed(shard, shard_router, users=64, payments_per_user=0)
+    buckets = [1, 5, 6, 7, 15]
+
+    async with shard.session() as db:
+        selected = set(await db.scalars(select(User.id).where(bucket_clause(User.id, buckets, shard_router.buckets))))
+
+    assert selected == {user_id for user_id in user_ids if shard_router.bucket_of(user_id) in buckets}
+
+
+async def test_copy_then_purge_moves_buckets(shard_router: ShardRouter) -> None:
+    source, target = shard_router.shards[0], shard_router.shards[2]
+    user_ids = await _seed(source, shard_router, users=40)
+    moved = [bucket for bucket in shard_router.buckets_of(source) if bucket % 2 == 0]
+    moved_users = {user_id for user_id in user_ids if shard_router.bucket_of(user_id) in moved}
+
+    copied = await sharding.copy_buckets(shard_router, moved, source, target, batch_size=7)
+    assert copied == {"users": len(moved_users), "payments": 2 * len(moved_users)}
+    # Idempotente: a segunda passada (após a troca da config) não duplica nada
+    await sharding.copy_buckets(shard_router, moved, source, target)
+    assert await _count(target, Payment) == 2 * len(moved_users)
+
+    # A origem ainda é dona dos buckets até a config mudar
+    with pytest.raises(ValueError):
+        await sharding.purge_buckets(shard_router, moved, source)
+
+    moved_router = ShardRouter(shard_router.shards, shard_router.buckets, {bucket: 2 for bucket in moved})
+    deleted = await sharding.purge_buckets(moved_router, moved, source, batch_size=5)
+
+    assert deleted == {"users": len(moved_users), "payments": 2 * len(moved_users)}
+    assert await _count(source, User) == len(user_ids) - len(moved_users)
+    assert await _count(target, User) == len(moved_users)
+    assert await _count(target, Payment) == 2 * len(moved_users)
+    for user_id in user_ids:
+        async with moved_router.shard_for(user_id).session() as db:
+            assert await db.get(User, user_id) is not None
+
+
+async def test_cli_status_and_copy(
+    shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+) -> None:
+    await _seed(shard_router.shards[0], shard_router, users=10, payments_per_user=0)
+    monkeypatch.setattr(sharding, "get_shard_router", lambda: shard_router)
+    monkeypatch.setattr(sharding.settings, "SHARD_BUCKET_OVERRIDES", {})
+
+    await sharding._run_command(sharding._parser().parse_args(["status"]))
+    output = capsys.readouterr().out.splitlines()
+    assert [line.split(": ")[1] for line in output] == ["6 buckets, 10 users", "5 buckets, 0 users", "5 buckets, 0 users"]
+
+    args = ["copy", "--buckets", "0-1", "--source", "0", "--target", "1"]
+    await sharding._run_command(sharding._parser().parse_args(args))
+    assert capsys.readouterr().out.splitlines()[-1] == 'SHARD_BUCKET_OVERRIDES={"0": 1, "1": 1}'
+
+
+async def test_scatter_gather_listing_is_globally_ordered(shard_router: ShardRouter) -> None:
+    from app.modules.users import repository as user_repo
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    created = {}
+    for minute in range(30):
+        user_id = new_id()
+        created[user_id] = start + timedelta(minutes=minute)
+        async with shard_router.shard_for(user_id).session() as db:
+            await db.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com",
+                                             "password": "x", "created_at": created[user_id]}])
+            await db.commit()
+
+    pages = await shard_router.gather(lambda db: user_repo.get_users(db, skip=0, limit=12))
+    merged = merge_pages(pages, key=lambda user: user.created_at, skip=5, limit=7)
+
+    expected = sorted(created, key=created.get, reverse=True)[5:12]
+    assert [user.id for user in merged] == expected
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.singleflight import SingleFlight
+from app.modules.payments import service as payment_service
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowLoad:
+    """Consulta que só termina quando release é chamado; conta as execuções."""
+
+    def __init__(self, result: Any = "value", error: Optional[Exception] = None) -> None:
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self._done = asyncio.Event()
+
+    async def __call__(self) -> Any:
+        self.calls += 1
+        await self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def release(self) -> None:
+        self._done.set()
+
+
+async def _let_run() -> None:
+    # Deixa as tasks criadas chegarem ao await da execução compartilhada
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_concurrent_calls_share_one_execution() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.share")
+    load = SlowLoad()
+
+    tasks = [asyncio.create_task(flight.do("key", load)) for _ in range(10)]
+    await _let_run()
+    load.release()
+
+    assert await asyncio.gather(*tasks) == ["value"] * 10
+    assert load.calls == 1
+    assert flight.snapshot() == {"calls": 10, "executions": 1, "coalesced": 9, "errors": 0, "in_flight": 0}
+
+
+async def test_nothing_is_cached_after_completion() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.nocache")
+    load = SlowLoad()
+    load.release()
+
+    await flight.do("key", load)
+    await flight.do("key", load)
+
+    assert load.calls == 2
+
+
+async def test_different_keys_run_separately() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.keys")
+    load = SlowLoad()
+
+    tasks = [asyncio.create_task(flight.do(key, load)) for key in ("a", "b", "a")]
+    await _let_run()
+    load.release()
+    await asyncio.gather(*tasks)
+
+    assert load.calls == 2
+
+
+async def test_error_reaches_every_caller() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.error")
+    load = SlowLoad(error=RuntimeError("db down"))
+
+    tasks = [asyncio.create_task(flight.do("key", load)) for _ in range(3)]
+    await _let_run()
+    load.release()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert load.calls == 1
+    assert flight.stats["errors"] == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_others() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.cancel")
+    load = SlowLoad()
+
+    first = asyncio.create_task(flight.do("key", load))
+    second = asyncio.create_task(flight.do("key", load))
+    await _let_run()
+    first.cancel()
+    await asyncio.sleep(0)
+    load.release()
+
+    assert await second == "value"
+    assert first.cancelled()
+
+
+async def test_forget_forces_a_new_execution() -> None:
+    flight: SingleFlight[str] = SingleFlight("test.forget")
+    before, after = SlowLoad("old"), SlowLoad("new")
+
+    stale = asyncio.create_task(flight.do("key", before))
+    await _let_run()
+    flight.forget("key")
+    fresh = asyncio.create_task(flight.do("key", after))
+    await _let_run()
+    before.release()
+    after.release()
+
+    assert (await stale, await fresh) == ("old", "new")
+
+
+async def test_concurrent_payment_reads_share_one_query(monkeypatch: pytest.MonkeyPatch) -> None:
+    payment = SimpleNamespace(id=uuid.uuid4())
+    queries: List[uuid.UUID] = []
+
+    async def locate(key: uuid.UUID, fn: Any) -> Any:
+        queries.append(key)
+        await asyncio.sleep(0.01)
+        return None, payment if key == payment.id else None
+
+    monkeypatch.setattr(payment_service, "get_shard_router", lambda: SimpleNamespace(locate=locate))
+    service = payment_service.PaymentService()
+
+    results = await asyncio.gather(*(service.get_payment_shared(payment.id) for _ in range(20)))
+
+    assert all(result is payment for result in results)
+    assert queries == [payment.id]
+    with pytest.raises(HTTPException):
+        await service.get_payment_shared(uuid.uuid4())
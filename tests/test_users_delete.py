@@ -0,0 +1,146 @@
+import uuid
+from decimal import Decimal
+from typing import Any, AsyncIterator, List
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import func, insert, select
+
+from app.core.ids import new_id
+from app.core.sharding import ShardRouter, get_user_db_session
+from app.modules.payments.models import Payment, PaymentStatus
+from app.modules.payments.repository import PaymentRepository
+from app.modules.users import router as users_router
+from app.modules.users import service as user_service
+from app.modules.users.models import User
+
+pytestmark = pytest.mark.anyio
+
+
+# --- Endpoint -----------------------------------------------------------------
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    app = FastAPI()
+    app.include_router(users_router.router)
+    app.dependency_overrides[get_user_db_session] = lambda: None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_delete_returns_before_the_purge(client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[str] = []
+
+    async def soft_delete(db: Any, user_id: uuid.UUID) -> None:
+        calls.append("delete")
+
+    async def purge(user_id: uuid.UUID) -> None:
+        calls.append("purge")
+
+    monkeypatch.setattr(user_service, "delete_user", soft_delete)
+    monkeypatch.setattr(user_service, "purge_deleted_user", purge)
+
+    response = await client.delete(f"/users/{uuid.uuid4()}")
+
+    assert response.status_code == 204
+    # O purge roda como background task, depois da resposta
+    assert calls == ["delete", "purge"]
+
+
+async def test_delete_unknown_user_does_not_schedule_a_purge(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def not_found(db: Any, user_id: uuid.UUID) -> None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    async def purge(user_id: uuid.UUID) -> None:
+        raise AssertionError("purge must not run")
+
+    monkeypatch.setattr(user_service, "delete_user", not_found)
+    monkeypatch.setattr(user_service, "purge_deleted_user", purge)
+
+    assert (await client.delete(f"/users/{uuid.uuid4()}")).status_code == 404
+
+
+# --- Com bancos (fixture shard_router) -----------------------------------------
+
+
+@pytest.fixture
+def router(shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> ShardRouter:
+    monkeypatch.setattr(user_service, "get_shard_router", lambda: shard_router)
+    return shard_router
+
+
+async def _user_with_payments(router: ShardRouter, payments: int) -> uuid.UUID:
+    user_id = new_id()
+    async with router.shard_for(user_id).session() as db:
+        await db.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com", "password": "x"}])
+        if payments:
+            await db.execute(insert(Payment), [
+                {"id": router.colocated_id(user_id), "user_id": user_id, "amount": Decimal("10.00"),
+                 "currency": "BRL", "status": PaymentStatus.APPROVED, "gateway": "mock"}
+                for _ in range(payments)
+            ])
+        await db.commit()
+    return user_id
+
+
+async def _payments_of(router: ShardRouter, user_id: uuid.UUID) -> int:
+    async with router.shard_for(user_id).session() as db:
+        return await db.scalar(select(func.count()).select_from(Payment).where(Payment.user_id == user_id))
+
+
+async def test_soft_delete_does_not_load_payments(router: ShardRouter) -> None:
+    user_id = await _user_with_payments(router, payments=5)
+
+    async with router.shard_for(user_id).session() as db:
+        await user_service.delete_user(db, user_id)
+        assert not [obj for obj in db.identity_map.values() if isinstance(obj, Payment)]
+        # Some das buscas na hora; os pagamentos ficam para o purge
+        assert await user_service.get_user(db, user_id) is None
+
+    assert await _payments_of(router, user_id) == 5
+
+
+async def test_purge_deletes_payments_in_batches(router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> None:
+    user_id = await _user_with_payments(router, payments=7)
+    kept = await _user_with_payments(router, payments=2)
+    async with router.shard_for(user_id).session() as db:
+        await user_service.delete_user(db, user_id)
+
+    batches: List[int] = []
+    delete_batch = PaymentRepository.delete_batch_by_user
+
+    async def counted(self: PaymentRepository, db: Any, **kwargs: Any) -> int:
+        deleted = await delete_batch(self, db, **kwargs)
+        batches.append(deleted)
+        return deleted
+
+    monkeypatch.setattr(user_service.settings, "USER_PURGE_BATCH_SIZE", 3)
+    monkeypatch.setattr(PaymentRepository, "delete_batch_by_user", counted)
+
+    await user_service.purge_deleted_user(user_id)
+
+    assert batches == [3, 3, 1]
+    async with router.shard_for(user_id).session() as db:
+        assert await db.get(User, user_id) is None
+    assert await _payments_of(router, user_id) == 0
+    assert await _payments_of(router, kept) == 2
+
+
+async def test_interrupted_purges_resume(router: ShardRouter) -> None:
+    deleted = [await _user_with_payments(router, payments=2) for _ in range(6)]
+    kept = await _user_with_payments(router, payments=2)
+    for user_id in deleted:
+        async with router.shard_for(user_id).session() as db:
+            await user_service.delete_user(db, user_id)
+
+    await user_service.purge_deleted_users()
+
+    for user_id in deleted:
+        assert await _payments_of(router, user_id) == 0
+    async with router.shard_for(kept).session() as db:
+        assert await db.get(User, kept) is not None
+    assert await _payments_of(router, kept) == 2
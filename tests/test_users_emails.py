@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, List
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+
+from app.core import sharding
+from app.core.ids import new_id
+from app.core.sharding import ShardRouter
+from app.modules.users import repository as user_repo
+from app.modules.users import service as user_service
+from app.modules.users.models import User, UserEmail
+from app.modules.users.schema import UserCreate, UserUpdate
+
+pytestmark = pytest.mark.anyio
+
+PASSWORD = "a-strong-password"
+
+
+@pytest.fixture
+def router(shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> ShardRouter:
+    async def fast_hash(password: str) -> str:
+        return f"hashed:{password}"
+
+    async def fast_hashes(passwords: List[str]) -> List[str]:
+        return [f"hashed:{password}" for password in passwords]
+
+    monkeypatch.setattr(user_service, "get_shard_router", lambda: shard_router)
+    monkeypatch.setattr(user_service, "get_password_hash_async", fast_hash)
+    monkeypatch.setattr(user_service, "get_password_hashes", fast_hashes)
+    return shard_router
+
+
+async def _claims(router: ShardRouter) -> dict:
+    async with router.shards[0].session() as db:
+        return dict((await db.execute(select(UserEmail.email, UserEmail.user_id))).all())
+
+
+async def _users_with_email(router: ShardRouter, email: str) -> List[Any]:
+    """Usuários com o email em todos os shards, inclusive os removidos ainda não apagados."""
+    found = await router.gather(lambda db: db.scalars(select(User).where(User.email == email)))
+    return [user for users in found for user in users]
+
+
+async def test_concurrent_signups_with_the_same_email(router: ShardRouter) -> None:
+    user_in = UserCreate(email="same@example.com", password=PASSWORD)
+
+    results = await asyncio.gather(
+        *(user_service.create_user(user_in) for _ in range(8)), return_exceptions=True
+    )
+
+    created = [result for result in results if isinstance(result, User)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(created) == 1 and len(rejected) == 7
+    assert all(error.status_code == 400 for error in rejected)
+    assert [user.id for user in await _users_with_email(router, user_in.email)] == [created[0].id]
+    assert await _claims(router) == {user_in.email: created[0].id}
+
+
+async def test_failed_signup_releases_the_email(router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def broken_create_user(**kwargs: Any) -> User:
+        raise RuntimeError("database down")
+
+    user_in = UserCreate(email="retry@example.com", password=PASSWORD)
+    with monkeypatch.context() as patch:
+        patch.setattr(user_repo, "create_user", broken_create_user)
+        with pytest.raises(RuntimeError):
+            await user_service.create_user(user_in)
+    assert await _claims(router) == {}
+
+    user = await user_service.create_user(user_in)
+    assert await _claims(router) == {user_in.email: user.id}
+
+
+@pytest.mark.parametrize("age, available", [(timedelta(minutes=10), True), (timedelta(seconds=5), False)])
+async def test_claim_without_user(router: ShardRouter, age: timedelta, available: bool) -> None:
+    # Reserva de um cadastro interrompido entre a reserva e o INSERT
+    async with router.shards[0].session() as db:
+        await db.execute(insert(UserEmail), [{
+            "email": "orphan@example.com", "user_id": new_id(), "created_at": datetime.now(timezone.utc) - age,
+        }])
+        await db.commit()
+
+    if available:
+        user = await user_service.create_user(UserCreate(email="orphan@example.com", password=PASSWORD))
+        assert await _claims(router) == {"orphan@example.com": user.id}
+    else:
+        with pytest.raises(HTTPException):
+            await user_service.create_user(UserCreate(email="orphan@example.com", password=PASSWORD))
+
+
+async def test_email_change_moves_the_claim(router: ShardRouter) -> None:
+    first = await user_service.create_user(UserCreate(email="first@example.com", password=PASSWORD))
+    second = await user_service.create_user(UserCreate(email="second@example.com", password=PASSWORD))
+
+    async with router.shard_for(first.id).session() as db:
+        with pytest.raises(HTTPException):
+            await user_service.update_user(db, first.id, UserUpdate(email="second@example.com"))
+        await user_service.update_user(db, first.id, UserUpdate(email="renamed@example.com"))
+
+    assert await _claims(router) == {"renamed@example.com": first.id, "second@example.com": second.id}
+
+
+async def test_purge_releases_the_email(router: ShardRouter) -> None:
+    user = await user_service.create_user(UserCreate(email="gone@example.com", password=PASSWORD))
+    async with router.shard_for(user.id).session() as db:
+        await user_service.delete_user(db, user.id)
+    # Removido, mas ainda não apagado: o email continua ocupado
+    with pytest.raises(HTTPException):
+        await user_service.create_user(UserCreate(email="gone@example.com", password=PASSWORD))
+
+    await user_service.purge_deleted_user(user.id)
+
+    assert await _claims(router) == {}
+    await user_service.create_user(UserCreate(email="gone@example.com", password=PASSWORD))
+
+
+async def test_import_claims_emails(router: ShardRouter) -> None:
+    existing = await user_service.create_user(UserCreate(email="existing@example.com", password=PASSWORD))
+    rows = [
+        (2, {"email": "existing@example.com", "password": PASSWORD}),
+        *((row, {"email": f"user{row}@example.com", "password": PASSWORD}) for row in range(3, 23)),
+    ]
+
+    result = await user_service.import_users(rows)
+
+    assert result.created == 20
+    assert [(error.row, error.detail) for error in result.errors] == [(2, "Email already registered")]
+    claims = await _claims(router)
+    assert len(claims) == 21 and claims["existing@example.com"] == existing.id
+    for email, user_id in claims.items():
+        async with router.shard_for(user_id).session() as db:
+            assert (await db.get(User, user_id)).email == email
+
+
+async def test_sync_email_claims_backfills_every_shard(router: ShardRouter) -> None:
+    # Usuários anteriores à tabela user_emails, incluindo um email duplicado entre shards
+    duplicated = uuid.uuid4()
+    for index, shard in enumerate(router.shards):
+        async with shard.session() as db:
+            await db.execute(insert(User), [
+                {"id": new_id(), "email": f"shard{index}@example.com", "password": "x"},
+                {"id": uuid.UUID(int=duplicated.int + index), "email": "dup@example.com", "password": "x"},
+            ])
+            await db.commit()
+
+    synced = await sharding.sync_email_claims(router, batch_size=1)
+
+    assert synced["registered"] == len(router.shards) + 1
+    assert synced["conflicts"] == ["dup@example.com"] * (len(router.shards) - 1)
+    assert set(await _claims(router)) == {"dup@example.com", *(f"shard{i}@example.com" for i in range(3))}
@@ -0,0 +1,110 @@
+import uuid
+from types import SimpleNamespace
+from typing import AsyncIterator, List
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.dependencies import get_current_active_user
+from app.core.sharding import ShardRouter
+from app.modules.users import router as users_router
+from app.modules.users import service as user_service
+from app.modules.users.importer import ImportFileError, parse_import_file
+from app.modules.users.schema import UserCreate
+
+pytestmark = pytest.mark.anyio
+
+PASSWORD = "a-strong-password"
+
+
+@pytest.mark.parametrize("header", ["email", "email,full_name", "password,full_name", ""])
+def test_csv_header_needs_email_and_password(header: str) -> None:
+    with pytest.raises(ImportFileError):
+        list(parse_import_file(f"{header}\nuser@example.com\n".encode(), "csv"))
+
+
+def test_csv_and_ndjson_rows() -> None:
+    csv_rows = list(parse_import_file(b"\xef\xbb\xbfpassword,email,extra\nsecret,a@example.com,x\n", "csv"))
+    assert csv_rows == [(1, {"email": "a@example.com", "password": "secret", "full_name": None})]
+
+    ndjson_rows = list(parse_import_file(b'{"email": "b@example.com"}\n\nnot json\n[1]\n', "ndjson"))
+    assert [row for row, _ in ndjson_rows] == [1, 2, 3]
+    assert "_error" in ndjson_rows[1][1] and "_error" in ndjson_rows[2][1]
+
+
+def _app(is_superuser: bool) -> FastAPI:
+    app = FastAPI()
+    app.include_router(users_router.router, prefix="/users")
+    user = SimpleNamespace(id=uuid.uuid4(), is_active=True, is_superuser=is_superuser)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    return app
+
+
+async def _client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def _csv(*lines: str) -> dict:
+    return {"file": ("users.csv", "\n".join(lines).encode(), "text/csv")}
+
+
+async def test_import_is_superuser_only(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def unexpected_import(rows: List) -> None:
+        raise AssertionError("import must not run")
+
+    monkeypatch.setattr(user_service, "import_users", unexpected_import)
+    async with await _client(_app(is_superuser=False)) as client:
+        response = await client.post("/users/users/import", files=_csv("email,password", f"a@example.com,{PASSWORD}"))
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize(
+    "files",
+    [
+        _csv("email,full_name", "a@example.com,Ana"),
+        {"file": ("users.txt", b"email,password\n", "text/plain")},
+        {"file": ("users.csv", b"\xff\xfe", "text/csv")},
+    ],
+)
+async def test_unreadable_files_are_rejected(files: dict) -> None:
+    async with await _client(_app(is_superuser=True)) as client:
+        response = await client.post("/users/users/import", files=files)
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def router(shard_router: ShardRouter, monkeypatch: pytest.MonkeyPatch) -> ShardRouter:
+    async def fast_hash(password: str) -> str:
+        return f"hashed:{password}"
+
+    async def fast_hashes(passwords: List[str]) -> List[str]:
+        return [f"hashed:{password}" for password in passwords]
+
+    monkeypatch.setattr(user_service, "get_shard_router", lambda: shard_router)
+    monkeypatch.setattr(user_service, "get_password_hash_async", fast_hash)
+    monkeypatch.setattr(user_service, "get_password_hashes", fast_hashes)
+    return shard_router
+
+
+async def test_import_reports_duplicates_per_row(router: ShardRouter) -> None:
+    await user_service.create_user(UserCreate(email="existing@example.com", password=PASSWORD))
+    files = _csv(
+        "email,password,full_name",
+        f"new@example.com,{PASSWORD},New",
+        f"existing@example.com,{PASSWORD},",
+        f"new@example.com,{PASSWORD},Again",
+        "not-an-email,x,",
+        f"other@example.com,{PASSWORD},",
+    )
+
+    async with await _client(_app(is_superuser=True)) as client:
+        response = await client.post("/users/users/import", files=files)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["total_rows"], result["created"]) == (5, 2)
+    errors = {error["row"]: error["detail"] for error in result["errors"]}
+    assert set(errors) == {2, 3, 4}
+    assert errors[2] == "Email already registered"
+    assert errors[3] == "Email duplicated in file (first seen at row 1)"
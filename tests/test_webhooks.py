@@ -0,0 +1,81 @@
+import json
+import time
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+from app.core.config import settings
+from app.modules.webhooks import router as webhooks_router
+from app.modules.webhooks.signature import SIGNATURE_HEADER, sign_payload, verify_signature
+
+SECRET = "whsec_test"
+BODY = json.dumps({"gateway_payment_id": "mock_abc", "status": "APPROVED"}).encode()
+
+
+def test_signature_round_trip() -> None:
+    assert verify_signature(SECRET, BODY, sign_payload(SECRET, BODY), tolerance_seconds=300)
+
+
+@pytest.mark.parametrize(
+    "secret, body, header",
+    [
+        ("other-secret", BODY, None),
+        (SECRET, BODY + b" ", None),
+        (SECRET, BODY, "v1=deadbeef"),
+        (SECRET, BODY, "t=abc,v1=deadbeef"),
+        (SECRET, BODY, ""),
+    ],
+)
+def test_signature_rejects_tampering(secret: str, body: bytes, header: Any) -> None:
+    header = sign_payload(secret, BODY) if header is None else header
+    assert not verify_signature(SECRET, body, header, tolerance_seconds=300)
+
+
+def test_signature_rejects_replay_outside_tolerance() -> None:
+    header = sign_payload(SECRET, BODY, timestamp=int(time.time()) - 600)
+    assert not verify_signature(SECRET, BODY, header, tolerance_seconds=300)
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> Any:
+    updates: List[Dict[str, Any]] = []
+
+    async def handle_gateway_update(**kwargs: Any) -> None:
+        updates.append(kwargs)
+
+    monkeypatch.setattr(webhooks_router.payment_service, "handle_gateway_update", handle_gateway_update)
+    app = FastAPI()
+    app.include_router(webhooks_router.router)
+    test_client = TestClient(app)
+    test_client.updates = updates
+    return test_client
+
+
+def test_webhook_fails_closed_without_secret(client: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", None)
+    response = client.post(
+        "/webhooks/mock", content=BODY, headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 401
+    assert client.updates == []
+
+
+def test_webhook_requires_valid_signature(client: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", SecretStr(SECRET))
+    headers = {"Content-Type": "application/json"}
+
+    response = client.post("/webhooks/mock", content=BODY, headers=headers)
+    assert response.status_code == 401
+
+    headers[SIGNATURE_HEADER] = sign_payload("wrong", BODY)
+    response = client.post("/webhooks/mock", content=BODY, headers=headers)
+    assert response.status_code == 401
+    assert client.updates == []
+
+    headers[SIGNATURE_HEADER] = sign_payload(SECRET, BODY)
+    response = client.post("/webhooks/mock", content=BODY, headers=headers)
+    assert response.status_code == 200
+    assert [update["gateway_payment_id"] for update in client.updates] == ["mock_abc"]